@@ -102,10 +102,7 @@ ARCP="arcp"
 NI="ni"
 NIH="ni"
 
-try:
-    import urllib.parse as _urlp
-except:
-    import urlparse as _urlp
+import urllib.parse as _urlp
 
 def _register_scheme(scheme, *uses):
     """Ensure app scheme works with :func:`urllib.parse.urljoin` and friends"""    
@@ -120,5 +117,5 @@ _register_scheme(NIH) # nih:a;b
 
 
 # Convenience export of public functions
-from .parse import is_arcp_uri, parse_arcp
-from .generate import arcp_uuid, arcp_random, arcp_location, arcp_name, arcp_hash
+from .parse import is_arcp_uri, parse_arcp, parse_arcp_many
+from .generate import arcp_uuid, arcp_random, arcp_random_many, arcp_location, arcp_name, arcp_hash, arcp_hash_file, arcp_hash_many
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Generate arcp URIs from :mod:`asyncio` code without blocking the event loop.
+
+:func:`arcp_hash_async()` hashes a stream of chunks as they arrive,
+e.g. while an upload is also written to storage::
+
+    >>> async def upload(reader):
+    ...     return await arcp_hash_async(reader, "/")
+    'arcp://ni,sha-256;f4OxZX_x_FO5LcGBSKHWXfwtSx-j1ncoSt3SABJtkGk/'
+
+This module requires Python 3.7 or later.
+"""
+__author__      = "Stian Soiland-Reyes <https://orcid.org/0000-0001-9842-9718>"
+__copyright__   = "Copyright 2018-2020 The University of Manchester"
+__license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/LICENSE-2.0)"
+
+import asyncio
+
+from .generate import arcp_hash, ni_algorithm, _CHUNK_SIZE
+
+async def arcp_hash_async(chunks, path="/", query=None, fragment=None,
+                          hash=None, method=None, executor=None,
+                          max_pending=4, chunk_size=_CHUNK_SIZE):
+    """Generate an arcp URI for archive bytes from an asynchronous stream.
+
+    Parameters:
+      - chunks -- async iterable of :class:`bytes` chunks, e.g. an
+        aiohttp request body, or a stream with an ``async read(size)`` method
+        like :class:`asyncio.StreamReader`
+      - path -- Optional path within archive.
+      - query -- Optional query component.
+      - fragment -- Optional fragment component.
+      - hash -- Optional hash instance from :func:`hashlib.sha256()`
+      - method -- Optional RFC6920 hash name as for :func:`arcp.generate.arcp_hash()`
+      - executor -- Optional :class:`concurrent.futures.Executor` to hash in,
+        by default the event loop's default executor
+      - max_pending -- Maximum number of chunks received but not yet hashed
+      - chunk_size -- Bytes to read at a time from a stream with ``read()``
+
+    The hash is updated in the executor, one batch of chunks at a time in
+    order, while further chunks are received. When ``max_pending`` chunks
+    are waiting, no more are read until the current batch is hashed,
+    bounding memory use when chunks arrive faster than they can be hashed.
+    Chunks must not be modified after they have been received.
+
+    If the calling task is cancelled, no further chunks are read or hashed,
+    although a batch already started in the executor runs to completion.
+    """
+    if max_pending < 1:
+        raise ValueError("max_pending must be positive: %s" % max_pending)
+    algorithm = ni_algorithm(method, hash)
+    if hash is None:
+        hash = algorithm.new()
+    loop = asyncio.get_event_loop()
+    pending = None
+    queued = []
+    try:
+        async for chunk in _chunks(chunks, chunk_size):
+            queued.append(chunk)
+            if pending is not None and (pending.done() or len(queued) >= max_pending):
+                # back-pressure: wait for the hash to catch up
+                await pending
+                pending = None
+            if pending is None:
+                pending = loop.run_in_executor(executor, _update, hash, queued)
+                queued = []
+        if pending is not None:
+            await pending
+        if queued:
+            await loop.run_in_executor(executor, _update, hash, queued)
+    except asyncio.CancelledError:
+        if pending is not None:
+            pending.cancel()
+        raise
+    return arcp_hash(path=path, query=query, fragment=fragment,
+                     hash=hash, method=algorithm.name)
+
+def _update(hash, chunks):
+    """Update hash with a batch of chunks"""
+    for chunk in chunks:
+        hash.update(chunk)
+
+async def _chunks(chunks, chunk_size):
+    """Async iterate over chunks, reading from a stream if needed"""
+    if hasattr(chunks, "read") and not hasattr(chunks, "__aiter__") or \
+            isinstance(chunks, asyncio.StreamReader):
+        # StreamReader iterates by line, read in bigger chunks instead
+        while True:
+            chunk = await chunks.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        async for chunk in chunks:
+            yield chunk
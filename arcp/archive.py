@@ -0,0 +1,1198 @@
+#!/usr/bin/env python
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Access files within an archive by their arcp URIs.
+
+:class:`ArcpZipArchive` opens a ZIP file once, binds it to an arcp base
+URI and indexes its members by path, so that arcp URIs within the
+archive can be looked up directly::
+
+    >>> with ArcpZipArchive("data.zip", base="hash") as archive:
+    ...     archive.base
+    ...     archive.listdir(archive.uri("/"))
+    ...     archive.read(archive.uri("/folder/file.txt"))
+    ArcpBase('ni,sha-256;F-34D4TUeOfG0selz7REKRDo4XePkewPeQYtjL3vQs0')
+    ['README.txt', 'folder/']
+    <memory at 0x7f2c3a1b9e80>
+
+:class:`ArcpTarArchive` does the same for ``.tar`` and ``.tar.gz`` files,
+saving its member index so that it is only built on first open, and
+:class:`ArcpDirectoryArchive` for archives already unpacked to a directory.
+
+:class:`ArcpArchiveRegistry` maps arcp authorities to archive files,
+keeping a bounded pool of open archives for serving many
+archives without re-reading their member index::
+
+    >>> registry = ArcpArchiveRegistry(maxsize=100)
+    >>> registry.register("name,app.example.com", "app.zip")
+    >>> registry.read("arcp://name,app.example.com/index.html")
+    <memory at 0x7f2c3a1b9f40>
+    >>> registry.cache_info()
+    CacheInfo(hits=0, misses=1, maxsize=100, currsize=1)
+"""
+__author__      = "Stian Soiland-Reyes <https://orcid.org/0000-0001-9842-9718>"
+__copyright__   = "Copyright 2018-2020 The University of Manchester"
+__license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/LICENSE-2.0)"
+
+import io
+import os
+import json
+import mmap
+import stat
+import zlib
+import socket
+import struct
+import tarfile
+import zipfile
+from bisect import bisect_right
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic, mktime
+from uuid import UUID
+from hashlib import sha256
+
+from urllib.parse import unquote
+from urllib.request import pathname2url
+
+from .parse import CacheInfo, parse_arcp, is_arcp_uri
+from .generate import ArcpBase, _hash_fileobj, _ni_authority, _CHUNK_SIZE
+from .resolve import remove_dot_segments
+
+# ZIP local file header, see APPNOTE.TXT section 4.3.7
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+
+def _archive_base(base, file, location=None):
+    """Determine ArcpBase for an archive file.
+
+    Parameters:
+      - base -- ``"location"``, ``"hash"``, ``"random"``, a :class:`uuid.UUID`,
+        an arcp URI or an :class:`arcp.generate.ArcpBase`
+      - file -- filename or file object of the archive
+      - location -- Optional URL of the archive, e.g. where it was downloaded from,
+        otherwise the ``file:`` URL of ``file``
+    """
+    if isinstance(base, ArcpBase):
+        return base
+    if isinstance(base, UUID):
+        return ArcpBase.from_uuid(base)
+    if base == "location":
+        if location is None:
+            name = file if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__") \
+                else getattr(file, "name", None)
+            if not isinstance(name, str) and hasattr(name, "__fspath__"):
+                name = os.fspath(name)
+            if not isinstance(name, str):
+                raise ValueError("location required for unnamed archive: %r" % file)
+            location = "file://" + pathname2url(os.path.abspath(name))
+            if os.path.isdir(name):
+                location += "/"
+        return ArcpBase.from_location(location)
+    if base == "random":
+        return ArcpBase.from_random()
+    if base == "hash":
+        if isinstance(file, str) and os.path.isdir(file):
+            raise ValueError("Can't hash a directory: %s" % file)
+        h = sha256()
+        if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+            with open(file, "rb") as f:
+                _hash_fileobj(f, h, use_mmap=True)
+        else:
+            pos = file.tell()
+            file.seek(0)
+            _hash_fileobj(file, h, use_mmap=True)
+            file.seek(pos)
+        return ArcpBase.from_hash(hash=h)
+    if is_arcp_uri(base):
+        return ArcpBase.from_uri(base)
+    raise ValueError("Unsupported archive base: %r" % base)
+
+MemberStat = namedtuple("MemberStat", "size mtime")
+MemberStat.__doc__ = """Size in bytes and modification time in seconds since the epoch
+of an archive member, as from :meth:`ArcpZipArchive.stat()`"""
+
+class _ArcpArchive(object):
+    """Member and directory index shared by the archive backends.
+
+    Subclasses add members with :meth:`_add_member` and
+    :meth:`_add_dir`, and implement :meth:`open`, :meth:`read`,
+    :meth:`stat` and :meth:`close`.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self._members = {}
+        self._dirs = {"/": set()}
+
+    def _add_member(self, path, info):
+        """Add file member info at normalized path"""
+        self._members[path] = info
+        slash = path.rfind("/") + 1
+        self._add_dir(path[:slash], path[slash:])
+
+    def _add_dir(self, path, child=None):
+        """Add child name to directory path, adding parent directories as needed"""
+        children = self._dirs.get(path)
+        if children is None:
+            children = self._dirs[path] = set()
+            parent = path[:path.rfind("/", 0, -1)+1]
+            self._add_dir(parent, path[len(parent):])
+        if child is not None:
+            children.add(child)
+
+    def _path(self, uri):
+        """Normalized path of arcp URI or plain path within archive"""
+        if not is_arcp_uri(uri):
+            path = "/" + uri.lstrip("/")
+        else:
+            u = parse_arcp(uri)
+            if u.netloc != self.base.authority:
+                raise ValueError("URI not within archive %s: %s" % (self.base, uri))
+            path = u.path or "/"
+            if u.params:
+                path += ";" + u.params
+            path = unquote(path)
+        return remove_dot_segments(path)
+
+    def _info(self, uri):
+        path = self._path(uri)
+        try:
+            return self._members[path]
+        except KeyError:
+            if path.endswith("/") or path + "/" in self._dirs:
+                raise IsADirectoryError("Is a directory: %s" % uri)
+            raise
+
+    def uri(self, path="/"):
+        """Percent-encoded arcp URI of a path within this archive"""
+        return self.base.uri(path, quote=True)
+
+    def uris(self):
+        """List arcp URIs of all file members, in archive order"""
+        return self.base.uris(self._members, quote=True)
+
+    def info(self, uri):
+        """Return the member info of the file at uri"""
+        return self._info(uri)
+
+    def isdir(self, uri):
+        """Return True if uri is a directory within the archive"""
+        path = self._path(uri)
+        return (path if path.endswith("/") else path + "/") in self._dirs
+
+    def listdir(self, uri="/"):
+        """List names within the directory at uri, sorted,
+        with sub-directory names ending in ``/``"""
+        path = self._path(uri)
+        if not path.endswith("/"):
+            path += "/"
+        return sorted(self._dirs[path])
+
+    def __contains__(self, uri):
+        try:
+            return self._path(uri) in self._members
+        except ValueError:
+            return False
+
+    def __iter__(self):
+        return iter(self.uris())
+
+    def __len__(self):
+        return len(self._members)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _map(fp):
+    """Memory-map a file object, or return None if not possible"""
+    try:
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, EnvironmentError, io.UnsupportedOperation):
+        # no fileno(), e.g. io.BytesIO, or not mappable
+        return None
+
+def _close_map(m):
+    """Close memory-map m, unless read() results are still referenced"""
+    if m is not None:
+        try:
+            m.close()
+        except BufferError:
+            # exported memoryviews, closed when garbage collected
+            pass
+
+class ArcpZipArchive(_ArcpArchive):
+    """ZIP file with members accessed by arcp URIs.
+
+    Parameters:
+      - file -- filename of ZIP file, or file object opened in binary mode
+      - base -- How to bind the archive to an arcp base URI:
+        ``"location"`` (default) for :func:`arcp.generate.arcp_location()`
+        of the archive's location, ``"hash"`` for :func:`arcp.generate.arcp_hash()`
+        of the archive bytes, ``"random"`` for a fresh uuid, a :class:`uuid.UUID`
+        identifying the archive, or an existing :class:`arcp.generate.ArcpBase`
+        or arcp URI.
+      - location -- Optional URL of the archive for ``base="location"``,
+        e.g. where it was downloaded from. The default is the ``file:`` URL
+        of the absolute filename.
+
+    The member index is built once when opening.
+    Member paths are normalized, e.g. ``./a//b`` is indexed as ``/a//b``,
+    and directories are inferred from member paths even when the
+    ZIP file has no explicit directory entries.
+
+    Methods taking a ``uri`` accept either an arcp URI within this archive,
+    which may be percent-encoded, or a plain path like ``folder/file.txt``.
+    Members that are not found raise :class:`KeyError` like
+    :meth:`zipfile.ZipFile.getinfo()`, while URIs for a different archive
+    or climbing out of the root raise :class:`ValueError`.
+    """
+
+    def __init__(self, file, base="location", location=None):
+        super(ArcpZipArchive, self).__init__(_archive_base(base, file, location))
+        self._zip = zipfile.ZipFile(file)
+        self._mmap = _map(self._zip.fp)
+        self._offsets = {}
+        for info in self._zip.infolist():
+            path = _member_path(info.filename)
+            if path.endswith("/"):
+                self._add_dir(path)
+            else:
+                self._add_member(path, info)
+
+    def info(self, uri):
+        """Return the :class:`zipfile.ZipInfo` of the member at uri"""
+        return self._info(uri)
+
+    def stat(self, uri):
+        """Return :class:`MemberStat` of the member at uri"""
+        info = self._info(uri)
+        # ZIP timestamps are in local time
+        return MemberStat(info.file_size, mktime(info.date_time + (0, 0, -1)))
+
+    def open(self, uri):
+        """Open the member at uri for reading as a binary stream"""
+        return self._zip.open(self._info(uri))
+
+    def read(self, uri):
+        """Read the member at uri.
+
+        Stored (uncompressed, unencrypted) members are returned as
+        a read-only :class:`memoryview` slice of a memory-map of
+        the ZIP file without copying or checking the CRC,
+        other members as decompressed :class:`bytes`.
+        """
+        info = self._info(uri)
+        offset = self._data_offset(info)
+        if offset is None:
+            return self._zip.read(info)
+        return memoryview(self._mmap)[offset:offset+info.file_size]
+
+    def _data_offset(self, info):
+        """Offset of stored member data within the memory-map, or None"""
+        if (self._mmap is None or info.compress_type != zipfile.ZIP_STORED
+                or info.flag_bits & 0x1):
+            return None
+        offset = self._offsets.get(info.filename)
+        if offset is None:
+            header = _LOCAL_HEADER.unpack_from(self._mmap, info.header_offset)
+            if header[0] != _LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile("Bad local file header: %s" % info.filename)
+            offset = info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+            self._offsets[info.filename] = offset
+        return offset
+
+    def close(self):
+        """Close the ZIP file.
+
+        The memory-map stays open while :meth:`read()` results are still referenced.
+        """
+        self._zip.close()
+        _close_map(self._mmap)
+
+    def __repr__(self):
+        return "ArcpZipArchive(%r, base=%r)" % (self._zip.filename, self.base)
+
+# Bump when the index format changes
+_TAR_INDEX_VERSION = 2
+_TAR_INDEX_SUFFIX = ".arcpindex.json"
+_GZIP_MAGIC = b"\037\213"
+# maximum compressed bytes to inflate at a time
+_GZIP_CHUNK = 1 << 16
+# symbolic links to follow before giving up
+_MAX_LINKS = 16
+
+class ArcpTarArchive(_ArcpArchive):
+    """tar or tar.gz file with members accessed by arcp URIs.
+
+    Parameters:
+      - file -- filename of tar file, or seekable file object opened in binary mode
+      - base -- How to bind the archive to an arcp base URI, as for :class:`ArcpZipArchive`
+      - location -- Optional URL of the archive for ``base="location"``
+      - index_dir -- Optional directory for the member index, which is then
+        keyed by the sha-256 ni hash of the archive. By default the index is
+        kept next to the archive, as ``file + ".arcpindex.json"``
+      - save_index -- If True (default), save the member index after first open,
+        or if False, only use an existing index
+      - checkpoint_interval -- Uncompressed bytes between gzip decompressor checkpoints
+
+    On first open, the tar headers are read to build an index of member offsets,
+    which is saved as JSON so that later opens don't need to read through the
+    archive again. An index next to the archive is rebuilt if the archive's
+    size or modification time changes. Failure to save the index, e.g.
+    to a read-only directory, is ignored.
+
+    Members of an uncompressed tar file are read directly at their offset,
+    as :class:`memoryview` slices of a memory-map where possible.
+
+    For tar.gz files, a decompressor checkpoint is kept every
+    ``checkpoint_interval`` bytes, so that reading a member only needs to
+    inflate from the nearest checkpoint before it. Checkpoints are made while
+    building the index, or while reading members with a saved index.
+    As Python's :mod:`zlib` can't save or restore a decompressor state,
+    checkpoints are held in memory for as long as the archive is open,
+    e.g. within an :class:`ArcpArchiveRegistry`.
+
+    Symbolic and hard links to other members within the archive are followed.
+    GNU sparse members are read with their holes filled with zeros.
+    Other compressions, like ``.tar.bz2``, raise :class:`tarfile.ReadError`.
+    """
+
+    def __init__(self, file, base="location", location=None,
+                 index_dir=None, save_index=True, checkpoint_interval=4 << 20):
+        super(ArcpTarArchive, self).__init__(_archive_base(base, file, location))
+        self._lock = Lock()
+        self._links = {}
+        if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+            self.name = os.fspath(file)
+            self._fp = open(file, "rb")
+            self._own_fp = True
+        else:
+            self.name = getattr(file, "name", None)
+            self._fp = file
+            self._own_fp = False
+        # archive itself and each stream from open()
+        self._fp_refs = 1
+        self._closed = False
+        self._fp.seek(0)
+        magic = self._fp.read(len(_GZIP_MAGIC))
+        self._fp.seek(0)
+        self._mmap = None
+        if magic == _GZIP_MAGIC:
+            self.compression = "gz"
+            self._reader = _GzipReader(self._fp, checkpoint_interval)
+        else:
+            self.compression = None
+            self._reader = self._fp
+            self._mmap = _map(self._fp)
+        self._index_file = self._index_filename(index_dir)
+        index = self._load_index()
+        if index is None:
+            index = self._build_index()
+            if save_index and self._index_file is not None:
+                self._save_index(index)
+        self._load_members(index)
+
+    def _index_filename(self, index_dir):
+        if index_dir is not None:
+            digest = self._sha256()
+            return os.path.join(index_dir, digest + _TAR_INDEX_SUFFIX)
+        if isinstance(self.name, str):
+            return self.name + _TAR_INDEX_SUFFIX
+        return None
+
+    def _sha256(self):
+        """base64url sha-256 digest of the archive, as in ni hash URIs"""
+        prefix = "ni,sha-256;"
+        if self.base.authority.startswith(prefix):
+            return self.base.authority[len(prefix):]
+        h = sha256()
+        self._fp.seek(0)
+        _hash_fileobj(self._fp, h, use_mmap=True)
+        self._fp.seek(0)
+        return _ni_authority(hash=h)[len(prefix):]
+
+    def _stat(self):
+        """Size and modification time of archive, to check index is current"""
+        try:
+            st = os.fstat(self._fp.fileno())
+            return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return {}
+
+    def _load_index(self):
+        if self._index_file is None:
+            return None
+        try:
+            with open(self._index_file, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (index.get("version") != _TAR_INDEX_VERSION or
+                index.get("compression") != self.compression):
+            return None
+        stat = self._stat()
+        if any(index.get(k) != v for (k, v) in stat.items()):
+            # modified since index was saved
+            return None
+        return index
+
+    def _save_index(self, index):
+        tmp = "%s.%s.tmp" % (self._index_file, os.getpid())
+        try:
+            with open(tmp, "w") as f:
+                json.dump(index, f, separators=(",", ":"))
+            os.replace(tmp, self._index_file)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _build_index(self):
+        """Read tar headers, returning index as dictionary"""
+        members = []
+        dirs = []
+        links = []
+        with self._lock:
+            self._reader.seek(0)
+            with tarfile.open(fileobj=self._reader, mode="r:") as tar:
+                for info in tar:
+                    name = info.name
+                    if info.isfile():
+                        # sparse map of (offset, size) data blocks, or None
+                        members.append([name, info.offset_data, info.size,
+                                        info.mtime, info.mode, info.sparse])
+                    elif info.isdir():
+                        dirs.append(name)
+                    elif info.issym():
+                        links.append([name, info.linkname, True])
+                    elif info.islnk():
+                        links.append([name, info.linkname, False])
+        index = {"version": _TAR_INDEX_VERSION, "compression": self.compression,
+                 "members": members, "dirs": dirs, "links": links}
+        index.update(self._stat())
+        return index
+
+    def _load_members(self, index):
+        for (name, offset, size, mtime, mode, sparse) in index["members"]:
+            info = tarfile.TarInfo(name)
+            info.offset_data = offset
+            info.size = size
+            info.mtime = mtime
+            info.mode = mode
+            info.sparse = sparse
+            self._add_member(_member_path(name), info)
+        for name in index["dirs"]:
+            self._add_dir(_member_path(name.rstrip("/") + "/"))
+        for (name, target, symbolic) in index["links"]:
+            path = _member_path(name)
+            if symbolic and not target.startswith("/"):
+                # relative to the link's directory
+                target = path[:path.rfind("/")+1] + target
+            self._links[path] = _member_path(target)
+            slash = path.rfind("/") + 1
+            self._add_dir(path[:slash], path[slash:])
+
+    def _info(self, uri):
+        path = self._path(uri)
+        for i in range(_MAX_LINKS):
+            info = self._members.get(path)
+            if info is not None:
+                return info
+            if path not in self._links:
+                break
+            path = self._links[path]
+        if path.endswith("/") or path + "/" in self._dirs:
+            raise IsADirectoryError("Is a directory: %s" % uri)
+        raise KeyError(path)
+
+    def __contains__(self, uri):
+        try:
+            self._info(uri)
+            return True
+        except (KeyError, ValueError, IsADirectoryError):
+            return False
+
+    def info(self, uri):
+        """Return the :class:`tarfile.TarInfo` of the member at uri,
+        with ``name``, ``size``, ``mtime``, ``mode`` and ``offset_data``"""
+        return self._info(uri)
+
+    def stat(self, uri):
+        """Return :class:`MemberStat` of the member at uri"""
+        info = self._info(uri)
+        return MemberStat(info.size, info.mtime)
+
+    def open(self, uri):
+        """Open the member at uri for reading as a binary stream.
+
+        The stream stays readable after the archive is closed.
+        """
+        info = self._info(uri)
+        with self._lock:
+            self._fp_refs += 1
+        return io.BufferedReader(_MemberReader(self, info))
+
+    def read(self, uri):
+        """Read the member at uri.
+
+        Members of an uncompressed tar file are returned as a read-only
+        :class:`memoryview` slice of a memory-map of the file without copying,
+        otherwise, or if sparse, as :class:`bytes`.
+        """
+        info = self._info(uri)
+        if self._mmap is not None and not info.sparse:
+            return memoryview(self._mmap)[info.offset_data:info.offset_data+info.size]
+        return self._read_member(info, 0, info.size)
+
+    def _read_member(self, info, pos, size):
+        """Read size bytes at pos within a member, with holes of a sparse member as zeros"""
+        if not info.sparse:
+            return self._read_at(info.offset_data + pos, size)
+        data = bytearray(size)
+        # data blocks are stored one after the other
+        stored = 0
+        for (offset, length) in info.sparse:
+            start = max(pos, offset)
+            end = min(pos + size, offset + length)
+            if start < end:
+                data[start-pos:end-pos] = self._read_at(
+                    info.offset_data + stored + start - offset, end - start)
+            stored += length
+        return bytes(data)
+
+    def _read_at(self, offset, size):
+        with self._lock:
+            self._reader.seek(offset)
+            data = self._reader.read(size)
+        if len(data) < size:
+            raise EOFError("Truncated tar member at offset %s" % offset)
+        return data
+
+    def _release_fp(self):
+        """Close the tar file once the archive and all its streams are closed"""
+        with self._lock:
+            self._fp_refs -= 1
+            if self._fp_refs == 0 and self._own_fp:
+                self._fp.close()
+
+    def close(self):
+        """Close the tar file, unless it was passed as a file object.
+
+        The memory-map stays open while :meth:`read()` results are still referenced,
+        and the file stays open until streams from :meth:`open()` are closed.
+        """
+        if self._mmap is not None:
+            _close_map(self._mmap)
+            self._mmap = None
+        if not self._closed:
+            self._closed = True
+            self._release_fp()
+
+    def __repr__(self):
+        return "ArcpTarArchive(%r, base=%r)" % (self.name, self.base)
+
+class _MemberReader(io.RawIOBase):
+    """Raw stream of a tar member, reading from the archive at its offset"""
+
+    def __init__(self, archive, info):
+        self._archive = archive
+        self._info = info
+        self._size = info.size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._size
+        if pos < 0:
+            raise ValueError("Negative seek position %s" % pos)
+        self._pos = pos
+        return pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            super(_MemberReader, self).close()
+            self._archive._release_fp()
+
+    def readinto(self, b):
+        n = min(len(b), self._size - self._pos)
+        if n <= 0:
+            return 0
+        data = self._archive._read_member(self._info, self._pos, n)
+        b[:n] = data
+        self._pos += n
+        return n
+
+class _GzipReader(object):
+    """Seekable reader of a gzip file's uncompressed bytes.
+
+    Decompressor copies are kept as checkpoints every ``interval``
+    bytes, so that seeking only needs to inflate from the
+    nearest checkpoint before the new position.
+    """
+
+    def __init__(self, fp, interval):
+        self._fp = fp
+        self._interval = interval
+        self._chunk = min(_GZIP_CHUNK, interval)
+        # (uncompressed offset, compressed offset, decompressor or None)
+        self._checkpoints = [(0, 0, None)]
+        self._offsets = [0]
+        self._restore(self._checkpoints[0])
+
+    def _restore(self, checkpoint):
+        (self._pos, self._cpos, d) = checkpoint
+        self._d = d.copy() if d is not None else zlib.decompressobj(31)
+        self._buf = b""
+        self._fp.seek(self._cpos)
+
+    def _fill(self):
+        """Inflate the next chunk into the buffer, return False at end of file"""
+        data = self._fp.read(self._chunk)
+        if not data:
+            return False
+        self._cpos += len(data)
+        d = self._d
+        out = []
+        while data:
+            if d.eof:
+                if not data.strip(b"\0"):
+                    # trailing padding
+                    break
+                # concatenated gzip member
+                d = self._d = zlib.decompressobj(31)
+            out.append(d.decompress(data))
+            data = d.unused_data
+        self._buf += b"".join(out)
+        end = self._pos + len(self._buf)
+        if end >= self._offsets[-1] + self._interval and not d.eof:
+            self._checkpoints.append((end, self._cpos, d.copy()))
+            self._offsets.append(end)
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Can only seek from start or current position")
+        # nearest checkpoint before pos
+        checkpoint = self._checkpoints[bisect_right(self._offsets, pos) - 1]
+        if pos < self._pos or checkpoint[0] > self._pos + len(self._buf):
+            self._restore(checkpoint)
+        # skip forward
+        while pos > self._pos:
+            if not self._buf and not self._fill():
+                break
+            skip = min(len(self._buf), pos - self._pos)
+            self._buf = self._buf[skip:]
+            self._pos += skip
+        return self._pos
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if not self._buf and not self._fill():
+                break
+            if size < 0:
+                data = self._buf
+            else:
+                data = self._buf[:size]
+                size -= len(data)
+            parts.append(data)
+            self._buf = self._buf[len(data):]
+            self._pos += len(data)
+        return b"".join(parts)
+
+class ArcpDirectoryArchive(_ArcpArchive):
+    """Unpacked archive directory with files accessed by arcp URIs,
+    e.g. a BagIt or RO-Crate folder.
+
+    Parameters:
+      - directory -- root directory of the unpacked archive
+      - base -- How to bind the directory to an arcp base URI, as for
+        :class:`ArcpZipArchive`, except ``"hash"``. The default ``"location"``
+        uses the ``file:`` URL of the directory, ending with ``/``
+      - location -- Optional URL of the archive for ``base="location"``,
+        e.g. where it was unpacked from
+      - stat_ttl -- Seconds to trust a cached :func:`os.stat()` result
+        before checking it again
+      - maxsize -- Maximum number of cached stat results and listings
+
+    Paths are mapped to files below the root directory. References
+    climbing out of the root, including through symbolic links to
+    outside the root, raise :class:`ValueError`, as do path segments
+    with characters the file system treats specially, like ``\\0``.
+
+    Stat results are cached, and only checked again after ``stat_ttl``
+    seconds. Files are opened by their resolved path, and must still be
+    the same file as was checked to be within the root. Directory listings from :func:`os.scandir()` are cached
+    until the directory's modification time changes.
+    Files that don't exist raise :class:`KeyError` like in the other archives.
+    """
+
+    def __init__(self, directory, base="location", location=None,
+                 stat_ttl=1.0, maxsize=65536):
+        if not os.path.isdir(directory):
+            raise NotADirectoryError("Not a directory: %s" % directory)
+        super(ArcpDirectoryArchive, self).__init__(_archive_base(base, directory, location))
+        self.directory = os.path.abspath(directory)
+        self.stat_ttl = stat_ttl
+        self.maxsize = maxsize
+        self._root = os.path.realpath(self.directory)
+        # path -> (checked time, stat_result)
+        self._stats = OrderedDict()
+        # directory path -> (mtime_ns, sorted names)
+        self._listings = OrderedDict()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _filename(self, path):
+        """File system path of normalized archive path, checking for climb-out"""
+        segments = path.split("/")
+        for segment in segments:
+            if "\0" in segment or os.sep in segment or (os.altsep and os.altsep in segment):
+                raise ValueError("Invalid path segment: %r" % segment)
+        return os.path.join(self.directory, *segments)
+
+    def _stat(self, path):
+        """Cached (resolved filename, stat_result) of normalized archive path.
+
+        Raise :class:`KeyError` if not found, or :class:`ValueError`
+        if it resolves outside the root directory.
+        """
+        now = monotonic()
+        with self._lock:
+            cached = self._stats.get(path)
+            if cached is not None and now - cached[0] < self.stat_ttl:
+                self._hits += 1
+                self._stats.move_to_end(path)
+                return cached[1:]
+            self._misses += 1
+        # symlinks may have changed even if the file has not
+        filename = os.path.realpath(self._filename(path))
+        try:
+            st = os.stat(filename)
+        except (FileNotFoundError, NotADirectoryError):
+            with self._lock:
+                self._stats.pop(path, None)
+            raise KeyError(path)
+        if filename != self._root and not filename.startswith(self._root.rstrip(os.sep) + os.sep):
+            with self._lock:
+                self._stats.pop(path, None)
+            raise ValueError("Path climbs out of archive root: %s" % path)
+        with self._lock:
+            self._stats[path] = (now, filename, st)
+            self._stats.move_to_end(path)
+            if len(self._stats) > self.maxsize:
+                self._stats.popitem(last=False)
+        return (filename, st)
+
+    def _open(self, uri, buffering=-1):
+        """Open the file at uri, return (file, stat_result).
+
+        Raise :class:`ValueError` if the opened file is not the one
+        checked to be within the root, e.g. as a symlink was swapped.
+        """
+        for i in range(2):
+            (filename, st) = self._info(uri)
+            f = open(filename, "rb", buffering=buffering)
+            try:
+                opened = os.fstat(f.fileno())
+            except:
+                f.close()
+                raise
+            if (opened.st_dev, opened.st_ino) == (st.st_dev, st.st_ino):
+                return (f, st)
+            f.close()
+            # replaced since cached, check again
+            with self._lock:
+                self._stats.pop(self._path(uri).rstrip("/") or "/", None)
+        raise ValueError("File changed while opening: %s" % uri)
+
+    def _info(self, uri):
+        path = self._path(uri)
+        (filename, st) = self._stat(path.rstrip("/") or "/")
+        if stat.S_ISDIR(st.st_mode):
+            raise IsADirectoryError("Is a directory: %s" % uri)
+        if path.endswith("/"):
+            raise KeyError(path)
+        return (filename, st)
+
+    def info(self, uri):
+        """Return the :class:`os.stat_result` of the file at uri"""
+        return self._info(uri)[1]
+
+    def stat(self, uri):
+        """Return :class:`MemberStat` of the file at uri"""
+        st = self._info(uri)[1]
+        return MemberStat(st.st_size, st.st_mtime)
+
+    def isdir(self, uri):
+        """Return True if uri is a directory within the archive"""
+        try:
+            return stat.S_ISDIR(self._stat(self._path(uri).rstrip("/") or "/")[1].st_mode)
+        except KeyError:
+            return False
+
+    def listdir(self, uri="/"):
+        """List names within the directory at uri, sorted,
+        with sub-directory names ending in ``/``"""
+        path = self._path(uri).rstrip("/") or "/"
+        (filename, st) = self._stat(path)
+        if not stat.S_ISDIR(st.st_mode):
+            raise NotADirectoryError("Not a directory: %s" % uri)
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached is not None and cached[0] == st.st_mtime_ns:
+                self._listings.move_to_end(path)
+                return list(cached[1])
+        names = []
+        with os.scandir(filename) as entries:
+            for entry in entries:
+                names.append(entry.name + "/" if entry.is_dir() else entry.name)
+        names.sort()
+        with self._lock:
+            self._listings[path] = (st.st_mtime_ns, names)
+            if len(self._listings) > self.maxsize:
+                self._listings.popitem(last=False)
+        return list(names)
+
+    def uris(self):
+        """List arcp URIs of all files, walking the directory tree.
+
+        Symbolic links to directories are not followed.
+        """
+        paths = []
+        for (dirpath, dirnames, filenames) in os.walk(self.directory):
+            dirnames.sort()
+            rel = os.path.relpath(dirpath, self.directory)
+            prefix = "/" if rel == os.curdir else "/" + rel.replace(os.sep, "/") + "/"
+            paths.extend(prefix + name for name in sorted(filenames))
+        return self.base.uris(paths, quote=True)
+
+    def __contains__(self, uri):
+        try:
+            self._info(uri)
+            return True
+        except (KeyError, ValueError, IsADirectoryError):
+            return False
+
+    def __len__(self):
+        return len(self.uris())
+
+    def open(self, uri):
+        """Open the file at uri for reading as a binary stream"""
+        return self._open(uri)[0]
+
+    def read(self, uri):
+        """Read the file at uri.
+
+        The file is read with a single :meth:`io.RawIOBase.read()`
+        of its cached size, returned as a read-only :class:`memoryview`
+        of the :class:`bytes`.
+        """
+        (f, st) = self._open(uri, buffering=0)
+        with f:
+            data = f.read(st.st_size)
+            # short read, or grown since stat
+            rest = f.read()
+        if rest:
+            data += rest
+        return memoryview(data)
+
+    def sendfile(self, uri, out, offset=0, count=None):
+        """Copy (part of) the file at uri to a binary file object or socket.
+
+        Parameters:
+          - uri -- arcp URI or path of file within archive
+          - out -- file object or socket to write to
+          - offset -- Optional offset within file to start from
+          - count -- Optional maximum number of bytes to copy, by default to the end of file
+
+        Sockets are sent to with :meth:`socket.socket.sendfile()`, using
+        :func:`os.sendfile()` where available, otherwise the file is copied
+        with :meth:`io.RawIOBase.readinto()` into a reused buffer.
+        Return the number of bytes copied.
+        """
+        (f, st) = self._open(uri, buffering=0)
+        if count is None:
+            count = max(st.st_size - offset, 0)
+        with f:
+            if count <= 0:
+                # socket.sendfile() rejects a count of 0
+                return 0
+            if isinstance(out, socket.socket):
+                return out.sendfile(f, offset, count)
+            f.seek(offset)
+            buf = bytearray(min(count, _CHUNK_SIZE))
+            view = memoryview(buf)
+            sent = 0
+            while sent < count:
+                n = f.readinto(view[:min(len(buf), count - sent)])
+                if not n:
+                    break
+                out.write(view[:n])
+                sent += n
+            return sent
+
+    def cache_info(self):
+        """Return stat cache statistics as (hits, misses, maxsize, currsize)."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, len(self._stats))
+
+    def clear(self):
+        """Remove all cached stat results and listings and reset statistics."""
+        with self._lock:
+            self._stats.clear()
+            self._listings.clear()
+            self._hits = self._misses = 0
+
+    def close(self):
+        """Clear the caches, as for :meth:`clear()`"""
+        self.clear()
+
+    def __repr__(self):
+        return "ArcpDirectoryArchive(%r, base=%r)" % (self.directory, self.base)
+
+def open_archive(file, base="location", location=None, **kwargs):
+    """Open a directory, ZIP, tar or tar.gz archive, detected by its content.
+
+    Parameters are as for :class:`ArcpZipArchive`, additional keyword arguments
+    are passed to :class:`ArcpTarArchive` or :class:`ArcpDirectoryArchive`.
+    This is the default opener of :class:`ArcpArchiveRegistry`.
+    """
+    if (isinstance(file, (str, bytes)) or hasattr(file, "__fspath__")) and os.path.isdir(file):
+        return ArcpDirectoryArchive(file, base=base, location=location, **kwargs)
+    if zipfile.is_zipfile(file):
+        return ArcpZipArchive(file, base=base, location=location)
+    return ArcpTarArchive(file, base=base, location=location, **kwargs)
+
+class ArcpArchiveRegistry(object):
+    """Registry of archive files by arcp authority, with a pool of open archives.
+
+    Parameters:
+      - maxsize -- Maximum number of open archives to keep in the pool
+      - opener -- Callable opening an archive as ``opener(file, base=ArcpBase)``,
+        by default :func:`open_archive`
+
+    Archives are opened and indexed on first use, and kept open
+    until evicted as the least recently used. Archives that are
+    in use, from :meth:`acquire()` or :meth:`archive()`, are not
+    closed on eviction until they are released, so the pool may
+    temporarily hold more than ``maxsize`` archives.
+
+    The registry can be shared between threads.
+    """
+
+    def __init__(self, maxsize=64, opener=open_archive):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive: %s" % maxsize)
+        self.maxsize = maxsize
+        self.opener = opener
+        self._files = {}
+        self._pool = OrderedDict()
+        # id(archive) -> [archive, refcount] for archives in use
+        self._refs = {}
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def register(self, authority, file, opener=None):
+        """Register an archive file for an arcp authority.
+
+        Parameters:
+          - authority -- arcp authority like ``uuid,...``, ``ni,...`` or ``name,...``,
+            or an arcp URI or :class:`arcp.generate.ArcpBase`
+          - file -- filename of archive, passed to the opener
+          - opener -- Optional opener for this archive, instead of the registry's opener
+
+        Re-registering an authority evicts its open archive from the pool.
+        """
+        authority = _authority(authority)
+        with self._lock:
+            self._files[authority] = (file, opener or self.opener)
+            archive = self._pool.pop(authority, None)
+            self._close_idle(archive)
+
+    def unregister(self, authority):
+        """Remove an archive from the registry, closing it when no longer in use"""
+        authority = _authority(authority)
+        with self._lock:
+            del self._files[authority]
+            self._close_idle(self._pool.pop(authority, None))
+
+    def __contains__(self, authority):
+        return _authority(authority) in self._files
+
+    def filename(self, authority):
+        """Return the registered archive file for an arcp URI or authority"""
+        return self._files[_authority(authority)][0]
+
+    def __len__(self):
+        return len(self._files)
+
+    def acquire(self, uri):
+        """Return the open archive for an arcp URI or authority.
+
+        The archive is opened if it's not in the pool, and
+        can't be closed until :meth:`release()` is called.
+        Unregistered authorities raise :class:`KeyError`.
+        """
+        authority = _authority(uri)
+        with self._lock:
+            archive = self._pool.get(authority)
+            if archive is not None:
+                self._hits += 1
+                self._pool.move_to_end(authority)
+                self._ref(archive)
+                return archive
+            self._misses += 1
+            (file, opener) = self._files[authority]
+        # Open outside lock, as reading the index may be slow
+        archive = opener(file, base=ArcpBase(authority))
+        with self._lock:
+            existing = self._pool.get(authority)
+            if existing is not None:
+                # opened by another thread meanwhile
+                archive.close()
+                archive = existing
+                self._pool.move_to_end(authority)
+            elif self._files.get(authority) == (file, opener):
+                self._pool[authority] = archive
+            # else re-registered meanwhile, closed on release()
+            self._ref(archive)
+            self._evict()
+        return archive
+
+    def release(self, archive):
+        """Release an archive from :meth:`acquire()`"""
+        with self._lock:
+            ref = self._refs[id(archive)]
+            ref[1] -= 1
+            if ref[1] == 0:
+                del self._refs[id(archive)]
+                if self._pool.get(archive.base.authority) is not archive:
+                    # evicted while in use
+                    archive.close()
+                else:
+                    self._evict()
+
+    @contextmanager
+    def archive(self, uri):
+        """Context manager for the open archive of an arcp URI or authority::
+
+            with registry.archive(uri) as archive:
+                names = archive.listdir(uri)
+        """
+        archive = self.acquire(uri)
+        try:
+            yield archive
+        finally:
+            self.release(archive)
+
+    def read(self, uri):
+        """Read the archive member at an arcp URI, as :meth:`ArcpZipArchive.read()`"""
+        with self.archive(uri) as archive:
+            return archive.read(uri)
+
+    def open(self, uri):
+        """Open the archive member at an arcp URI, as :meth:`ArcpZipArchive.open()`
+
+        The stream stays readable even if the archive is evicted from the pool.
+        """
+        with self.archive(uri) as archive:
+            return archive.open(uri)
+
+    def cache_info(self):
+        """Return pool statistics as (hits, misses, maxsize, currsize)."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses,
+                             self.maxsize, len(self._pool))
+
+    def clear(self):
+        """Close all pooled archives not in use and reset statistics.
+
+        Archives in use are closed when released.
+        """
+        with self._lock:
+            archives = list(self._pool.values())
+            self._pool.clear()
+            for archive in archives:
+                self._close_idle(archive)
+            self._hits = self._misses = 0
+
+    close = clear
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _ref(self, archive):
+        ref = self._refs.get(id(archive))
+        if ref is None:
+            ref = self._refs[id(archive)] = [archive, 0]
+        ref[1] += 1
+
+    def _close_idle(self, archive):
+        if archive is not None and id(archive) not in self._refs:
+            archive.close()
+
+    def _evict(self):
+        """Close least recently used archives above maxsize, skipping those in use"""
+        over = len(self._pool) - self.maxsize
+        if over <= 0:
+            return
+        for authority in list(self._pool):
+            archive = self._pool[authority]
+            if id(archive) not in self._refs:
+                del self._pool[authority]
+                archive.close()
+                over -= 1
+                if not over:
+                    break
+
+def _authority(uri):
+    """arcp authority of an arcp URI, ArcpBase or authority string"""
+    if isinstance(uri, ArcpBase):
+        return uri.authority
+    if is_arcp_uri(uri):
+        return parse_arcp(uri).netloc
+    return uri
+
+def _member_path(name):
+    """Normalized absolute path of archive member name"""
+    return remove_dot_segments("/" + name.lstrip("/"), strict=False)
@@ -25,6 +25,7 @@ to identify the archive.
 based on a pseudo-random generator. Use 
 :func:`urllib.parse.urljoin()` to 
 resolve paths within the same archive.
+:func:`arcp_random_many()` generates many such URIs at once.
 
 :func:`arcp_uuid()` can be used with a pre-made UUID instance,
 for instance loaded from an archive's manifest
@@ -36,6 +37,16 @@ its location URL, facilitating a UUID v5 authority.
 :func:`arcp_name()` can be used to identify an archive based on its
 absolute DNS name or package name within an installation.
 
+:class:`ArcpBase` can be used to generate many URIs within the 
+same archive, e.g. for each of its files.
+
+:func:`arcp_hash()` and :func:`arcp_hash_file()` can be used to identify 
+an archive based on a hash checksum of its bytes, while 
+:func:`arcp_hash_many()` hashes many archive files concurrently.
+:func:`arcp_hash_file_multi()` hashes an archive file with several
+methods, like ``sha-256`` and ``sha-512``, reading it only once.
+:class:`HashingWriter` hashes an archive as it is written.
+
 .. _draft-soilandreyes-arcp: https://tools.ietf.org/id/draft-soilandreyes-arcp-03.html
 """
 
@@ -45,13 +56,23 @@ __license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/
 
 from uuid import uuid4, uuid5, UUID, NAMESPACE_URL
 
-try:
-    from urllib.parse import urlunsplit
-except:
-    from urlparse import urlunsplit
+from urllib.parse import urlunsplit, quote as _quote
+import queue
 
 import re
-from hashlib import sha256
+import io
+import os
+import mmap
+import threading
+import collections
+from collections import namedtuple, OrderedDict
+from concurrent.futures import (Executor, ThreadPoolExecutor, ProcessPoolExecutor, 
+    FIRST_COMPLETED, wait as futures_wait)
+
+from .parse import CacheInfo, parse_arcp
+import hashlib
+from hashlib import sha1, sha256, sha384, sha512
+from functools import partial
 from base64 import urlsafe_b64encode, urlsafe_b64decode
 
 SCHEME="arcp"
@@ -113,6 +134,59 @@ def arcp_random(path="/", query=None, fragment=None, uuid=None):
         raise Exception("UUID is not v4" % uuid)
     return arcp_uuid(uuid, path=path, query=query, fragment=fragment)
 
+def arcp_random_many(n, path="/", query=None, fragment=None):
+    """Generate a list of n arcp URIs, each using a fresh random uuid.
+
+    Parameters:
+      - n -- number of URIs to generate
+      - path -- Optional path within archive.
+      - query -- Optional query component.
+      - fragment -- Optional fragment component.
+
+    Equivalent to calling :func:`arcp_random()` n times, but reads 
+    random bytes from :func:`os.urandom()` in large blocks, and 
+    formats the URIs directly rather than through :class:`uuid.UUID`.
+    """
+    # Everything after the uuid is the same for each URI
+    suffix = _uuid_uri_suffix(path, query, fragment)
+    uri = (_UUID_PREFIX + "%s-%s-%s-%s-%s" + suffix.replace("%", "%%"))
+    return [uri % u for u in _random_uuid_fields(n)]
+
+_UUID_PREFIX = SCHEME + "://uuid,"
+_NIL_UUID = UUID(int=0)
+
+def _uuid_uri_suffix(path="/", query=None, fragment=None):
+    """Return what follows the uuid in an URI from :func:`arcp_uuid()`"""
+    if path == "/" and query is None and fragment is None:
+        return "/"
+    return arcp_uuid(_NIL_UUID, path, query, fragment)[len(_UUID_PREFIX)+36:]
+# UUIDs per os.urandom() call
+_RANDOM_BLOCK = 4096
+
+def _uuid4_masks(count):
+    """Return (and_mask, or_mask) integers to set version 4 and 
+    RFC 4122 variant bits of count concatenated 16-byte random values
+    """
+    # version in high nibble of byte 6, variant in high 2 bits of byte 8
+    and_mask = (b"\xff" * 6 + b"\x0f\xff\x3f" + b"\xff" * 7) * count
+    or_mask = (b"\x00" * 6 + b"\x40\x00\x80" + b"\x00" * 7) * count
+    return (int.from_bytes(and_mask, "big"), int.from_bytes(or_mask, "big"))
+_UUID4_MASKS = _uuid4_masks(_RANDOM_BLOCK)
+
+def _random_uuid_fields(n):
+    """Generate n random UUID v4 as 5-tuples of hex strings"""
+    while n > 0:
+        count = min(n, _RANDOM_BLOCK)
+        if count == _RANDOM_BLOCK:
+            (and_mask, or_mask) = _UUID4_MASKS
+        else:
+            (and_mask, or_mask) = _uuid4_masks(count)
+        x = int.from_bytes(os.urandom(16 * count), "big")
+        h = "%0*x" % (32 * count, (x & and_mask) | or_mask)
+        for i in range(0, 32 * count, 32):
+            yield (h[i:i+8], h[i+8:i+12], h[i+12:i+16], h[i+16:i+20], h[i+20:i+32])
+        n -= count
+
 def arcp_location(location, path="/", query=None, fragment=None, namespace=NAMESPACE_URL):
     """Generate an arcp URI for a given archive location.
 
@@ -127,6 +201,104 @@ def arcp_location(location, path="/", query=None, fragment=None, namespace=NAMES
     uuid = uuid5(namespace, location)
     return arcp_uuid(uuid, path=path, query=query, fragment=fragment)
     
+class LocationMinter(object):
+    """Generate arcp URIs for archive locations within one namespace.
+
+    Gives the same URIs as :func:`arcp_location()`, but 
+    the namespace is hashed only once, and the UUIDs of the
+    most recently used locations are kept for reuse::
+
+        >>> minter = LocationMinter()
+        >>> minter.mint("http://example.com/data.zip", "/file.txt")
+        'arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/file.txt'
+
+    Parameters:
+      - namespace -- optional namespace UUID for non-URL location.
+      - maxsize -- Optional number of locations to keep, or 0 to keep none.
+    
+    A minter can be shared between threads.
+    """
+
+    def __init__(self, namespace=NAMESPACE_URL, maxsize=65536):
+        if not isinstance(namespace, UUID):
+            namespace = UUID(namespace)
+        self.namespace = namespace
+        self.maxsize = maxsize
+        # UUID v5 is SHA1 of namespace + name
+        self._sha1 = sha1(namespace.bytes)
+        self._uuids = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _uuid_str(self, location):
+        """Return UUID v5 string for location, as from :func:`uuid.uuid5()`"""
+        if self.maxsize:
+            with self._lock:
+                u = self._uuids.get(location)
+                if u is not None:
+                    self._hits += 1
+                    self._uuids.move_to_end(location)
+                    return u
+                self._misses += 1
+        h = self._sha1.copy()
+        if isinstance(location, bytes):
+            h.update(location)
+        else:
+            h.update(location.encode("utf-8"))
+        x = int.from_bytes(h.digest()[:16], "big")
+        # set version 5 and RFC 4122 variant bits
+        x = (x & _UUID_MASK) | _UUID5_BITS
+        u = "%032x" % x
+        u = "%s-%s-%s-%s-%s" % (u[:8], u[8:12], u[12:16], u[16:20], u[20:])
+        if self.maxsize:
+            with self._lock:
+                self._uuids[location] = u
+                if len(self._uuids) > self.maxsize:
+                    self._uuids.popitem(last=False)
+        return u
+
+    def uuid(self, location):
+        """Return the :class:`uuid.UUID` v5 for a location, as from :func:`uuid.uuid5()`"""
+        return UUID(self._uuid_str(location))
+
+    def mint(self, location, path="/", query=None, fragment=None):
+        """Generate an arcp URI for a given archive location.
+
+        Parameters:
+          - location: URL or location of archive, e.g. ``http://example.com/data.zip``
+          - path -- Optional path within archive.
+          - query -- Optional query component.
+          - fragment -- Optional fragment component.
+        """
+        suffix = _uuid_uri_suffix(path, query, fragment)
+        return _UUID_PREFIX + self._uuid_str(location) + suffix
+
+    def mint_many(self, locations, path="/", query=None, fragment=None):
+        """Generate a list of arcp URIs for many archive locations, 
+        each with the same path, query and fragment.
+        """
+        prefix = _UUID_PREFIX
+        suffix = _uuid_uri_suffix(path, query, fragment)
+        uuid_str = self._uuid_str
+        return [prefix + uuid_str(location) + suffix for location in locations]
+
+    def cache_info(self):
+        """Return cache statistics as (hits, misses, maxsize, currsize)."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, 
+                             self.maxsize, len(self._uuids))
+
+    def clear(self):
+        """Remove all kept locations and reset statistics."""
+        with self._lock:
+            self._uuids.clear()
+            self._hits = self._misses = 0
+
+# Clear version nibble (byte 6) and variant bits (byte 8) of 128-bit UUID
+_UUID_MASK = ~((0xf000 << 64) | (0xc000 << 48)) & ((1 << 128) - 1)
+_UUID5_BITS = (0x5000 << 64) | (0x8000 << 48)
+
 def arcp_name(name, path="/", query=None, fragment=None):
     """Generate an arcp URI for a given archive name.
 
@@ -143,7 +315,92 @@ def arcp_name(name, path="/", query=None, fragment=None):
     s = (SCHEME, authority, path, query, fragment)
     return urlunsplit(s)
 
-def arcp_hash(bytes=b"", path="/", query=None, fragment=None, hash=None):
+class NIAlgorithm(namedtuple("NIAlgorithm", "name new truncate")):
+    """RFC6920_ hash algorithm for ni URIs.
+
+    - name -- RFC6920 hash name, e.g. ``sha-256-128``
+    - new -- function returning a new :mod:`hashlib` hash instance
+    - truncate -- number of digest bytes to keep, or None for the full digest
+
+    .. _RFC6920: https://www.iana.org/assignments/named-information/named-information.xhtml
+    """
+    __slots__ = ()
+
+_NI_ALGORITHMS = {}
+# (hash.name, hash.digest_size) for each RFC6920 name
+_NI_HASH_KEYS = {}
+# Untruncated NIAlgorithm for each (hash.name, hash.digest_size)
+_NI_HASHES = {}
+
+def register_ni_algorithm(name, new, truncate=None):
+    """Register a hash algorithm for use with :func:`arcp_hash()`.
+
+    Parameters:
+      - name -- RFC6920 hash name, e.g. ``sha-256-128``
+      - new -- function returning a new :mod:`hashlib` hash instance, e.g. :func:`hashlib.sha256`
+      - truncate -- Optional number of digest bytes to keep, e.g. ``16``
+    
+    Returns the registered :class:`NIAlgorithm`.
+    """
+    name = name.lower()
+    h = new()
+    if truncate is not None and not 0 < truncate <= h.digest_size:
+        raise ValueError("Can't truncate %s digest of %s bytes to %s bytes" % 
+                         (h.name, h.digest_size, truncate))
+    algorithm = NIAlgorithm(name, new, truncate)
+    key = (h.name, h.digest_size)
+    _NI_ALGORITHMS[name] = algorithm
+    _NI_HASH_KEYS[name] = key
+    if truncate is None:
+        _NI_HASHES[key] = algorithm
+    return algorithm
+
+def ni_algorithm(method=None, hash=None):
+    """Look up a registered :class:`NIAlgorithm`.
+
+    Parameters:
+      - method -- Optional RFC6920 hash name, e.g. ``sha-256-128``
+      - hash -- Optional hash instance, e.g. from :func:`hashlib.sha512()`
+
+    If neither is provided, ``sha-256`` is returned. 
+    If only ``hash`` is provided, the untruncated algorithm is returned.
+    """
+    if method is not None:
+        algorithm = _NI_ALGORITHMS.get(method.lower())
+        if algorithm is None:
+            raise Exception("Unknown ni hash method: %s" % method)
+        if hash is not None and _NI_HASH_KEYS[algorithm.name] != (hash.name, hash.digest_size):
+            raise Exception("hash %s does not match ni hash method %s" % 
+                            (hash.name, method))
+        return algorithm
+    if hash is None:
+        return _NI_ALGORITHMS["sha-256"]
+    algorithm = _NI_HASHES.get((hash.name, hash.digest_size))
+    if algorithm is None:
+        raise Exception("hash method %s unsupported, try sha256" % hash.name)
+    return algorithm
+
+# Named Information Hash Algorithm Registry
+# https://www.iana.org/assignments/named-information/named-information.xhtml
+register_ni_algorithm("sha-256", sha256)
+register_ni_algorithm("sha-256-128", sha256, 16)
+register_ni_algorithm("sha-256-120", sha256, 15)
+register_ni_algorithm("sha-256-96", sha256, 12)
+register_ni_algorithm("sha-256-64", sha256, 8)
+register_ni_algorithm("sha-256-32", sha256, 4)
+register_ni_algorithm("sha-384", sha384)
+register_ni_algorithm("sha-512", sha512)
+if hasattr(hashlib, "sha3_256"):
+    register_ni_algorithm("sha3-224", hashlib.sha3_224)
+    register_ni_algorithm("sha3-256", hashlib.sha3_256)
+    register_ni_algorithm("sha3-384", hashlib.sha3_384)
+    register_ni_algorithm("sha3-512", hashlib.sha3_512)
+if hasattr(hashlib, "blake2b"):
+    register_ni_algorithm("blake2s-256", hashlib.blake2s)
+    register_ni_algorithm("blake2b-256", partial(hashlib.blake2b, digest_size=32))
+    register_ni_algorithm("blake2b-512", hashlib.blake2b)
+
+def arcp_hash(bytes=b"", path="/", query=None, fragment=None, hash=None, method=None):
     """Generate an arcp URI for a given archive hash checksum.
 
     Parameters:
@@ -152,25 +409,672 @@ def arcp_hash(bytes=b"", path="/", query=None, fragment=None, hash=None):
       - query -- Optional query component.
       - fragment -- Optional fragment component.
       - hash -- Optional hash instance from :func:`hashlib.sha256()`
+      - method -- Optional RFC6920 hash name, e.g. ``sha-512`` or ``sha-256-128``
     
     Either ``bytes`` or ``hash`` must be provided. 
     The ``hash`` parameter can be provided to avoid representing 
     the whole archive bytes in memory.
+
+    The default method is ``sha-256``, or the untruncated 
+    method matching ``hash``. Truncated methods like ``sha-256-32``
+    give shorter URIs, but are more likely to collide.
+    See :func:`register_ni_algorithm()` to add more methods.
     """
+    authority = _ni_authority(bytes, hash, method)
+    s = (SCHEME, authority, path, query, fragment)
+    return urlunsplit(s)
+
+def _ni_authority(bytes=b"", hash=None, method=None):
+    """Return arcp authority "ni,alg;val" as for :func:`arcp_hash()`"""
+    algorithm = ni_algorithm(method, hash)
     if hash is None:
-        hash = sha256()
-    elif hash.name != "sha256":
-        # TODO: Map Python's hash-names to RFC6920
-        raise Exception("hash method %s unsupported, try sha256" % hash.name)
-    hashmethod = "sha-256"
+        hash = algorithm.new()
 
     # Tip: if bytes == b"" then provided hash param is unchanged
     hash.update(bytes)
+    return _ni_digest_authority(algorithm, hash.digest())
+
+def _ni_digest_authority(algorithm, digest):
+    """Return arcp authority "ni,alg;val" for the untruncated digest of algorithm"""
+    if algorithm.truncate is not None:
+        digest = digest[:algorithm.truncate]
 
     # RFC6920-style hash encoding
-    digestB64 = urlsafe_b64encode(hash.digest())
+    digestB64 = urlsafe_b64encode(digest)
     digestB64 = digestB64.decode("ascii").strip("=")
-    authority = "ni,%s;%s" % (hashmethod, digestB64)
-    s = (SCHEME, authority, path, query, fragment)
-    return urlunsplit(s)
+    return "ni,%s;%s" % (algorithm.name, digestB64)
+
+# RFC3986 pchar and "/" that need no percent-encoding in a path
+_PATH_SAFE = "/:@!$&'()*+,;="
+
+class ArcpBase(object):
+    """Base arcp URI of an archive, for generating URIs within it.
+
+    Create using one of :meth:`from_uuid`, :meth:`from_random`, 
+    :meth:`from_location`, :meth:`from_name`, :meth:`from_hash` 
+    or :meth:`from_uri`, then use :meth:`uri` or :meth:`uris`
+    for paths within the archive::
+
+        >>> base = ArcpBase.from_name("app.example.com")
+        >>> base.uri("/css/style.css")
+        'arcp://name,app.example.com/css/style.css'
+        >>> base.uris(["a.txt", "b c.txt"], quote=True)
+        ['arcp://name,app.example.com/a.txt', 'arcp://name,app.example.com/b%20c.txt']
+
+    The URIs are the same as from :func:`arcp_uuid()`, :func:`arcp_name()` etc., 
+    but the authority is only computed once.
+    """
+    __slots__ = ("authority", "_prefix")
+
+    def __init__(self, authority):
+        """Base for an arcp authority, e.g. ``"name,app.example.com"``"""
+        self.authority = authority
+        self._prefix = SCHEME + "://" + authority
+
+    @classmethod
+    def from_uuid(cls, uuid):
+        """Base for a uuid string or UUID instance, as for :func:`arcp_uuid()`"""
+        if not isinstance(uuid, UUID):
+            # ensure valid UUID
+            uuid = UUID(uuid)
+        return cls("uuid,%s" % uuid)
+
+    @classmethod
+    def from_random(cls):
+        """Base for a fresh random uuid, as for :func:`arcp_random()`"""
+        return cls.from_uuid(uuid4())
+
+    @classmethod
+    def from_location(cls, location, namespace=NAMESPACE_URL):
+        """Base for an archive location, as for :func:`arcp_location()`"""
+        return cls.from_uuid(uuid5(namespace, location))
+
+    @classmethod
+    def from_name(cls, name):
+        """Base for an archive name, as for :func:`arcp_name()`"""
+        if not _REG_NAME.match(name):
+            raise Exception("Invalid name: %s" % name)
+        return cls("name," + name)
+
+    @classmethod
+    def from_hash(cls, bytes=b"", hash=None, method=None):
+        """Base for archive bytes or hash, as for :func:`arcp_hash()`"""
+        return cls(_ni_authority(bytes, hash, method))
+
+    @classmethod
+    def from_uri(cls, uri):
+        """Base for the authority of an existing arcp URI"""
+        return cls(parse_arcp(uri).netloc)
+
+    def uri(self, path="/", query=None, fragment=None, quote=False):
+        """Generate an arcp URI within this archive.
+
+        Parameters:
+          - path -- Optional path within archive.
+          - query -- Optional query component.
+          - fragment -- Optional fragment component.
+          - quote -- If True, percent-encode characters not allowed in URI paths, 
+            e.g. for file names within a ZIP file.
+        """
+        if quote and path:
+            path = _quote(path, _PATH_SAFE)
+        # Same rules as urlunsplit()
+        if path and path[0] != "/":
+            path = "/" + path
+        u = self._prefix + (path or "")
+        if query:
+            u += "?" + query
+        if fragment:
+            u += "#" + fragment
+        return u
+
+    def uris(self, paths, quote=False):
+        """Generate a list of arcp URIs for many paths within this archive.
+
+        Parameters:
+          - paths -- iterable of paths within archive, e.g. from :meth:`zipfile.ZipFile.namelist()`
+          - quote -- If True, percent-encode characters not allowed in URI paths
+        """
+        prefix = self._prefix
+        if quote:
+            paths = [_quote(p, _PATH_SAFE) for p in paths]
+        return [prefix + p if not p or p[0] == "/" else prefix + "/" + p 
+                for p in paths]
+
+    def __str__(self):
+        return self._prefix + "/"
+
+    def __repr__(self):
+        return "ArcpBase(%r)" % self.authority
+
+    def __eq__(self, other):
+        return isinstance(other, ArcpBase) and self.authority == other.authority
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.authority)
+
+# 1 MiB reads keep the number of system calls and hash.update() calls low
+_CHUNK_SIZE = 1 << 20
+
+def arcp_hash_file(file, path="/", query=None, fragment=None, hash=None, method=None,
+                   chunk_size=_CHUNK_SIZE, use_mmap=False, overlap=False, cache=None):
+    """Generate an arcp URI for a given archive file by its hash checksum.
+
+    The file is read in chunks of ``chunk_size`` bytes, 
+    so the archive is never fully represented in memory.
+
+    Parameters:
+      - file -- filename of archive, or file object opened in binary mode
+      - path -- Optional path within archive.
+      - query -- Optional query component.
+      - fragment -- Optional fragment component.
+      - hash -- Optional hash instance from :func:`hashlib.sha256()`
+      - method -- Optional RFC6920 hash name as for :func:`arcp_hash()`
+      - chunk_size -- Optional number of bytes to read at a time
+      - use_mmap -- If True, hash a memory-map of the file instead of reading it,
+        if it is a regular file opened with :func:`open()`
+      - overlap -- If True, read the next chunk in a background thread 
+        while hashing the current chunk
+      - cache -- Optional :class:`arcp.hashcache.HashCache` to look up 
+        and store the digest of a filename, so unchanged files are not read again
+    
+    The file object is read from its current position and is not closed.
+    If the file can't be memory-mapped (e.g. a pipe or an empty file), 
+    it is read as usual.
+    """
+    algorithm = ni_algorithm(method, hash)
+    if cache is not None and hash is None and (
+            isinstance(file, (str, bytes)) or hasattr(file, "__fspath__")):
+        authority = cache.authority(file, algorithm.name, 
+            chunk_size=chunk_size, use_mmap=use_mmap, overlap=overlap)
+        return urlunsplit((SCHEME, authority, path, query, fragment))
+    if hash is None:
+        hash = algorithm.new()
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "rb") as f:
+            _hash_fileobj(f, hash, chunk_size, use_mmap, overlap)
+    else:
+        _hash_fileobj(file, hash, chunk_size, use_mmap, overlap)
+    return arcp_hash(path=path, query=query, fragment=fragment, 
+                     hash=hash, method=algorithm.name)
+
+def _hash_fileobj(f, hash, chunk_size=_CHUNK_SIZE, use_mmap=False, overlap=False):
+    """Update hash with the remaining bytes of file object f"""
+    if use_mmap and _hash_mmap(f, hash, chunk_size):
+        return
+    if not hasattr(f, "readinto"):
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hash.update(chunk)
+    elif overlap:
+        _hash_overlapped(f, hash, chunk_size)
+    else:
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        n = f.readinto(buf)
+        while n:
+            hash.update(view[:n])
+            n = f.readinto(buf)
+
+def _hash_mmap(f, hash, chunk_size):
+    """Update hash from a read-only mmap of f, return False if f can't be mapped"""
+    raw = f.raw if isinstance(f, (io.BufferedReader, io.BufferedRandom)) else f
+    if not isinstance(raw, io.FileIO):
+        # e.g. gzip.GzipFile, whose fileno() has the compressed bytes
+        return False
+    try:
+        fileno = f.fileno()
+        start = f.tell()
+        m = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # No fileno, pipe/socket or empty file
+        return False
+    try:
+        view = memoryview(m)
+        try:
+            # hash.update() on big slices releases the GIL, 
+            # but keep them modest to play well with page-out
+            for i in range(start, len(m), chunk_size):
+                with view[i:i+chunk_size] as chunk:
+                    hash.update(chunk)
+        finally:
+            view.release()
+        f.seek(len(m))
+    finally:
+        m.close()
+    return True
+
+def _hash_overlapped(f, hash, chunk_size, buffers=3):
+    """Update hash while a background thread reads f ahead into a few buffers"""
+    free = queue.Queue()
+    full = queue.Queue()
+    for i in range(buffers):
+        free.put(bytearray(chunk_size))
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                buf = free.get()
+                n = f.readinto(buf)
+                full.put((buf, n, None))
+                if not n:
+                    return
+        except BaseException as e:
+            full.put((None, 0, e))
+
+    t = threading.Thread(target=reader, name="arcp_hash_file reader")
+    t.daemon = True
+    t.start()
+    try:
+        while True:
+            (buf, n, error) = full.get()
+            if error is not None:
+                raise error
+            if not n:
+                break
+            with memoryview(buf) as view:
+                hash.update(view[:n])
+            free.put(buf)
+    finally:
+        # Unblock reader if we failed
+        stop.set()
+        free.put(bytearray(0))
+        t.join()
+
+def arcp_hash_multi(bytes=b"", methods=("sha-256", "sha-512"), path="/", 
+                    query=None, fragment=None, threads=None):
+    """Generate arcp URIs for the same archive bytes with several hash methods.
+
+    Parameters:
+      - bytes -- bytes of archive to checksum
+      - methods -- RFC6920 hash names as for :func:`arcp_hash()`
+      - path -- Optional path within archive.
+      - query -- Optional query component.
+      - fragment -- Optional fragment component.
+      - threads -- If True, update the hashes in parallel threads, 
+        if False one after another. The default is True on multi-core machines.
+    
+    Returns an :class:`collections.OrderedDict` mapping each 
+    method name to its arcp URI, in the order of ``methods``.
+    """
+    with MultiHash(methods, threads) as multi:
+        multi.update(bytes)
+        return multi.arcp_uris(path, query, fragment)
+
+def arcp_hash_file_multi(file, methods=("sha-256", "sha-512"), path="/", 
+                         query=None, fragment=None, threads=None, 
+                         chunk_size=_CHUNK_SIZE, use_mmap=False, overlap=False):
+    """Generate arcp URIs for an archive file with several hash methods,
+    reading the file only once.
+
+    Parameters:
+      - file -- filename of archive, or file object opened in binary mode
+      - methods -- RFC6920 hash names as for :func:`arcp_hash()`, 
+        e.g. ``("sha-256", "sha-512")``
+      - path -- Optional path within archive.
+      - query -- Optional query component.
+      - fragment -- Optional fragment component.
+      - threads -- If True, update the hashes of each chunk in parallel threads, 
+        if False one after another. The default is True on multi-core machines.
+      - chunk_size, use_mmap, overlap -- as for :func:`arcp_hash_file()`
+    
+    Returns an :class:`collections.OrderedDict` mapping each 
+    method name to its arcp URI, in the order of ``methods``.
+    Methods that only differ by truncation, like ``sha-256`` and 
+    ``sha-256-128``, share a single hash.
+    """
+    with MultiHash(methods, threads) as multi:
+        if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+            with open(file, "rb") as f:
+                _hash_fileobj(f, multi, chunk_size, use_mmap, overlap)
+        else:
+            _hash_fileobj(file, multi, chunk_size, use_mmap, overlap)
+        return multi.arcp_uris(path, query, fragment)
+
+class MultiHash(object):
+    """Several hashes updated together, for :func:`arcp_hash_file_multi()`.
+
+    Parameters:
+      - methods -- RFC6920 hash names as for :func:`arcp_hash()`
+      - threads -- If True, update the hashes in parallel threads, 
+        if False one after another. The default is True on multi-core machines.
+    
+    :meth:`update()` can be used wherever a single :mod:`hashlib` 
+    hash instance is updated. As :mod:`hashlib` releases the GIL 
+    while hashing large buffers, the hashes of each chunk are computed 
+    in parallel, so the total time is close to that of the slowest hash.
+
+    Use as a context manager, or call :meth:`close()`, to stop the threads.
+    """
+
+    # Smaller updates are not worth handing over to another thread
+    _THREAD_MIN = 1 << 16
+
+    def __init__(self, methods=("sha-256", "sha-512"), threads=None):
+        if isinstance(methods, str):
+            methods = (methods,)
+        self.algorithms = OrderedDict()
+        # (hash.name, hash.digest_size) -> hash instance
+        hashes = OrderedDict()
+        for method in methods:
+            algorithm = ni_algorithm(method)
+            self.algorithms[algorithm.name] = algorithm
+            key = _NI_HASH_KEYS[algorithm.name]
+            if key not in hashes:
+                hashes[key] = algorithm.new()
+        if not self.algorithms:
+            raise ValueError("At least one hash method is required")
+        self._hashes = hashes
+        if threads is None:
+            threads = (os.cpu_count() or 1) > 1
+        self._pool = None
+        if threads and len(hashes) > 1:
+            self._pool = ThreadPoolExecutor(len(hashes) - 1)
+
+    def update(self, data):
+        """Update all hashes with data"""
+        hashes = list(self._hashes.values())
+        if self._pool is None or len(data) < self._THREAD_MIN:
+            for h in hashes:
+                h.update(data)
+            return
+        futures = [self._pool.submit(h.update, data) for h in hashes[1:]]
+        try:
+            hashes[0].update(data)
+        finally:
+            # data must not be reused before all hashes have read it
+            futures_wait(futures)
+        for future in futures:
+            future.result()
+
+    def hash(self, method):
+        """Return the hash instance used for method"""
+        algorithm = ni_algorithm(method)
+        if algorithm.name not in self.algorithms:
+            raise KeyError(method)
+        return self._hashes[_NI_HASH_KEYS[algorithm.name]]
+
+    def arcp_uris(self, path="/", query=None, fragment=None):
+        """Return an :class:`collections.OrderedDict` of each method name 
+        to the arcp URI for the data hashed so far"""
+        uris = OrderedDict()
+        for (name, algorithm) in self.algorithms.items():
+            # copy so further updates are still possible
+            hash = self._hashes[_NI_HASH_KEYS[name]].copy()
+            uris[name] = arcp_hash(path=path, query=query, fragment=fragment, 
+                                   hash=hash, method=name)
+        return uris
+
+    def close(self):
+        """Stop the threads, hashes can't be updated in parallel after closing"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class HashingWriter(io.RawIOBase):
+    """Writable binary stream that hashes the bytes written to a file, 
+    to generate an arcp URI for an archive while it is written.
+
+    Parameters:
+      - file -- filename to create, or binary file object to write to
+      - method -- Optional RFC6920 hash name as for :func:`arcp_hash()`
+      - hash -- Optional hash instance from :func:`hashlib.sha256()`
+      - seekable -- If True, allow seeking back to patch bytes already written
+      - checkpoint_interval -- Bytes between saved hash states when seekable
+
+    Only bytes written through the writer are hashed, starting from 
+    the position of ``file`` when the writer was created. 
+    After closing, :attr:`uri` is the arcp URI of those bytes. 
+    The file is closed if it was opened from a filename.
+
+    By default the writer is not seekable, so :class:`zipfile.ZipFile` 
+    writes a data descriptor after each member instead of seeking back 
+    to patch its local header, and the archive is hashed in a single pass::
+
+        >>> with HashingWriter("example.zip") as w:
+        ...     with zipfile.ZipFile(w, "w") as z:
+        ...         z.writestr("hello.txt", "Hello World!")
+        >>> w.uri
+        'arcp://ni,sha-256;...'
+
+    With ``seekable=True``, writing before the end of the hashed bytes 
+    rewinds the hash to a saved state at or before that position, and 
+    the bytes from there are read back from the file when hashing resumes. 
+    This requires a readable file, like one opened with ``"w+b"``, 
+    otherwise the writer is not seekable.
+    """
+
+    def __init__(self, file, method=None, hash=None, seekable=False, 
+                 checkpoint_interval=_CHUNK_SIZE):
+        super(HashingWriter, self).__init__()
+        self.algorithm = ni_algorithm(method, hash)
+        if hash is None:
+            hash = self.algorithm.new()
+        self._close_file = isinstance(file, (str, bytes)) or hasattr(file, "__fspath__")
+        if self._close_file:
+            file = open(file, "w+b")
+        self._file = file
+        self._seekable = bool(seekable) and _file_can(file, "seekable") and _file_can(file, "readable")
+        try:
+            self._start = file.tell()
+        except (AttributeError, OSError):
+            # e.g. a pipe
+            self._start = 0
+            self._seekable = False
+        self.checkpoint_interval = checkpoint_interval
+        self.uri = None
+        self._hash = hash
+        # positions relative to _start
+        self._pos = 0
+        self._size = 0
+        self._hashed = 0
+        # (position, hash state) in increasing order
+        self._checkpoints = [(0, hash.copy())] if self._seekable else []
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return self._seekable
+
+    def tell(self):
+        self._checkClosed()
+        return self._start + self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if not self._seekable:
+            raise io.UnsupportedOperation("HashingWriter is not seekable")
+        if whence == io.SEEK_SET:
+            pos = offset - self._start
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError("Invalid whence: %s" % whence)
+        if pos < 0:
+            raise ValueError("Can't seek before start of hashed bytes: %s" % offset)
+        self._file.seek(self._start + pos)
+        self._pos = pos
+        return self._start + pos
+
+    def write(self, b):
+        self._checkClosed()
+        view = memoryview(b)
+        if view.format != "B" or view.ndim != 1:
+            view = view.cast("B")
+        with view:
+            if self._pos < self._hashed:
+                self._rewind(self._pos)
+            if self._pos > self._hashed:
+                self._catch_up(self._pos)
+            n = self._file.write(view)
+            if n is None:
+                # non-blocking raw file
+                return None
+            self._update(view[:n])
+        self._pos += n
+        self._size = max(self._size, self._pos)
+        return n
+
+    def flush(self):
+        if not self.closed:
+            self._file.flush()
+
+    def _update(self, data):
+        """Hash data written at _hashed, saving a checkpoint every interval"""
+        self._hash.update(data)
+        self._hashed += len(data)
+        if self._seekable and self._hashed - self._checkpoints[-1][0] >= self.checkpoint_interval:
+            self._checkpoints.append((self._hashed, self._hash.copy()))
+
+    def _rewind(self, pos):
+        """Restore the hash state from the last checkpoint at or before pos"""
+        while self._checkpoints[-1][0] > pos:
+            self._checkpoints.pop()
+        (self._hashed, hash) = self._checkpoints[-1]
+        self._hash = hash.copy()
+
+    def _catch_up(self, pos):
+        """Hash the bytes of the file from _hashed to pos, leaving the file at pos"""
+        self._file.seek(self._start + self._hashed)
+        while self._hashed < pos:
+            chunk = self._file.read(min(_CHUNK_SIZE, pos - self._hashed))
+            if not chunk:
+                # a gap beyond the end of file, which is written as zeros
+                self._file.seek(self._start + pos)
+                while self._hashed < pos:
+                    self._update(bytes(min(_CHUNK_SIZE, pos - self._hashed)))
+                break
+            self._update(chunk)
+
+    def arcp_uri(self, path="/", query=None, fragment=None):
+        """Generate the arcp URI for the bytes written so far"""
+        if self.uri is None:
+            self._checkClosed()
+            if self._hashed < self._size:
+                self._catch_up(self._size)
+                self._file.seek(self._start + self._pos)
+        return arcp_hash(path=path, query=query, fragment=fragment,
+                         hash=self._hash.copy(), method=self.algorithm.name)
+
+    def close(self):
+        """Finish hashing, set :attr:`uri` and close the file if opened by the writer"""
+        if self.closed:
+            return
+        try:
+            self.uri = self.arcp_uri()
+            self._checkpoints = []
+        finally:
+            try:
+                # flushes the file
+                super(HashingWriter, self).close()
+            finally:
+                if self._close_file:
+                    self._file.close()
+
+def _file_can(f, method):
+    """Return the result of f.seekable()/f.readable(), or False if missing"""
+    try:
+        return getattr(f, method)()
+    except (AttributeError, ValueError, OSError):
+        return False
+
+def arcp_hash_many(files, path="/", query=None, fragment=None, 
+                   workers=None, executor="thread", ordered=True, **kwargs):
+    """Generate arcp URIs for many archive files by their hash checksums.
+
+    Files are hashed concurrently as with :func:`arcp_hash_file()`, 
+    returning an iterator of ``(file, uri, error)`` tuples where either
+    ``uri`` is the arcp URI, or ``error`` is the exception from hashing 
+    that file. An error does not stop the remaining files from being hashed.
+
+    Parameters:
+      - files -- iterable of filenames (or binary file objects if executor is ``"thread"``)
+      - path -- Optional path within archive.
+      - query -- Optional query component.
+      - fragment -- Optional fragment component.
+      - workers -- Optional number of threads or processes, default is the number of CPUs
+      - executor -- ``"thread"`` (default), ``"process"`` or a 
+        :class:`concurrent.futures.Executor` to use
+      - ordered -- If True (default), results are in the same order as ``files``, 
+        otherwise in order of completion.
+    
+    Any additional keyword arguments like ``method`` or ``use_mmap`` are passed to 
+    :func:`arcp_hash_file()`. 
+    
+    Threads are usually sufficient as :mod:`hashlib` releases the GIL 
+    while hashing large buffers. 
+    """
+    if executor not in ("thread", "process") and not isinstance(executor, Executor):
+        raise ValueError("Unknown executor: %s" % executor)
+    workers = workers or os.cpu_count() or 1
+    return _hash_many(files, (path, query, fragment, kwargs), 
+        executor, workers, ordered)
+
+def _hash_one(file, args):
+    """Return (uri, error) from arcp_hash_file(), for arcp_hash_many()"""
+    (path, query, fragment, kwargs) = args
+    try:
+        return (arcp_hash_file(file, path, query, fragment, **kwargs), None)
+    except Exception as e:
+        return (None, e)
+
+def _hash_many(files, args, executor, workers, ordered):
+    """Generator for arcp_hash_many(), keeping at most 2 files per worker submitted.
+    
+    A pool for ``"thread"`` or ``"process"`` is only created once iterated,
+    and shut down when the generator finishes or is closed.
+    """
+    if executor == "thread":
+        pool = ThreadPoolExecutor(workers)
+    elif executor == "process":
+        pool = ProcessPoolExecutor(workers)
+    else:
+        pool = executor
+    shutdown = pool is not executor
+    max_pending = workers * 2
+    pending = collections.OrderedDict()
+    try:
+        for file in files:
+            pending[pool.submit(_hash_one, file, args)] = file
+            while len(pending) >= max_pending:
+                for result in _hash_completed(pending, ordered):
+                    yield result
+        while pending:
+            for result in _hash_completed(pending, ordered):
+                yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        if shutdown:
+            pool.shutdown(wait=True)
 
+def _hash_completed(pending, ordered):
+    """Remove and return the next completed (file, uri, error) results from pending"""
+    if ordered:
+        (future, file) = pending.popitem(last=False)
+        done = [future]
+        files = [file]
+    else:
+        done = futures_wait(pending, return_when=FIRST_COMPLETED).done
+        files = [pending.pop(future) for future in done]
+    results = []
+    for (future, file) in zip(done, files):
+        try:
+            (uri, error) = future.result()
+        except Exception as e:
+            # e.g. BrokenProcessPool or file object not picklable
+            (uri, error) = (None, e)
+        results.append((file, uri, error))
+    return results
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Persistent cache of archive file hashes for :func:`arcp.generate.arcp_hash_file()`.
+
+A :class:`HashCache` stores the digest of each hashed file in a
+:mod:`sqlite3` database, keyed by the file's device, inode, size and
+modification time, so that an unchanged archive gets its ``ni``
+arcp URI without being read again, even from another process::
+
+    >>> cache = HashCache("/var/cache/myapp/hashes.sqlite")
+    >>> arcp_hash_file("archive.zip", cache=cache)
+    'arcp://ni,sha-256;f4OxZX_x_FO5LcGBSKHWXfwtSx-j1ncoSt3SABJtkGk/'
+
+The cache is opt-in; it is only used when passed as ``cache``.
+"""
+__author__      = "Stian Soiland-Reyes <https://orcid.org/0000-0001-9842-9718>"
+__copyright__   = "Copyright 2018-2020 The University of Manchester"
+__license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/LICENSE-2.0)"
+
+import os
+import time
+import random
+import sqlite3
+from threading import Lock
+from contextlib import contextmanager
+
+from .parse import CacheInfo
+from .generate import (ni_algorithm, _hash_fileobj, _ni_digest_authority,
+    _NI_HASHES, _NI_HASH_KEYS, _CHUNK_SIZE)
+
+_HASHES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    path TEXT NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (device, inode, size, mtime_ns, method)
+);
+CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used);
+CREATE INDEX IF NOT EXISTS hashes_path ON hashes (path, method);
+"""
+
+# Files modified this recently may still change within the same
+# mtime granularity (2 seconds on FAT), so are not cached
+_RACY_NS = 2 * 10**9
+
+# Only record a hit as a new use when the last use is older than this
+_USED_RESOLUTION = 60.0
+
+# Evict after this many new entries
+_EVICT_EVERY = 100
+
+def _default_filename():
+    """Default cache file within the user's cache directory"""
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "arcp", "hashes.sqlite")
+
+def _int64(n):
+    """Map unsigned 64-bit device and inode numbers to sqlite's signed INTEGER"""
+    return n - (1 << 64) if n >= (1 << 63) else n
+
+def _key(st):
+    """Cache key fields (device, inode, size, mtime_ns) of an os.stat_result"""
+    return (_int64(st.st_dev), _int64(st.st_ino), st.st_size, st.st_mtime_ns)
+
+# Connections inherited from a parent process over fork(), which must
+# not be closed in the child, not even by garbage collection
+_INHERITED = []
+
+class _Database(object):
+    """sqlite3 database shared by threads, with a connection per process.
+
+    Parameters:
+      - filename -- database file, created with its directory if missing
+      - timeout -- Seconds to wait for the database while another process writes to it
+    """
+
+    # CREATE ... IF NOT EXISTS statements
+    _SCHEMA = ""
+
+    def __init__(self, filename, timeout=30.0):
+        self.filename = os.fspath(filename)
+        self.timeout = timeout
+        self._lock = Lock()
+        self._db = None
+        self._pid = None
+        with self._lock:
+            self._connection()
+
+    def _connection(self):
+        """Return the database connection of this process, opening it if needed.
+        Call with the lock held."""
+        if self._db is not None:
+            if self._pid == os.getpid():
+                return self._db
+            self._forget_inherited()
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        # autocommit, transactions are started explicitly
+        db = sqlite3.connect(self.filename, timeout=self.timeout,
+                             isolation_level=None, check_same_thread=False)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.OperationalError:
+            # e.g. on a network file system, keep the default rollback journal
+            pass
+        db.executescript(self._SCHEMA)
+        self._db = db
+        self._pid = os.getpid()
+        return db
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the lock and a write transaction, yielding the connection"""
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def close(self):
+        """Close the database connection, it is opened again if used"""
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            elif self._db is not None:
+                self._forget_inherited()
+            self._db = None
+
+    def _forget_inherited(self):
+        """Keep the parent's connection after fork() without closing it,
+        as sqlite may then checkpoint or remove the parent's WAL file"""
+        _INHERITED.append(self._db)
+        self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class HashCache(_Database):
+    """Persistent cache of file digests in a :mod:`sqlite3` database.
+
+    Parameters:
+      - filename -- Optional database file, by default ``arcp/hashes.sqlite``
+        within ``$XDG_CACHE_HOME`` or ``~/.cache``
+      - max_age -- Optional seconds since an entry was last used before it is evicted
+      - max_entries -- Optional maximum number of entries, evicting the least recently used
+      - verify_rate -- Fraction of cache hits, between 0.0 and 1.0,
+        where the file is hashed again to detect stale entries
+      - timeout -- Seconds to wait for the database while another process writes to it
+
+    Entries are keyed by the file's device, inode, size and modification
+    time in nanoseconds, and the hash method, so a changed file is
+    hashed again. Files modified in the last two seconds are not cached,
+    as they may still change without a new modification time.
+
+    A file modified without changing its size and modification time,
+    e.g. restored with ``touch -d``, gives a stale entry. Set ``verify_rate``,
+    or call :meth:`verify()` periodically, to detect and replace such entries.
+
+    The database is in write-ahead-log mode where supported, so many
+    processes and threads can read it while one writes.
+    Each process opens its own connection, also after :func:`os.fork()`
+    or when the cache is pickled for a :class:`concurrent.futures.ProcessPoolExecutor`.
+    """
+
+    _SCHEMA = _HASHES_SCHEMA
+
+    def __init__(self, filename=None, max_age=None, max_entries=None,
+                 verify_rate=0.0, timeout=30.0):
+        if not 0.0 <= verify_rate <= 1.0:
+            raise ValueError("verify_rate must be between 0.0 and 1.0: %s" % verify_rate)
+        if filename is None:
+            filename = _default_filename()
+        super(HashCache, self).__init__(filename, timeout)
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.verify_rate = verify_rate
+        self._hits = 0
+        self._misses = 0
+        self._inserts = 0
+        self.evict()
+
+    @staticmethod
+    def _method(algorithm):
+        """Name of the untruncated method to store digests of algorithm under"""
+        return _NI_HASHES.get(_NI_HASH_KEYS[algorithm.name], algorithm).name
+
+    def authority(self, file, method=None, **kwargs):
+        """Return the arcp authority ``ni,alg;val`` of a file,
+        as for :func:`arcp.generate.arcp_hash_file()`"""
+        algorithm = ni_algorithm(method)
+        return _ni_digest_authority(algorithm, self.digest(file, algorithm.name, **kwargs))
+
+    def digest(self, file, method=None, chunk_size=_CHUNK_SIZE, use_mmap=False, overlap=False):
+        """Return the untruncated digest of a file, from the cache if unchanged.
+
+        Parameters:
+          - file -- filename of archive
+          - method -- Optional RFC6920 hash name as for :func:`arcp.generate.arcp_hash()`
+          - chunk_size, use_mmap, overlap -- as for :func:`arcp.generate.arcp_hash_file()`
+            when the file is read
+        """
+        algorithm = ni_algorithm(method)
+        stored = self._method(algorithm)
+        path = os.path.abspath(os.fsdecode(file))
+        key = _key(os.stat(path))
+        rows = self._execute("SELECT digest, used FROM hashes WHERE device=? AND inode=? "
+                             "AND size=? AND mtime_ns=? AND method=?", key + (stored,))
+        args = (chunk_size, use_mmap, overlap)
+        if not rows:
+            with self._lock:
+                self._misses += 1
+            return self._hash_and_store(path, algorithm, stored, args)
+        (digest, used) = rows[0]
+        digest = bytes(digest)
+        with self._lock:
+            self._hits += 1
+        if self.verify_rate and random.random() < self.verify_rate:
+            return self._hash_and_store(path, algorithm, stored, args)
+        now = time.time()
+        if now - used > _USED_RESOLUTION:
+            self._execute("UPDATE hashes SET used=? WHERE device=? AND inode=? "
+                          "AND size=? AND mtime_ns=? AND method=?", (now,) + key + (stored,))
+        return digest
+
+    def _hash_and_store(self, path, algorithm, stored, args):
+        """Hash the file at path and store its digest if cacheable"""
+        (digest, key) = self._hash(path, algorithm, args)
+        if key is not None:
+            self._store(path, stored, key, digest)
+        return digest
+
+    @staticmethod
+    def _hash(path, algorithm, args):
+        """Hash the file at path, return (digest, key), where key is None 
+        if the file changed while reading or was modified too recently to cache"""
+        hash = algorithm.new()
+        with open(path, "rb") as f:
+            before = _key(os.fstat(f.fileno()))
+            _hash_fileobj(f, hash, *args)
+            key = _key(os.fstat(f.fileno()))
+        if key != before or int(time.time() * 1e9) - key[3] <= _RACY_NS:
+            key = None
+        return (hash.digest(), key)
+
+    def _store(self, path, method, key, digest):
+        with self._transaction() as db:
+            # earlier versions of the same file are now obsolete
+            db.execute("DELETE FROM hashes WHERE path=? AND method=?", (path, method))
+            db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       key + (method, digest, path, time.time()))
+            self._inserts += 1
+            evict = self._inserts % _EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self, max_age=None, max_entries=None):
+        """Remove entries unused for ``max_age`` seconds and the least recently
+        used entries beyond ``max_entries``, by default as given to the cache.
+        Return the number of entries removed."""
+        max_age = self.max_age if max_age is None else max_age
+        max_entries = self.max_entries if max_entries is None else max_entries
+        removed = 0
+        with self._lock:
+            db = self._connection()
+            if max_age is not None:
+                removed += db.execute("DELETE FROM hashes WHERE used < ?",
+                                      (time.time() - max_age,)).rowcount
+            if max_entries is not None:
+                removed += db.execute("DELETE FROM hashes WHERE rowid IN "
+                    "(SELECT rowid FROM hashes ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                    (max_entries,)).rowcount
+        return removed
+
+    def verify(self, sample=100):
+        """Hash a random sample of cached files again to detect stale entries.
+
+        Parameters:
+          - sample -- Number of entries to check, or None for all entries
+
+        Entries of files that no longer exist or have changed are removed.
+        Entries with a different digest for an apparently unchanged file
+        are replaced. Return a list of the paths of those stale entries.
+        """
+        if sample is None:
+            rows = self._execute("SELECT path, method, digest, device, inode, size, mtime_ns "
+                                 "FROM hashes")
+        else:
+            rows = self._execute("SELECT path, method, digest, device, inode, size, mtime_ns "
+                                 "FROM hashes ORDER BY RANDOM() LIMIT ?", (sample,))
+        stale = []
+        for (path, method, digest, device, inode, size, mtime_ns) in rows:
+            key = (device, inode, size, mtime_ns)
+            try:
+                (fresh, new_key) = self._hash(path, ni_algorithm(method), 
+                                              (_CHUNK_SIZE, False, False))
+            except OSError:
+                new_key = None
+            if new_key != key:
+                # gone or changed, a new entry is made when hashed again
+                self._execute("DELETE FROM hashes WHERE device=? AND inode=? AND size=? "
+                              "AND mtime_ns=? AND method=?", key + (method,))
+            elif fresh != bytes(digest):
+                stale.append(path)
+                self._store(path, method, key, fresh)
+        return stale
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM hashes")[0][0]
+
+    def cache_info(self):
+        """Return cache statistics of this instance as (hits, misses, maxsize, currsize)."""
+        currsize = len(self)
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.max_entries, currsize)
+
+    def clear(self):
+        """Remove all entries and reset statistics."""
+        self._execute("DELETE FROM hashes")
+        with self._lock:
+            self._hits = self._misses = 0
+
+    def __reduce__(self):
+        # connections can't be pickled, the other process opens its own
+        return (HashCache, (self.filename, self.max_age, self.max_entries,
+                            self.verify_rate, self.timeout))
+
+    def __repr__(self):
+        return "HashCache(%r)" % self.filename
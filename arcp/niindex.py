@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Find archives by the hash in their ``ni`` arcp URIs.
+
+An :class:`NiIndex` maps RFC6920_ digests to the locations of archives
+with those bytes, stored in a :mod:`sqlite3` database, so an
+``arcp://ni,...`` URI can be resolved without scanning the archives::
+
+    >>> index = NiIndex("archives.sqlite")
+    >>> index.scan("/data/archives")
+    2
+    >>> index.lookup("arcp://ni,sha-256;f4OxZX_x_FO5LcGBSKHWXfwtSx-j1ncoSt3SABJtkGk/file.txt")
+    ['/data/archives/hello.zip']
+
+.. _RFC6920: https://tools.ietf.org/html/rfc6920
+"""
+__author__      = "Stian Soiland-Reyes <https://orcid.org/0000-0001-9842-9718>"
+__copyright__   = "Copyright 2018-2020 The University of Manchester"
+__license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/LICENSE-2.0)"
+
+import os
+from binascii import unhexlify
+
+from .parse import parse_arcp, is_arcp_uri, _authority
+from .generate import (ni_algorithm, arcp_hash_many, _ni_digest_authority,
+    _NI_HASHES, _NI_HASH_KEYS)
+from .hashcache import _Database
+
+_NI_SCHEMA = """
+CREATE TABLE IF NOT EXISTS methods (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS locations (
+    id INTEGER PRIMARY KEY,
+    location TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS digests (
+    digest BLOB NOT NULL,
+    method INTEGER NOT NULL,
+    location INTEGER NOT NULL,
+    PRIMARY KEY (digest, method, location)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS digests_location ON digests (location);
+"""
+
+# Archive file extensions indexed by NiIndex.scan()
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".jar", ".war", ".epub")
+
+# Entries per transaction when adding many
+_BATCH = 10000
+
+def _ni_digest(ni):
+    """Return (untruncated method, digest, truncated) of an ni hash.
+
+    ni can be an arcp URI, an ``ni:`` URI, an ``ni,alg;val`` authority,
+    ``alg;val``, or a tuple ``(method, hex)`` as from :attr:`ARCPSplitResult.hash`.
+    The digest is a prefix of the untruncated digest if truncated.
+    """
+    if isinstance(ni, tuple):
+        (method, hex) = ni
+    else:
+        if is_arcp_uri(ni):
+            netloc = parse_arcp(ni).netloc
+        elif ni.startswith("ni:"):
+            # ni:///alg;val, ni://authority/alg;val or ni:alg;val
+            rest = ni[len("ni:"):]
+            if rest.startswith("//"):
+                rest = rest[2:].partition("/")[2]
+            rest = rest.partition("#")[0].partition("?")[0]
+            netloc = "ni," + rest.lstrip("/")
+        elif ni.startswith("ni,"):
+            netloc = ni
+        else:
+            netloc = "ni," + ni
+        h = _authority(netloc).hash()
+        if h is None:
+            raise ValueError("Not an ni hash: %s" % ni)
+        (method, hex) = h
+    algorithm = ni_algorithm(method)
+    key = _NI_HASH_KEYS[algorithm.name]
+    digest = unhexlify(hex)
+    size = algorithm.truncate or key[1]
+    if len(digest) != size:
+        raise ValueError("Expected %s bytes for %s hash, not %s: %s" %
+                         (size, algorithm.name, len(digest), ni))
+    untruncated = _NI_HASHES.get(key, algorithm)
+    return (untruncated.name, digest, untruncated is not algorithm)
+
+def _prefix_end(prefix):
+    """Smallest byte string after all strings starting with prefix, or None"""
+    prefix = prefix.rstrip(b"\xff")
+    if not prefix:
+        return None
+    return prefix[:-1] + bytes([prefix[-1] + 1])
+
+class NiIndex(_Database):
+    """Index of archive locations by their RFC6920 hash.
+
+    Parameters:
+      - filename -- database file, created if missing
+      - timeout -- Seconds to wait for the database while another process writes to it
+
+    Hashes can be given as ``arcp://ni,...`` URIs, ``ni:`` URIs,
+    ``ni,alg;val`` authorities or ``(method, hex)`` tuples as from
+    :attr:`arcp.parse.ARCPSplitResult.hash`. A digest can have many locations,
+    e.g. copies of the same archive, and a location can have
+    digests of several hash methods.
+
+    Locations are strings like filenames or URLs, each stored once.
+    Digests are stored in binary in a clustered B-tree, so a lookup
+    reads a handful of pages even with tens of millions of archives.
+    Truncated hashes like ``sha-256-32`` look up the digests they are a
+    prefix of, which may match more than one archive.
+
+    The database is shared by threads and processes as for
+    :class:`arcp.hashcache.HashCache`.
+    """
+
+    _SCHEMA = _NI_SCHEMA
+
+    def __init__(self, filename, timeout=30.0):
+        super(NiIndex, self).__init__(filename, timeout)
+        # method name -> id
+        self._methods = {}
+
+    def _method_id(self, db, name, create=False):
+        """Return id of method name, or None if not in the index"""
+        method_id = self._methods.get(name)
+        if method_id is None:
+            if create:
+                db.execute("INSERT OR IGNORE INTO methods (name) VALUES (?)", (name,))
+            row = db.execute("SELECT id FROM methods WHERE name=?", (name,)).fetchone()
+            if row is None:
+                return None
+            method_id = self._methods[name] = row[0]
+        return method_id
+
+    def add(self, ni, location):
+        """Add the location of an archive with an untruncated ni hash.
+        Return True if it was not already in the index."""
+        return self.add_many([(ni, location)]) == 1
+
+    def add_many(self, entries):
+        """Add many ``(ni, location)`` pairs, e.g. from a previous scan.
+
+        Entries are added in transactions of 10000. Return the number of
+        pairs that were not already in the index.
+        """
+        added = 0
+        batch = []
+        for (ni, location) in entries:
+            (method, digest, truncated) = _ni_digest(ni)
+            if truncated:
+                raise ValueError("Truncated hash can't be indexed: %s" % (ni,))
+            batch.append((method, digest, location))
+            if len(batch) >= _BATCH:
+                added += self._add_batch(batch)
+                batch = []
+        if batch:
+            added += self._add_batch(batch)
+        return added
+
+    def _add_batch(self, batch):
+        added = 0
+        location_ids = {}
+        try:
+            with self._transaction() as db:
+                for (method, digest, location) in batch:
+                    location_id = location_ids.get(location)
+                    if location_id is None:
+                        db.execute("INSERT OR IGNORE INTO locations (location) VALUES (?)",
+                                   (location,))
+                        location_id = location_ids[location] = db.execute(
+                            "SELECT id FROM locations WHERE location=?", (location,)).fetchone()[0]
+                    added += db.execute("INSERT OR IGNORE INTO digests VALUES (?, ?, ?)",
+                        (digest, self._method_id(db, method, create=True), location_id)).rowcount
+        except:
+            # new method ids were rolled back
+            self._methods.clear()
+            raise
+        return added
+
+    def _lookup_sql(self, db, ni):
+        """SQL and parameters selecting digests rows for ni, or None if no match is possible"""
+        (method, digest, truncated) = _ni_digest(ni)
+        method_id = self._method_id(db, method)
+        if method_id is None:
+            return None
+        if not truncated:
+            return ("digest=? AND method=?", (digest, method_id))
+        end = _prefix_end(digest)
+        if end is None:
+            return ("digest>=? AND method=?", (digest, method_id))
+        return ("digest>=? AND digest<? AND method=?", (digest, end, method_id))
+
+    def lookup(self, ni):
+        """Return sorted list of locations of archives with the ni hash"""
+        with self._lock:
+            db = self._connection()
+            where = self._lookup_sql(db, ni)
+            if where is None:
+                return []
+            rows = db.execute("SELECT location FROM locations WHERE id IN "
+                              "(SELECT location FROM digests WHERE %s) ORDER BY location" % where[0],
+                              where[1]).fetchall()
+        return [row[0] for row in rows]
+
+    def __contains__(self, ni):
+        return bool(self.lookup(ni))
+
+    def hashes(self, location):
+        """Return sorted list of ``ni,alg;val`` authorities of archives at location"""
+        rows = self._execute("SELECT methods.name, digests.digest FROM digests "
+                             "JOIN methods ON methods.id = digests.method "
+                             "JOIN locations ON locations.id = digests.location "
+                             "WHERE locations.location=?", (location,))
+        return sorted(_ni_digest_authority(ni_algorithm(name), bytes(digest))
+                      for (name, digest) in rows)
+
+    def remove(self, ni, location=None):
+        """Remove an untruncated ni hash, only for location if given.
+        Return the number of locations removed."""
+        (method, digest, truncated) = _ni_digest(ni)
+        if truncated:
+            raise ValueError("Truncated hash can't be removed: %s" % (ni,))
+        with self._transaction() as db:
+            method_id = self._method_id(db, method)
+            if method_id is None:
+                return 0
+            if location is None:
+                where = ("digest=? AND method=?", (digest, method_id))
+            else:
+                where = ("digest=? AND method=? AND "
+                         "location=(SELECT id FROM locations WHERE location=?)",
+                         (digest, method_id, location))
+            location_ids = [row[0] for row in db.execute(
+                "SELECT location FROM digests WHERE %s" % where[0], where[1])]
+            removed = db.execute("DELETE FROM digests WHERE %s" % where[0], where[1]).rowcount
+            self._remove_orphans(db, location_ids)
+        return removed
+
+    def remove_location(self, location):
+        """Remove all hashes of a location, e.g. a deleted archive.
+        Return the number of hashes removed."""
+        with self._transaction() as db:
+            row = db.execute("SELECT id FROM locations WHERE location=?", (location,)).fetchone()
+            if row is None:
+                return 0
+            removed = db.execute("DELETE FROM digests WHERE location=?", row).rowcount
+            db.execute("DELETE FROM locations WHERE id=?", row)
+        return removed
+
+    @staticmethod
+    def _remove_orphans(db, location_ids):
+        """Remove locations of location_ids that no longer have any digests"""
+        # only the given ids, as a NOT EXISTS over all locations is a full scan
+        db.executemany("DELETE FROM locations WHERE id=? AND NOT EXISTS "
+                       "(SELECT 1 FROM digests WHERE location=?)",
+                       ((i, i) for i in location_ids))
+
+    def scan(self, directory, method="sha-256", extensions=ARCHIVE_EXTENSIONS,
+             cache=None, workers=None):
+        """Hash and add all archive files below a directory.
+
+        Parameters:
+          - directory -- directory to walk, including sub-directories
+          - method -- Optional RFC6920 hash name as for :func:`arcp.generate.arcp_hash()`
+          - extensions -- file name endings to include, or None for all files
+          - cache -- Optional :class:`arcp.hashcache.HashCache` to avoid hashing
+            unchanged archives again
+          - workers -- Optional number of threads as for :func:`arcp.generate.arcp_hash_many()`
+
+        Files are added with their absolute path as location,
+        and files that can't be read are skipped.
+        Return the number of archives that were not already in the index.
+        """
+        if extensions is not None:
+            extensions = tuple(e.lower() for e in extensions)
+        files = (os.path.join(dirpath, name)
+                 for (dirpath, dirnames, filenames) in os.walk(os.path.abspath(directory))
+                 for name in sorted(filenames)
+                 if extensions is None or name.lower().endswith(extensions))
+        hashed = arcp_hash_many(files, ordered=False, workers=workers,
+                                method=method, cache=cache)
+        return self.add_many((uri, file) for (file, uri, error) in hashed if error is None)
+
+    def register(self, registry, uri, **kwargs):
+        """Register the first existing archive file with the ni hash of uri
+        in an :class:`arcp.archive.ArcpArchiveRegistry`.
+
+        Additional keyword arguments are passed to :meth:`ArcpArchiveRegistry.register()`.
+        Return the registered filename, or raise :class:`KeyError` if no file was found.
+        """
+        for location in self.lookup(uri):
+            if os.path.exists(location):
+                registry.register(uri, location, **kwargs)
+                return location
+        raise KeyError(uri)
+
+    def __len__(self):
+        """Number of (hash, location) pairs"""
+        return self._execute("SELECT COUNT(*) FROM digests")[0][0]
+
+    def locations(self):
+        """Return sorted list of all locations in the index"""
+        return [row[0] for row in self._execute("SELECT location FROM locations ORDER BY location")]
+
+    def clear(self):
+        """Remove all hashes and locations"""
+        with self._transaction() as db:
+            db.execute("DELETE FROM digests")
+            db.execute("DELETE FROM locations")
+
+    def __reduce__(self):
+        return (NiIndex, (self.filename, self.timeout))
+
+    def __repr__(self):
+        return "NiIndex(%r)" % self.filename
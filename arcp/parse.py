@@ -18,12 +18,18 @@ Parse arcp URIs.
 
 Use is_arcp_uri() to detect of an URI string is using the 
 arcp: URI scheme, in which case parse_arcp() can be used
-to split it into its components.
+to split it into its components. Use filter_arcp_uris() or 
+mask_arcp_uris() to check many URI strings.
+
+Use parse_arcp_many() to parse many URIs, e.g. lines of a file,
+optionally skipping or collecting invalid URIs.
 
 The urlparse() function can be used as a replacement for
 urllib.parse.urlparse() - supporting any URIs. If the URI is 
 using the arcp: URI scheme, additional components are available
 as from parse_arcp().
+
+Use a ParseCache to avoid re-parsing frequently repeated URIs.
 """
 __author__      = "Stian Soiland-Reyes <https://orcid.org/0000-0001-9842-9718>"
 __copyright__   = "Copyright 2018-2020 The University of Manchester"
@@ -31,24 +37,104 @@ __license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/
 
 from uuid import UUID, NAMESPACE_URL
 
-try:
-    import urllib.parse as urlp
-except:
-    import urlparse as urlp
+import urllib.parse as urlp
 
 from base64 import urlsafe_b64decode
 from binascii import hexlify
+from operator import attrgetter
+from collections import namedtuple, OrderedDict
+from threading import Lock
 import re
 
 SCHEME="arcp"
 
+def _arcp_split_regex():
+    """Compile regular expression splitting a plain arcp URI in one pass.
+
+    Only matches the common case of an ASCII authority without 
+    IPv6 brackets and a URI without TAB/CR/LF or leading whitespace,
+    which :func:`urllib.parse.urlsplit` would otherwise need to clean up. 
+    Anything not matched should be passed to :func:`urllib.parse.urlparse`.
+    """
+    # scheme is case-insensitive, but always reported lowercase
+    scheme = r"[aA][rR][cC][pP]://"
+    # authority up to first / ? or #, printable ASCII except [ ]
+    netloc = r"([!\"$-.0->@-Z\\^-~]*)(?=[/?#]|\Z)"
+    # path (including any ;params) up to first ? or #
+    path = r"([^?#\t\r\n]*)"
+    query = r"(?:\?([^#\t\r\n]*))?"
+    # fragment may contain ? and #
+    fragment = r"(?:#([^\t\r\n]*))?"
+    return re.compile(scheme + netloc + path + query + fragment + r"\Z")
+_ARCP_SPLIT = _arcp_split_regex()
+
+def _split_arcp(uri):
+    """Split an arcp URI string into a 6-tuple as from :func:`urllib.parse.urlparse`
+
+    Return None if the uri is not a plain arcp URI that can be split 
+    without the help of :mod:`urllib.parse`.
+    """
+    m = _ARCP_SPLIT.match(uri)
+    if m is None:
+        return None
+    (netloc, path, query, fragment) = m.groups("")
+    params = ""
+    if ";" in path:
+        # Same as urllib.parse._splitparams(): 
+        # params only from the last path segment
+        i = path.find(";", path.rfind("/"))
+        if i >= 0:
+            (path, params) = (path[:i], path[i+1:])
+    return (SCHEME, netloc, path, params, query, fragment)
+
+def _scheme_prefixes(scheme):
+    """Return all upper/lowercase variants of "scheme:" """
+    prefixes = [""]
+    for c in scheme:
+        prefixes = [p + x for p in prefixes for x in (c.lower(), c.upper())]
+    return tuple(p + ":" for p in prefixes)
+_ARCP_PREFIXES = _scheme_prefixes(SCHEME)
+
+if hasattr(str, "isascii"):
+    _isascii = str.isascii
+else:
+    def _isascii(s):
+        """str.isascii() for Python 3.6"""
+        return len(s.encode("utf-8", "surrogatepass")) == len(s)
+
 def is_arcp_uri(uri):
     """Return True if the uri string uses the arcp scheme, otherwise False.
     """
-
+    if isinstance(uri, str):
+        if uri.startswith(_ARCP_PREFIXES):
+            # Unless urllib would reject the authority
+            if _isascii(uri) and not "[" in uri and not "]" in uri:
+                return True
+        else:
+            first = uri[:1]
+            # Unless urllib would strip leading whitespace, or 
+            # remove TAB/CR/LF from a scheme like "a\trcp:"
+            if first > " " and not (first in "aA" and 
+                ("\t" in uri or "\r" in uri or "\n" in uri)):
+                return False
     # tip: urllib will do lowercase for us
     return urlp.urlparse(uri).scheme == SCHEME
 
+def filter_arcp_uris(uris):
+    """Return an iterator of the URI strings that use the arcp scheme.
+
+    Equivalent to ``filter(is_arcp_uri, uris)``.
+    """
+    return filter(is_arcp_uri, uris)
+
+def mask_arcp_uris(uris):
+    """Return a list of True/False for each URI string, 
+    True if it uses the arcp scheme.
+
+    Equivalent to ``[is_arcp_uri(u) for u in uris]``.
+    """
+    return list(map(is_arcp_uri, uris))
+
 def parse_arcp(uri):
     """Parse an arcp URI string into its constituent parts.
 
@@ -64,7 +150,10 @@ def parse_arcp(uri):
     - ni -- the arcp alg-val value according to RFC6920 if prefix is "ni", otherwise None
     - hash -- the hash method and hash as a hexstring if prefix is "ni", otherwise None
     """
-
+    t = _split_arcp(uri) if isinstance(uri, str) else None
+    if t is not None:
+        # Scheme already checked, skip ARCPParseResult.__init__
+        return tuple.__new__(ARCPParseResult, t)
     return ARCPParseResult(*urlp.urlparse(uri))
 
 def urlparse(uri):
@@ -78,12 +167,83 @@ def urlparse(uri):
     URI scheme is "arcp" this also adds
     arcp properties as in :func:`parse_arcp()`.
     """
-    u = urlp.urlparse(uri)    
+    t = _split_arcp(uri) if isinstance(uri, str) else None
+    if t is not None:
+        return tuple.__new__(ARCPParseResult, t)
+    u = urlp.urlparse(uri)
     if (u.scheme == SCHEME):
         return ARCPParseResult(*u)
     else:
         return u
 
+def parse_arcp_many(uris, on_error="raise", errors=None, columns=None):
+    """Parse many arcp URI strings, e.g. lines of a file.
+
+    Returns an iterator of results as from :func:`parse_arcp()`,
+    in the same order as ``uris``. Any trailing newline is removed 
+    from each URI, so an open text file can be passed directly.
+
+    Parameters:
+      - uris -- iterable of URI strings, or a text file with one URI per line
+      - on_error -- ``"raise"`` (default) to raise on the first invalid URI, 
+        ``"skip"`` to ignore invalid URIs, or ``"collect"`` to 
+        append ``(index, uri, exception)`` to ``errors``
+      - errors -- list to collect errors in, required if on_error is ``"collect"``
+      - columns -- optional sequence of result field or property names, e.g. 
+        ``("prefix", "name", "path")``
+    
+    If ``columns`` is provided, all URIs are parsed immediately
+    and a dictionary from field name to a list of values is returned instead.
+    A URI with a property that raises, like ``uuid`` for an invalid UUID,
+    is handled according to ``on_error``.
+    """
+    if on_error not in ("raise", "skip", "collect"):
+        raise ValueError("Unknown on_error: %s" % on_error)
+    if on_error == "collect" and errors is None:
+        raise ValueError("errors list required for on_error=\"collect\"")
+    if columns is None:
+        return _parse_many(uris, on_error, errors)
+
+    for c in columns:
+        if not (c in ARCPParseResult._fields or 
+                isinstance(getattr(ARCPParseResult, c, None), property)):
+            raise ValueError("Unknown column: %s" % c)
+    table = dict((c, []) for c in columns)
+    appends = [table[c].append for c in columns]
+    getters = [attrgetter(c) for c in columns]
+    for row in _parse_many(uris, on_error, errors, getters):
+        for (append, value) in zip(appends, row):
+            append(value)
+    return table
+
+def _parse_many(uris, on_error, errors, getters=None):
+    """Generator for parse_arcp_many(), of results or 
+    lists of getters' values for each result"""
+    # local names avoid global lookups per URI
+    split = _split_arcp
+    new = tuple.__new__
+    cls = ARCPParseResult
+    for (i, uri) in enumerate(uris):
+        try:
+            t = None
+            if uri.__class__ is str:
+                uri = uri.rstrip("\r\n")
+                t = split(uri)
+            if t is not None:
+                u = new(cls, t)
+            else:
+                u = ARCPParseResult(*urlp.urlparse(uri))
+            if getters is not None:
+                # properties like uuid or port may raise for this URI
+                u = [get(u) for get in getters]
+        except Exception as e:
+            if on_error == "raise":
+                raise
+            if on_error == "collect":
+                errors.append((i, uri, e))
+            continue
+        yield u
+
 class ARCPParseResult(urlp.ParseResult):
     """Result of parsing an arcp URI.
 
@@ -104,40 +264,30 @@ class ARCPParseResult(urlp.ParseResult):
         """Return (prefix,name) if authority has "," - 
         otherwise (None, authority).
         """
-        if self.netloc and "," in self.netloc:
-            return self.netloc.split(",", 1)
-        else:
-            return (None, self.netloc)
+        a = _authority(self.netloc)
+        return (a.prefix, a.name)
 
     @property
     def prefix(self):
         """The arcp prefix, e.g. "uuid", "ni", "name" or None if no prefix was present.
         """
-        (prefix,name) = self._host_split()
-        return prefix
+        return _authority(self.netloc).prefix
 
     @property
     def name(self):
         """The URI's authority without arcp prefix.
         """
-        (prefix,name) = self._host_split()
-        return name
+        return _authority(self.netloc).name
     
     @property
     def uuid(self):
         """The arcp UUID if the prefix is "uuid", otherwise None."""
-        if self.prefix != "uuid":
-            return None
-        return UUID(self.name)
+        return _authority(self.netloc).uuid()
     
     @property
     def ni(self):
         """The arcp ni string if the prefix is "ni", otherwise None."""
-        if self.prefix != "ni":
-            return None
-        if not _ALG_VAL.match(self.name):
-            raise Exception("Invalid alg-val for ni, prefix: %s" % self.netloc)
-        return self.name
+        return _authority(self.netloc).ni()
     
     def ni_uri(self, authority=""):
         """The ni URI (RFC6920_) if the prefix is "ni", otherwise None.
@@ -159,17 +309,7 @@ class ARCPParseResult(urlp.ParseResult):
         
         .. _RFC6920: https://tools.ietf.org/search/rfc6920
         """
-        h = self.hash
-        if h is None:
-            return None
-        (hash_method, hash_hex) = h
-        
-        segmented = _nih_segmented(hash_hex)
-        checkdigit = _nih_checkdigit(hash_hex)
-
-        path = "%s;%s;%s" % (hash_method, segmented, checkdigit)
-        s = ("nih", None, path, None, None)
-        return urlp.urlunsplit(s)
+        return _authority(self.netloc).nih()
     
     def ni_well_known(self, base=""):
         """The ni .well-known URI (RFC5785_) if the prefix is 
@@ -191,30 +331,14 @@ class ARCPParseResult(urlp.ParseResult):
     def _ni_split(self):
         """Split self.ni:
         """
-        ni = self.ni
-        if ni is None:
-            return (None,None)
-        # Already checked by self.ni regex
-        #if not ";" in ni:
-        #    raise Exception("invalid ni hash: %s" % ni)
-        (method, hash_b64) = ni.split(";", 1)
-        return (method, hash_b64)
-        
+        return _authority(self.netloc).ni_split()
 
     @property
     def hash(self):
         """A tuple (hash_method,hash_hex) if the prefix is "ni", 
         otherwise None.
         """
-        (method, hash_b64) = self._ni_split()
-        if method is None:
-            return None
-        # re-instate padding as urlsafe_base64decode is strict
-        missing_padding = 4 - (len(hash_b64) % 4)
-        hash_b64 += "=" * missing_padding
-        hash_bytes = urlsafe_b64decode(hash_b64)
-        hash_hex = hexlify(hash_bytes).decode("ascii")
-        return (method.lower(), hash_hex)
+        return _authority(self.netloc).hash()
     
     def __repr__(self):
         props = ["scheme='arcp'"]
@@ -238,6 +362,179 @@ class ARCPParseResult(urlp.ParseResult):
     def __str__(self):
         return self.geturl()
 
+def nih_uris(results):
+    """Return a list of nih URIs for parsed arcp URIs.
+
+    Equivalent to ``[r.nih_uri() for r in results]``, with ``None`` 
+    for results without an ni prefix, but computes the nih URI 
+    only once for each distinct ni authority.
+
+    Parameters:
+      - results -- iterable of :class:`ARCPParseResult`, e.g. from :func:`parse_arcp_many()`
+    """
+    authority = _authority
+    return [authority(r.netloc).nih() for r in results]
+
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+class ParseCache(object):
+    """Bounded least-recently-used cache of parsed URIs.
+
+    Use the methods :meth:`parse_arcp`, :meth:`urlparse` and
+    :meth:`is_arcp_uri` in place of the module functions of the 
+    same name to avoid re-parsing frequently repeated URIs::
+
+        >>> cache = ParseCache(maxsize=100000)
+        >>> cache.parse_arcp("arcp://name,example.com/").name
+        'example.com'
+        >>> cache.cache_info()
+        CacheInfo(hits=0, misses=1, maxsize=100000, currsize=1)
+
+    Parsed results are immutable, so a cache can be shared
+    between threads. Invalid URIs are not cached.
+    """
+
+    def __init__(self, maxsize=65536):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive: %s" % maxsize)
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def urlparse(self, uri):
+        """Parse any URI string as :func:`urlparse()`, or return cached result."""
+        with self._lock:
+            u = self._results.get(uri)
+            if u is not None:
+                self._hits += 1
+                self._results.move_to_end(uri)
+                return u
+            self._misses += 1
+        # Parse outside lock, worst case another thread parses the same uri
+        u = urlparse(uri)
+        with self._lock:
+            self._results[uri] = u
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return u
+
+    def parse_arcp(self, uri):
+        """Parse an arcp URI string as :func:`parse_arcp()`, or return cached result."""
+        u = self.urlparse(uri)
+        if not isinstance(u, ARCPParseResult):
+            raise Exception("uri has scheme %s, expected %s" % 
+                            (u.scheme, SCHEME))
+        return u
+
+    def is_arcp_uri(self, uri):
+        """Return True if the uri string uses the arcp scheme, as :func:`is_arcp_uri()`.
+        
+        The scheme check is cheaper than a cache lookup, 
+        so this does not use or affect the cache.
+        """
+        return is_arcp_uri(uri)
+
+    def cache_info(self):
+        """Return cache statistics as (hits, misses, maxsize, currsize)."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, 
+                             self.maxsize, len(self._results))
+
+    def clear(self):
+        """Remove all cached results and reset statistics."""
+        with self._lock:
+            self._results.clear()
+            self._hits = self._misses = 0
+
+_UNSET = object()
+
+class _ARCPAuthority(object):
+    """Decoded arcp authority, shared by all results with the same netloc.
+
+    The prefix and name are split on construction, while
+    uuid, ni and hash are decoded on first use and then kept.
+    Invalid values are not kept, but raise on every call.
+    """
+    __slots__ = ("prefix", "name", "_uuid", "_ni_split", "_hash", "_nih")
+
+    def __init__(self, netloc):
+        if netloc and "," in netloc:
+            (self.prefix, self.name) = netloc.split(",", 1)
+        else:
+            (self.prefix, self.name) = (None, netloc)
+        self._uuid = self._ni_split = self._hash = self._nih = _UNSET
+
+    def uuid(self):
+        if self._uuid is _UNSET:
+            if self.prefix != "uuid":
+                self._uuid = None
+            else:
+                self._uuid = UUID(self.name)
+        return self._uuid
+
+    def ni_split(self):
+        if self._ni_split is _UNSET:
+            if self.prefix != "ni":
+                self._ni_split = (None, None)
+            elif not _ALG_VAL.match(self.name):
+                raise Exception("Invalid alg-val for ni, prefix: %s" % 
+                                ",".join((self.prefix, self.name)))
+            else:
+                # ; already checked by _ALG_VAL regex
+                self._ni_split = tuple(self.name.split(";", 1))
+        return self._ni_split
+
+    def ni(self):
+        if self.ni_split()[0] is None:
+            return None
+        return self.name
+
+    def hash(self):
+        if self._hash is _UNSET:
+            (method, hash_b64) = self.ni_split()
+            if method is None:
+                self._hash = None
+            else:
+                # re-instate padding as urlsafe_base64decode is strict
+                missing_padding = 4 - (len(hash_b64) % 4)
+                hash_b64 += "=" * missing_padding
+                hash_bytes = urlsafe_b64decode(hash_b64)
+                hash_hex = hexlify(hash_bytes).decode("ascii")
+                self._hash = (method.lower(), hash_hex)
+        return self._hash
+
+    def nih(self):
+        if self._nih is _UNSET:
+            h = self.hash()
+            if h is None:
+                self._nih = None
+            else:
+                (hash_method, hash_hex) = h
+                segmented = _nih_segmented(hash_hex)
+                checkdigit = _nih_checkdigit(hash_hex)
+                # Same as urlunsplit(("nih", None, path, None, None))
+                self._nih = "nih:%s;%s;%s" % (hash_method, segmented, checkdigit)
+        return self._nih
+
+# Upper bound of decoded authorities to keep;
+# the cache is emptied rather than grow beyond this size
+_AUTHORITY_CACHE_SIZE = 4096
+_AUTHORITIES = {}
+
+def _authority(netloc):
+    """Return the (possibly cached) _ARCPAuthority for a netloc"""
+    try:
+        return _AUTHORITIES[netloc]
+    except KeyError:
+        pass
+    a = _ARCPAuthority(netloc)
+    if len(_AUTHORITIES) >= _AUTHORITY_CACHE_SIZE:
+        _AUTHORITIES.clear()
+    _AUTHORITIES[netloc] = a
+    return a
+
 def _alg_val_regex():
     """Compile regular expression for RFC6920_ alg-val production
 
@@ -262,11 +559,23 @@ def _nih_segmented(h, grouping=6):
 
     .. _RFC6920: https://www.ietf.org/rfc/rfc6920
     """
-    segmented = []
-    while h:
-        segmented.append(h[:grouping])
-        h = h[grouping:]
-    return "-".join(segmented)
+    return "-".join([h[i:i+grouping] for i in range(0, len(h), grouping)])
+
+def _nih_tables():
+    """Build bytes.translate() tables for _nih_checkdigit()
+
+    Returns (plain, doubled) tables mapping each ASCII hex digit 
+    to its value, or for doubled digits to the sum of the 
+    hex digits of twice its value. Other bytes map to 0xff.
+    """
+    plain = bytearray(b"\xff" * 256)
+    doubled = bytearray(b"\xff" * 256)
+    for digit in range(16):
+        for c in ("%x" % digit, "%X" % digit):
+            plain[ord(c)] = digit
+            doubled[ord(c)] = sum(divmod(digit * 2, 16))
+    return (bytes(plain), bytes(doubled))
+(_NIH_PLAIN, _NIH_DOUBLED) = _nih_tables()
 
 def _nih_checkdigit(h):
     """Luhn mod N algorithm in base 16 (hex) according to RFC6920_
@@ -274,28 +583,17 @@ def _nih_checkdigit(h):
     .. _RFC6920: https://www.ietf.org/rfc/rfc6920
     """
     ## Adopted from https://en.wikipedia.org/wiki/Luhn_mod_N_algorithm 
-    ## pseudocode
-    factor = 2
-    total = 0
-    base = 16
-    digits = len(h)        
+    ## pseudocode, but using lookup tables for each digit
+    digits = h.encode("ascii")
     # 0 if digits has even length, 1 if odd
     # (as we start doubling with the very last digit)
-    parity = digits % 2
-    for x in range(digits):
-        digit = int(h[x], 16)            
-        if x % 2 != parity:
-            # double every second digit
-            digit *= 2
-            # slight less efficient, but more verbose:
-            # if > 16:
-            #   total += digit - 16 + 1
-            # else: 
-            #   total + digit
-            total += sum(divmod(digit, 16))
-        else:
-            # Not doubled, must be <16
-            total += digit
+    parity = len(digits) % 2
+    # double every second digit
+    plain = digits[parity::2].translate(_NIH_PLAIN)
+    doubled = digits[1-parity::2].translate(_NIH_DOUBLED)
+    if 0xff in plain or 0xff in doubled:
+        raise ValueError("Invalid hex string: %s" % h)
+    total = sum(plain) + sum(doubled)
     # checkdigit that needs to be added to total
     # to get 0 after modulus
     remainder = (16-total) % 16
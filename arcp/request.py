@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Open arcp URIs with :mod:`urllib.request`.
+
+:class:`ArcpHandler` reads archive members through an
+:class:`arcp.archive.ArcpArchiveRegistry`, so that code using
+:func:`urllib.request.urlopen()`, like RDF or JSON-LD parsers,
+can load documents from within archives::
+
+    >>> registry = ArcpArchiveRegistry()
+    >>> registry.register("name,app.example.com", "app.zip")
+    >>> opener = urllib.request.build_opener(ArcpHandler(registry))
+    >>> with opener.open("arcp://name,app.example.com/index.html") as f:
+    ...     f.headers["Content-Type"]
+    ...     html = f.read()
+    'text/html'
+
+Members are streamed from the archive, and are not
+extracted to temporary files.
+"""
+__author__      = "Stian Soiland-Reyes <https://orcid.org/0000-0001-9842-9718>"
+__copyright__   = "Copyright 2018-2020 The University of Manchester"
+__license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/LICENSE-2.0)"
+
+import email.utils
+import mimetypes
+
+from urllib.request import BaseHandler
+from urllib.response import addinfourl, addclosehook
+from urllib.error import URLError
+from urllib.parse import unquote
+
+from email.message import Message
+
+from .parse import parse_arcp
+
+class ArcpHandler(BaseHandler):
+    """:mod:`urllib.request` handler for arcp URIs.
+
+    Parameters:
+      - registry -- :class:`arcp.archive.ArcpArchiveRegistry` of archives to read from
+
+    The response has headers ``Content-Type``, guessed from the path
+    by :func:`mimetypes.guess_type()`, ``Content-Length`` and ``Last-Modified``.
+    The archive is kept open in the registry until the response is closed.
+
+    Members that are not found, directories, unregistered archives and
+    invalid URIs raise :class:`urllib.error.URLError`.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def arcp_open(self, req):
+        uri = req.full_url.partition("#")[0]
+        try:
+            path = parse_arcp(uri).path
+            archive = self.registry.acquire(uri)
+        except KeyError as e:
+            raise URLError("arcp archive not registered: %s" % e)
+        except Exception as e:
+            raise URLError(e)
+        try:
+            stat = archive.stat(uri)
+            f = archive.open(uri)
+        except Exception as e:
+            self.registry.release(archive)
+            if isinstance(e, KeyError):
+                raise URLError("Not found: %s" % uri)
+            raise URLError(e)
+        content_type = mimetypes.guess_type(unquote(path))[0] or "application/octet-stream"
+        headers = Message()
+        headers["Content-Type"] = content_type
+        headers["Content-Length"] = str(stat.size)
+        headers["Last-Modified"] = email.utils.formatdate(stat.mtime, usegmt=True)
+        f = addclosehook(f, self.registry.release, archive)
+        return addinfourl(f, headers, req.full_url)
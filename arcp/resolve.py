@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Resolve relative references against an arcp base URI.
+
+:class:`ArcpResolver` parses the base URI once, and can then
+resolve many relative references found within the archive,
+e.g. ``href`` and ``src`` attributes of HTML files::
+
+    >>> r = ArcpResolver("arcp://name,app.example.com/css/style.css")
+    >>> r.resolve("../fonts/foo.woff")
+    'arcp://name,app.example.com/fonts/foo.woff'
+    >>> r.resolve_many(["a.png", "/b.png#x"])
+    ['arcp://name,app.example.com/css/a.png', 'arcp://name,app.example.com/b.png#x']
+
+Resolution follows RFC3986_ section 5.2, like :func:`urllib.parse.urljoin()`,
+except that by default a reference that would "climb out" above
+the archive root, like ``../../../etc/passwd``, raises :class:`ValueError`.
+Unlike :func:`urllib.parse.urljoin()`, empty path segments (``a//b``)
+are kept and ``;`` is not treated specially, as required by RFC3986.
+
+The inverse, :func:`relativize()`, turns absolute arcp URIs back
+into references relative to a base, e.g. when serializing RDF
+within an archive::
+
+    >>> relativize("arcp://name,app.example.com/fonts/foo.woff",
+    ...            "arcp://name,app.example.com/css/style.css")
+    '../fonts/foo.woff'
+
+.. _RFC3986: https://tools.ietf.org/html/rfc3986#section-5.2
+"""
+__author__      = "Stian Soiland-Reyes <https://orcid.org/0000-0001-9842-9718>"
+__copyright__   = "Copyright 2018-2020 The University of Manchester"
+__license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/LICENSE-2.0)"
+
+import re
+
+from .parse import parse_arcp, SCHEME
+
+def _uri_reference_regex():
+    """Compile regular expression splitting an RFC3986_ URI-reference
+
+    Groups keep their delimiters, so an empty query ``?``
+    can be told apart from a missing query.
+
+    .. _RFC3986: https://tools.ietf.org/html/rfc3986#appendix-B
+    """
+    scheme = r"([A-Za-z][A-Za-z0-9+.-]*:)?"
+    authority = r"(//[^/?#]*)?"
+    path = r"([^?#]*)"
+    query = r"(\?[^#]*)?"
+    fragment = r"(#.*)?"
+    return re.compile(scheme + authority + path + query + fragment + r"\Z", re.DOTALL)
+_URI_REFERENCE = _uri_reference_regex()
+
+def remove_dot_segments(path, strict=True):
+    """Remove ``.`` and ``..`` segments from an absolute path, as in RFC3986_
+
+    If ``strict`` is True, raise :class:`ValueError` if a ``..``
+    segment would climb out above the root ``/``, otherwise
+    such segments are ignored.
+
+    .. _RFC3986: https://tools.ietf.org/html/rfc3986#section-5.2.4
+    """
+    segments = path.split("/")
+    output = []
+    for segment in segments[1:]:
+        if segment == "..":
+            if output:
+                output.pop()
+            elif strict:
+                raise ValueError("Path climbs out of archive root: %s" % path)
+        elif segment != ".":
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        # keep trailing /
+        output.append("")
+    return "/" + "/".join(output)
+
+class ArcpResolver(object):
+    """Resolve relative references against an arcp base URI.
+
+    Parameters:
+      - base -- absolute arcp URI, e.g. of a file within the archive,
+        or an :class:`arcp.generate.ArcpBase`
+      - strict -- If True (default), raise :class:`ValueError` for
+        references climbing out above the archive root,
+        otherwise ignore such ``..`` segments like :func:`urllib.parse.urljoin()`
+
+    References with a scheme, like ``http://example.com/``,
+    are returned unchanged. Network-path references like ``//name,other/``
+    are resolved to a different arcp archive.
+
+    :meth:`relativize()` does the opposite, so that
+    ``resolve(relativize(uri)) == uri`` for any URI.
+    """
+    __slots__ = ("base", "strict", "_prefix", "_path", "_dir", "_query",
+                 "_dirs")
+
+    def __init__(self, base, strict=True):
+        u = parse_arcp(str(base))
+        self.base = u.geturl()
+        self.strict = strict
+        self._prefix = SCHEME + "://" + u.netloc
+        path = u.path
+        if u.params:
+            # RFC3986 has no params, ;p is part of the last segment
+            path += ";" + u.params
+        self._path = path and remove_dot_segments(path, strict)
+        # RFC3986 5.2.3 merge: everything up to last /, or / if empty path
+        self._dir = self._path[:self._path.rfind("/")+1] or "/"
+        self._query = u.query and "?" + u.query
+        # directory segments of base, e.g. ["b", "c"] for /b/c/d
+        self._dirs = self._dir[1:-1].split("/") if self._dir != "/" else []
+
+    def resolve(self, ref):
+        """Resolve a relative reference to an absolute URI string"""
+        m = _URI_REFERENCE.match(ref)
+        (scheme, authority, path, query, fragment) = m.groups("")
+        if scheme:
+            return ref
+        if authority:
+            return SCHEME + ":" + authority + (path and
+                remove_dot_segments(path, False)) + query + fragment
+        if not path:
+            path = self._path
+            if m.group(4) is None:
+                query = self._query
+        elif path[0] == "/":
+            if "/." in path:
+                path = remove_dot_segments(path, self.strict)
+        else:
+            path = self._dir + path
+            if "/." in path:
+                path = remove_dot_segments(path, self.strict)
+        return self._prefix + path + query + fragment
+
+    def resolve_many(self, refs):
+        """Resolve many relative references, returning a list of absolute URI strings"""
+        resolve = self.resolve
+        return [resolve(ref) for ref in refs]
+
+    def relativize(self, uri):
+        """Make an absolute URI relative to the base, if possible.
+
+        URIs within other archives, of other schemes, or with
+        ``.`` or ``..`` path segments, are returned unchanged.
+        """
+        return self._relativize(uri, self._relative_dir)
+
+    def relativize_many(self, uris):
+        """Make many absolute URIs relative to the base, returning a list of references.
+
+        The relative path to each distinct directory is only
+        computed once.
+        """
+        dirs = {}
+        def relative_dir(d):
+            r = dirs.get(d)
+            if r is None:
+                r = dirs[d] = self._relative_dir(d)
+            return r
+        relativize = self._relativize
+        return [relativize(uri, relative_dir) for uri in uris]
+
+    def _relativize(self, uri, relative_dir):
+        prefix = self._prefix
+        if not uri.startswith(prefix):
+            return uri
+        rest = uri[len(prefix):]
+        (rest, hash, fragment) = rest.partition("#")
+        (path, q, query) = rest.partition("?")
+        if path and path[0] != "/":
+            # longer authority, e.g. arcp://name,a.example.com.evil/
+            return uri
+        query = q + query
+        if path == self._path:
+            if query == self._query:
+                return hash + fragment
+            if query:
+                return query + hash + fragment
+        if not path:
+            # empty path can't be made relative
+            return uri
+        if "/." in path and ("/./" in path + "/" or "/../" in path + "/"):
+            # would be removed by resolve()
+            return uri
+        slash = path.rfind("/") + 1
+        rel = relative_dir(path[:slash]) + path[slash:]
+        if not rel or rel[0] == "/" or ":" in rel.partition("/")[0]:
+            # empty, absolute-path or scheme-like reference
+            rel = "./" + rel
+        return rel + query + hash + fragment
+
+    def _relative_dir(self, d):
+        """Relative reference from base directory to directory d,
+        which must start and end with /"""
+        dirs = d[1:-1].split("/") if d != "/" else []
+        base = self._dirs
+        common = 0
+        for (a, b) in zip(base, dirs):
+            if a != b:
+                break
+            common += 1
+        return "../" * (len(base) - common) + "".join(
+            segment + "/" for segment in dirs[common:])
+
+    def __repr__(self):
+        return "ArcpResolver(%r)" % self.base
+
+def relativize(uri, base):
+    """Make an absolute URI relative to a base arcp URI, if possible.
+
+    Parameters:
+      - uri -- absolute URI, e.g. ``arcp://uuid,.../a/b/c.ttl``
+      - base -- absolute arcp URI of the document, or an :class:`arcp.generate.ArcpBase`
+
+    Return a relative reference, e.g. ``c.ttl``, that resolves back to ``uri``
+    against ``base``. URIs that can't be made relative,
+    e.g. within a different archive, are returned unchanged.
+
+    To relativize many URIs against the same base, use
+    :meth:`ArcpResolver.relativize_many()`.
+    """
+    return ArcpResolver(base).relativize(uri)
@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Serve archives by their ni hash over HTTP.
+
+:class:`ArcpServer` is a small :mod:`asyncio` HTTP/1.1 server
+for the ``.well-known/ni`` paths (RFC6920_ section 4) of
+:meth:`arcp.parse.ARCPParseResult.ni_well_known()`.
+Archives are looked up by their ``ni`` authority in an
+:class:`arcp.archive.ArcpArchiveRegistry`::
+
+    GET /.well-known/ni/sha-256/f4OxZX_x_FO5LcGBSKHWXfwtSx-j1ncoSt3SABJtkGk
+    GET /.well-known/ni/sha-256/f4OxZX_x_FO5LcGBSKHWXfwtSx-j1ncoSt3SABJtkGk/folder/file.txt
+
+The first returns the archive file itself, the second the member at the
+arcp path ``/folder/file.txt`` within it.
+
+As archives are identified by their content hash, responses are immutable,
+and have a strong ``ETag`` from the ni hash. Conditional requests
+(``If-None-Match``, ``If-Match``, ``If-Range``) and single byte ranges
+(``Range``) are supported. Bodies are streamed in chunks, so many
+keep-alive connections can be served from a single thread, while
+opening archives and reading compressed members is done in the
+event loop's default executor.
+
+This module requires Python 3.7 or later.
+
+To serve archive files from the command line::
+
+    python -m arcp.server --port 8080 data.zip other.tar.gz
+
+.. _RFC6920: https://tools.ietf.org/html/rfc6920#section-4
+"""
+__author__      = "Stian Soiland-Reyes <https://orcid.org/0000-0001-9842-9718>"
+__copyright__   = "Copyright 2018-2020 The University of Manchester"
+__license__     = "Apache License, version 2.0 (https://www.apache.org/licenses/LICENSE-2.0)"
+
+import io
+import os
+import stat
+import time
+import zlib
+import asyncio
+import logging
+import tarfile
+import zipfile
+import argparse
+import mimetypes
+import email.utils
+from http import HTTPStatus
+
+from urllib.parse import quote, unquote
+
+from .parse import parse_arcp
+from .generate import arcp_hash_file
+from .archive import ArcpArchiveRegistry
+
+WELL_KNOWN_NI = "/.well-known/ni/"
+
+# Responses never change for the same ni hash
+_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_UNSATISFIABLE = object()
+
+# Errors from opening or reading a member, e.g. corrupt compressed data
+_READ_ERRORS = (OSError, EOFError, ValueError, zlib.error,
+                zipfile.BadZipFile, tarfile.TarError)
+
+logger = logging.getLogger(__name__)
+
+# Content-Type of compressed files by mimetypes encoding
+_ENCODING_TYPES = {
+    "gzip": "application/gzip",
+    "bzip2": "application/x-bzip2",
+    "xz": "application/x-xz",
+}
+
+class ArcpServer(object):
+    """HTTP server for ``.well-known/ni`` paths of archives in a registry.
+
+    Parameters:
+      - registry -- :class:`arcp.archive.ArcpArchiveRegistry` with archives
+        registered by their ``ni`` authority, e.g. ``"ni,sha-256;f4Ox..."``
+      - chunk_size -- Maximum bytes to write at a time when streaming bodies
+      - keep_alive_timeout -- Seconds to wait for the next request on
+        an idle connection before closing it
+
+    Start with :meth:`start()` within a running event loop, or use :func:`serve()`,
+    and stop with :meth:`close()` and :meth:`wait_closed()`.
+    Only ``GET`` and ``HEAD`` requests are supported.
+    """
+
+    def __init__(self, registry, chunk_size=1 << 16, keep_alive_timeout=15.0):
+        self.registry = registry
+        self.chunk_size = chunk_size
+        self.keep_alive_timeout = keep_alive_timeout
+        self._date = (None, None)
+        self._server = None
+        self._closing = False
+        # connection handler tasks, and writers of those awaiting a request
+        self._tasks = set()
+        self._idle = set()
+
+    async def start(self, host="127.0.0.1", port=8080, **kwargs):
+        """Start listening, returning the :class:`asyncio.Server`.
+
+        Additional keyword arguments are passed to :func:`asyncio.start_server()`.
+        """
+        self._closing = False
+        self._server = await asyncio.start_server(self.handle, host, port, **kwargs)
+        return self._server
+
+    def close(self):
+        """Stop listening and close idle keep-alive connections.
+
+        Connections with a request in progress are closed after its response.
+        """
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+        for writer in self._idle:
+            writer.close()
+
+    async def wait_closed(self):
+        """Wait until the server and all its connections are closed"""
+        if self._server is not None:
+            await self._server.wait_closed()
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+    async def handle(self, reader, writer):
+        """Serve requests on a connection until it is closed"""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            keep_alive = True
+            while keep_alive and not self._closing:
+                self._idle.add(writer)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"),
+                                                  self.keep_alive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                except asyncio.LimitOverrunError:
+                    self._write_head(writer, 431, {}, False)
+                    break
+                finally:
+                    self._idle.discard(writer)
+                keep_alive = await self._handle_request(head, writer)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self._tasks.discard(task)
+
+    async def _handle_request(self, head, writer):
+        """Respond to a request, return True if the connection can be kept alive"""
+        lines = head.decode("latin-1").split("\r\n")
+        request = lines[0].split(" ")
+        if len(request) != 3 or not request[2].startswith("HTTP/1."):
+            self._write_head(writer, 400, {}, False)
+            return False
+        (method, target, version) = request
+        headers = {}
+        for line in lines[1:]:
+            (name, colon, value) = line.partition(":")
+            if colon:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+        if method not in ("GET", "HEAD"):
+            # request body is not read, so close
+            self._write_head(writer, 405, {"Allow": "GET, HEAD"}, False)
+            return False
+        return await self._respond(method, target, headers, writer, keep_alive)
+
+    async def _respond(self, method, target, headers, writer, keep_alive):
+        path = target.partition("?")[0]
+        if not path.startswith(WELL_KNOWN_NI):
+            self._write_head(writer, 404, {}, keep_alive)
+            return keep_alive
+        parts = path[len(WELL_KNOWN_NI):].split("/", 2)
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            self._write_head(writer, 404, {}, keep_alive)
+            return keep_alive
+        authority = "ni,%s;%s" % (parts[0], parts[1])
+        if authority not in self.registry:
+            self._write_head(writer, 404, {}, keep_alive)
+            return keep_alive
+        loop = asyncio.get_running_loop()
+        archive = None
+        try:
+            if len(parts) == 2:
+                # the archive itself
+                filename = self.registry.filename(authority)
+                try:
+                    st = await loop.run_in_executor(None, os.stat, filename)
+                except OSError:
+                    st = None
+                if st is None or not stat.S_ISREG(st.st_mode):
+                    self._write_head(writer, 404, {}, keep_alive)
+                    return keep_alive
+                (size, mtime) = (st.st_size, st.st_mtime)
+                (content_type, encoding) = mimetypes.guess_type(filename)
+                if encoding:
+                    # e.g. .tar.gz is served as is, not as a tar with Content-Encoding
+                    content_type = _ENCODING_TYPES.get(encoding)
+                etag = _etag(authority)
+                opener = lambda: open(filename, "rb")
+            else:
+                uri = "arcp://%s/%s" % (authority, parts[2])
+                try:
+                    archive = await loop.run_in_executor(None, self.registry.acquire, authority)
+                except (KeyError, FileNotFoundError):
+                    # unregistered or deleted meanwhile
+                    self._write_head(writer, 404, {}, keep_alive)
+                    return keep_alive
+                except Exception:
+                    # e.g. a corrupt archive
+                    self._write_head(writer, 500, {}, keep_alive)
+                    return keep_alive
+                try:
+                    (size, mtime) = await loop.run_in_executor(None, archive.stat, uri)
+                except (KeyError, IsADirectoryError, NotADirectoryError):
+                    self._write_head(writer, 404, {}, keep_alive)
+                    return keep_alive
+                except ValueError:
+                    self._write_head(writer, 400, {}, keep_alive)
+                    return keep_alive
+                content_type = mimetypes.guess_type(unquote(parts[2]))[0]
+                etag = _etag(archive.base.authority, archive._path(uri))
+                opener = lambda: archive.open(uri)
+            return await self._send(method, headers, writer, keep_alive,
+                opener, size, mtime, content_type, etag)
+        finally:
+            if archive is not None:
+                self.registry.release(archive)
+
+    async def _send(self, method, headers, writer, keep_alive,
+                    opener, size, mtime, content_type, etag):
+        """Send response for a resource, handling conditional and range requests"""
+        response = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(mtime, usegmt=True),
+            "Cache-Control": _CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+        }
+        if_match = headers.get("if-match")
+        if if_match is not None and not _etag_matches(if_match, etag, weak=False):
+            self._write_head(writer, 412, response, keep_alive)
+            return keep_alive
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None and _etag_matches(if_none_match, etag, weak=True):
+            self._write_head(writer, 304, response, keep_alive)
+            return keep_alive
+        status = 200
+        (start, count) = (0, size)
+        byte_range = headers.get("range")
+        if byte_range is not None and headers.get("if-range", etag) == etag:
+            r = _parse_range(byte_range, size)
+            if r is _UNSATISFIABLE:
+                response["Content-Range"] = "bytes */%s" % size
+                self._write_head(writer, 416, response, keep_alive)
+                return keep_alive
+            if r is not None:
+                status = 206
+                (start, end) = r
+                count = end - start + 1
+                response["Content-Range"] = "bytes %s-%s/%s" % (start, end, size)
+        response["Content-Type"] = content_type or "application/octet-stream"
+        response["Content-Length"] = str(count)
+        if method == "HEAD" or not count:
+            self._write_head(writer, status, response, keep_alive)
+            return keep_alive
+        loop = asyncio.get_running_loop()
+        try:
+            f = await loop.run_in_executor(None, opener)
+        except _READ_ERRORS as e:
+            logger.error("Can't open %s: %r", etag, e)
+            self._write_head(writer, 500, {}, keep_alive)
+            return keep_alive
+        with f:
+            self._write_head(writer, status, response, keep_alive)
+            try:
+                sent = await self._write_body(writer, f, start, count)
+            except ConnectionError:
+                raise
+            except _READ_ERRORS as e:
+                # too late for an error response, so close the connection
+                logger.error("Can't read %s: %r", etag, e)
+                return False
+        # a truncated body can't be recovered from
+        return keep_alive and sent == count
+
+    async def _write_body(self, writer, f, start, count):
+        """Stream count bytes from start of file f, return bytes sent"""
+        loop = asyncio.get_running_loop()
+        try:
+            f.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+        else:
+            # regular file, e.g. the archive itself or in a directory archive
+            await writer.drain()
+            return await loop.sendfile(writer.transport, f, start, count)
+        # reading a member may inflate or block on disk
+        if start:
+            await loop.run_in_executor(None, f.seek, start)
+        sent = 0
+        while sent < count:
+            data = await loop.run_in_executor(None, f.read, min(self.chunk_size, count - sent))
+            if not data:
+                break
+            writer.write(data)
+            sent += len(data)
+            await writer.drain()
+        return sent
+
+    def _write_head(self, writer, status, headers, keep_alive):
+        status = HTTPStatus(status)
+        lines = ["HTTP/1.1 %d %s" % (status.value, status.phrase),
+                 "Date: %s" % self._http_date(),
+                 "Connection: %s" % ("keep-alive" if keep_alive else "close")]
+        if status >= 400 and "Content-Length" not in headers:
+            headers["Content-Length"] = "0"
+        lines.extend("%s: %s" % header for header in headers.items())
+        lines.append("\r\n")
+        writer.write("\r\n".join(lines).encode("latin-1"))
+
+    def _http_date(self):
+        """HTTP Date header value, formatted at most once per second"""
+        now = int(time.time())
+        (then, date) = self._date
+        if then != now:
+            date = email.utils.formatdate(now, usegmt=True)
+            self._date = (now, date)
+        return date
+
+def _etag(authority, path=""):
+    """Strong ETag of an ni authority and normalized member path,
+    quoted so the request target is never echoed as is"""
+    return '"%s%s"' % (quote(authority[len("ni,"):], safe=",;="), quote(path))
+
+def _etag_matches(header, etag, weak):
+    """True if the If-Match or If-None-Match header matches etag"""
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def _parse_range(header, size):
+    """Parse a Range header for a resource of size bytes.
+
+    Return (first, last) byte positions, ``_UNSATISFIABLE``, or
+    None to ignore the header, e.g. for multiple ranges.
+    """
+    if not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    (first, dash, last) = spec.partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return _UNSATISFIABLE
+            first = max(size - suffix, 0)
+            last = size - 1
+        else:
+            first = int(first)
+            last = int(last) if last else None
+    except ValueError:
+        return None
+    if first < 0 or last is not None and last < first:
+        return None
+    if first >= size:
+        return _UNSATISFIABLE
+    if last is None:
+        return (first, size - 1)
+    return (first, min(last, size - 1))
+
+def register_hashed(registry, files):
+    """Register archive files in registry by their sha-256 ni authority.
+
+    Return list of authorities.
+    """
+    authorities = []
+    for file in files:
+        authority = parse_arcp(arcp_hash_file(file)).netloc
+        registry.register(authority, file)
+        authorities.append(authority)
+    return authorities
+
+def serve(registry, host="127.0.0.1", port=8080, **kwargs):
+    """Serve a registry on host and port until interrupted.
+
+    Additional keyword arguments are passed to :class:`ArcpServer`.
+    """
+    async def run():
+        app = ArcpServer(registry, **kwargs)
+        server = await app.start(host, port)
+        try:
+            await server.serve_forever()
+        finally:
+            app.close()
+            await app.wait_closed()
+    asyncio.run(run())
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Serve archives by their ni hash over HTTP")
+    parser.add_argument("files", nargs="+", help="archive files to serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 to pick a free port")
+    parser.add_argument("--maxsize", type=int, default=64, help="maximum open archives")
+    args = parser.parse_args(args)
+    registry = ArcpArchiveRegistry(maxsize=args.maxsize)
+    authorities = register_hashed(registry, args.files)
+
+    async def run():
+        app = ArcpServer(registry)
+        server = await app.start(args.host, args.port)
+        (host, port) = server.sockets[0].getsockname()[:2]
+        print("Serving on http://%s:%s/" % (host, port), flush=True)
+        for (file, authority) in zip(args.files, authorities):
+            (method, digest) = authority[len("ni,"):].split(";")
+            print("%s http://%s:%s%s%s/%s/" % (file, host, port, WELL_KNOWN_NI, method, digest),
+                  flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            app.close()
+            await app.wait_closed()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        registry.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Benchmark for :mod:`arcp.aio`.
+
+Run from the source checkout with::
+
+    python benchmarks/bench_aio.py [MiB]
+
+Hashes an in-memory stream (default 256 MiB) with :func:`arcp.generate.arcp_hash()`
+called on the event loop, and with :func:`arcp.aio.arcp_hash_async()`,
+reporting the total time and the longest the event loop was blocked.
+"""
+
+import os
+import sys
+import time
+import asyncio
+from hashlib import sha256
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from arcp import aio, generate
+
+CHUNK = 1 << 20
+
+async def chunks(data):
+    for i in range(0, len(data), CHUNK):
+        yield data[i:i+CHUNK]
+        await asyncio.sleep(0)
+
+async def ticker(stats):
+    """Track the longest gap between event loop iterations"""
+    last = time.perf_counter()
+    while True:
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        stats["max"] = max(stats["max"], now - last)
+        last = now
+
+async def measure(label, coro):
+    stats = {"max": 0}
+    tick = asyncio.ensure_future(ticker(stats))
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await coro()
+    elapsed = time.perf_counter() - started
+    # let the ticker notice a block at the very end
+    await asyncio.sleep(0.01)
+    tick.cancel()
+    print("%-44s %8.1f ms total, event loop blocked up to %6.1f ms" %
+          (label, elapsed * 1e3, stats["max"] * 1e3))
+
+async def main(size):
+    data = os.urandom(1 << 20) * size
+    async def blocking():
+        h = sha256()
+        async for chunk in chunks(data):
+            h.update(chunk)
+        return generate.arcp_hash(hash=h)
+    async def blocking_once():
+        return generate.arcp_hash(data)
+    async def non_blocking():
+        return await aio.arcp_hash_async(chunks(data))
+    await measure("arcp_hash() on loop", blocking_once)
+    await measure("hash.update() per chunk on loop", blocking)
+    await measure("arcp_hash_async()", non_blocking)
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 256))
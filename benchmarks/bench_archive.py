@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Micro-benchmarks for :mod:`arcp.archive`.
+
+Run from the source checkout with::
+
+    python benchmarks/bench_archive.py [members]
+
+Creates temporary ZIP files with the given number of members (default 1000).
+Each line reports the best time per call in microseconds.
+"""
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+import tarfile
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from arcp import archive, generate
+
+def bench(label, stmt, number=1000, repeat=5):
+    """Print best time per call of stmt in microseconds"""
+    t = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    print("%-44s %8.3f usec" % (label, t / number * 1e6))
+
+def make_zip(filename, members):
+    with zipfile.ZipFile(filename, "w") as zf:
+        for i in range(members):
+            zf.writestr("folder%s/file%s.txt" % (i % 10, i), b"x" * 1024)
+
+def bench_zip(tmpdir, members):
+    filename = os.path.join(tmpdir, "zip.zip")
+    make_zip(filename, members)
+    base = generate.ArcpBase.from_name("app.example.com")
+    uri = base.uri("folder3/file3.txt")
+    def open_each():
+        with archive.ArcpZipArchive(filename, base=base) as a:
+            return a.read(uri).tobytes()
+    bench("ArcpZipArchive() + read()", open_each, number=100)
+    a = archive.ArcpZipArchive(filename, base=base)
+    bench("ArcpZipArchive.read() stored", lambda: a.read(uri), number=100000)
+    bench("ZipFile.read() stored", lambda: a._zip.read("folder3/file3.txt"), number=10000)
+    bench("ArcpZipArchive.listdir()", lambda: a.listdir(base.uri("folder3/")))
+    a.close()
+
+def bench_directory(tmpdir, members):
+    root = os.path.join(tmpdir, "dir")
+    for i in range(members):
+        folder = os.path.join(root, "folder%s" % (i % 10))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(os.path.join(folder, "file%s.txt" % i), "wb") as f:
+            f.write(b"x" * 1024)
+    base = generate.ArcpBase.from_name("dir.example.com")
+    a = archive.ArcpDirectoryArchive(root, base=base)
+    uri = base.uri("folder3/file3.txt")
+    filename = os.path.join(root, "folder3", "file3.txt")
+    def plain_read():
+        with open(filename, "rb") as f:
+            return f.read()
+    bench("open().read()", plain_read, number=10000)
+    bench("ArcpDirectoryArchive.read()", lambda: a.read(uri), number=10000)
+    bench("os.stat()", lambda: os.stat(filename), number=10000)
+    bench("ArcpDirectoryArchive.info() cached", lambda: a.info(uri), number=10000)
+    bench("os.listdir()", lambda: os.listdir(os.path.dirname(filename)), number=1000)
+    bench("ArcpDirectoryArchive.listdir() cached",
+        lambda: a.listdir(base.uri("folder3/")), number=1000)
+    a.close()
+
+def make_tar(filename, members):
+    with tarfile.open(filename, "w:gz") as tar:
+        for i in range(members):
+            data = os.urandom(4096) + b"x" * 8192
+            info = tarfile.TarInfo("folder%s/file%s.bin" % (i % 10, i))
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+def bench_tar(tmpdir, members):
+    filename = os.path.join(tmpdir, "tar.tar.gz")
+    make_tar(filename, members)
+    name = "folder%s/file%s.bin" % ((members-1) % 10, members-1)
+    def tarfile_read():
+        with tarfile.open(filename) as tar:
+            return tar.extractfile(name).read()
+    bench("tarfile.open() + read() last member", tarfile_read, number=10)
+    bench("ArcpTarArchive() first open", lambda: archive.ArcpTarArchive(filename).close(), number=1, repeat=1)
+    def arcp_open_read():
+        with archive.ArcpTarArchive(filename) as a:
+            return a.read(name)
+    bench("ArcpTarArchive() indexed + read() last", arcp_open_read, number=10)
+    a = archive.ArcpTarArchive(filename)
+    a.read(name)
+    bench("ArcpTarArchive.read() last, checkpointed", lambda: a.read(name), number=1000)
+    a.close()
+
+def bench_registry(tmpdir, members):
+    registry = archive.ArcpArchiveRegistry(maxsize=8)
+    uris = []
+    for i in range(16):
+        filename = os.path.join(tmpdir, "reg%s.zip" % i)
+        make_zip(filename, members)
+        base = generate.ArcpBase.from_name("app%s.example.com" % i)
+        registry.register(base, filename)
+        uris.append(base.uri("folder3/file3.txt"))
+    hot = uris[:4]
+    bench("ArcpArchiveRegistry.read() hot",
+        lambda: [registry.read(uri) for uri in hot], number=10000)
+    bench("ArcpArchiveRegistry.read() thrashing",
+        lambda: [registry.read(uri) for uri in uris], number=20)
+    print("    %s" % (registry.cache_info(),))
+    registry.close()
+
+if __name__ == "__main__":
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name, f in sorted(globals().items()):
+            if name.startswith("bench_"):
+                f(tmpdir, members)
+    finally:
+        shutil.rmtree(tmpdir)
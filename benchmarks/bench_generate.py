@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Micro-benchmarks for :mod:`arcp.generate`.
+
+Run from the source checkout with::
+
+    python benchmarks/bench_generate.py [MiB]
+
+Hashing benchmarks use a temporary file of the given size (default 128 MiB)
+and report throughput in MB/s, other lines report the best time 
+per call in microseconds.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from arcp import generate
+
+def bench(label, stmt, number=100000, repeat=5):
+    """Print best time per call of stmt in microseconds"""
+    t = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    print("%-44s %8.3f usec" % (label, t / number * 1e6))
+
+def throughput(label, stmt, size, repeat=3):
+    """Print best throughput of stmt processing size bytes in MB/s"""
+    t = min(timeit.repeat(stmt, number=1, repeat=repeat))
+    print("%-44s %8.1f MB/s" % (label, size / t / 1e6))
+
+def bench_random(tmpdir, size):
+    bench("arcp_random() x 10000", 
+        lambda: [generate.arcp_random() for i in range(10000)], number=10)
+    bench("arcp_random_many(10000)", 
+        lambda: generate.arcp_random_many(10000), number=10)
+
+def bench_location(tmpdir, size):
+    locations = ["http://example.com/archive%s.zip" % (i % 1000) for i in range(10000)]
+    minter = generate.LocationMinter()
+    uncached = generate.LocationMinter(maxsize=0)
+    bench("arcp_location() x 10000", 
+        lambda: [generate.arcp_location(l) for l in locations], number=10)
+    bench("LocationMinter(maxsize=0).mint_many(10000)", 
+        lambda: uncached.mint_many(locations), number=10)
+    bench("LocationMinter().mint_many(10000)", 
+        lambda: minter.mint_many(locations), number=10)
+
+def bench_base(tmpdir, size):
+    paths = ["folder%s/file%s.txt" % (i % 100, i) for i in range(200000)]
+    base = generate.ArcpBase.from_name("app.example.com")
+    bench("arcp_name() x 200k", 
+        lambda: [generate.arcp_name("app.example.com", p) for p in paths], 
+        number=1, repeat=3)
+    bench("ArcpBase.uri() x 200k", 
+        lambda: [base.uri(p) for p in paths], number=1, repeat=3)
+    bench("ArcpBase.uris(200k)", lambda: base.uris(paths), number=1, repeat=3)
+    bench("ArcpBase.uris(200k, quote=True)", 
+        lambda: base.uris(paths, quote=True), number=1, repeat=3)
+
+def bench_hash_file(tmpdir, size):
+    filename = os.path.join(tmpdir, "archive.bin")
+    with open(filename, "wb") as f:
+        for i in range(0, size, 1 << 20):
+            f.write(os.urandom(min(1 << 20, size - i)))
+    def read_all():
+        with open(filename, "rb") as f:
+            generate.arcp_hash(f.read())
+    throughput("arcp_hash(f.read())", read_all, size)
+    throughput("arcp_hash_file()", 
+        lambda: generate.arcp_hash_file(filename), size)
+    throughput("arcp_hash_file(use_mmap=True)", 
+        lambda: generate.arcp_hash_file(filename, use_mmap=True), size)
+    throughput("arcp_hash_file(overlap=True)", 
+        lambda: generate.arcp_hash_file(filename, overlap=True), size)
+
+def bench_hashing_writer(tmpdir, size):
+    import zipfile
+    filename = os.path.join(tmpdir, "written.zip")
+    member = os.urandom(1 << 20)
+    def write_zip(f):
+        with zipfile.ZipFile(f, "w") as z:
+            for i in range(size >> 20):
+                z.writestr("%s.bin" % i, member)
+    def write_then_hash():
+        write_zip(filename)
+        generate.arcp_hash_file(filename)
+    throughput("ZipFile, then arcp_hash_file()", write_then_hash, size)
+    for seekable in (False, True):
+        def hashing_writer():
+            with generate.HashingWriter(filename, seekable=seekable) as w:
+                write_zip(w)
+        throughput("ZipFile(HashingWriter(seekable=%s))" % seekable, 
+            hashing_writer, size)
+
+def bench_hash_multi(tmpdir, size):
+    filename = os.path.join(tmpdir, "multi.bin")
+    with open(filename, "wb") as f:
+        for i in range(0, size, 1 << 20):
+            f.write(os.urandom(min(1 << 20, size - i)))
+    def twice():
+        generate.arcp_hash_file(filename, method="sha-256")
+        generate.arcp_hash_file(filename, method="sha-512")
+    throughput("arcp_hash_file() sha-256, then sha-512", twice, size)
+    for threads in (False, True):
+        throughput("arcp_hash_file_multi(threads=%s)" % threads, 
+            lambda: generate.arcp_hash_file_multi(filename, threads=threads), size)
+
+def bench_hash_cache(tmpdir, size):
+    from arcp.hashcache import HashCache
+    filename = os.path.join(tmpdir, "cached.bin")
+    with open(filename, "wb") as f:
+        f.write(os.urandom(size))
+    # old enough to be cached
+    os.utime(filename, (0, 0))
+    cache = HashCache(os.path.join(tmpdir, "hashes.sqlite"))
+    bench("arcp_hash_file(), %s MiB" % (size >> 20), 
+        lambda: generate.arcp_hash_file(filename), number=1, repeat=3)
+    bench("arcp_hash_file(cache=HashCache()) miss", 
+        lambda: (cache.clear(), generate.arcp_hash_file(filename, cache=cache)), 
+        number=1, repeat=3)
+    bench("arcp_hash_file(cache=HashCache()) hit", 
+        lambda: generate.arcp_hash_file(filename, cache=cache), number=1000)
+    cache.close()
+
+def bench_hash_many(tmpdir, size):
+    files = []
+    for i in range(16):
+        filename = os.path.join(tmpdir, "archive%s.bin" % i)
+        with open(filename, "wb") as f:
+            f.write(os.urandom(size // 16))
+        files.append(filename)
+    for workers in sorted(set([1, 2, os.cpu_count() or 1])):
+        for executor in ("thread", "process"):
+            throughput("arcp_hash_many(%s, workers=%s)" % (executor, workers), 
+                lambda: list(generate.arcp_hash_many(files, 
+                    workers=workers, executor=executor)), 
+                size)
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name, f in sorted(globals().items()):
+            if name.startswith("bench_"):
+                f(tmpdir, size << 20)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Benchmark for :mod:`arcp.niindex`.
+
+Run from the source checkout with::
+
+    python benchmarks/bench_niindex.py [entries]
+
+Bulk loads an index with random sha-256 digests (default 1000000),
+and reports the load rate, lookup and remove times and database size per entry.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from arcp.niindex import NiIndex
+
+def bench(label, stmt, number=10000, repeat=3):
+    """Print best time per call of stmt in microseconds"""
+    t = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    print("%-44s %8.3f usec" % (label, t / number * 1e6))
+
+def main(n):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, "ni.sqlite")
+        index = NiIndex(filename)
+        digests = [os.urandom(32).hex() for i in range(n)]
+        started = time.perf_counter()
+        index.add_many((("sha-256", d), "/data/archives/%08d.zip" % i)
+                       for (i, d) in enumerate(digests))
+        elapsed = time.perf_counter() - started
+        print("%-44s %8.0f entries/s" % ("add_many(%s)" % n, n / elapsed))
+        sample = [("sha-256", d) for d in random.sample(digests, 1000)]
+        it = iter(sample * 100)
+        bench("lookup() hit", lambda: index.lookup(next(it)))
+        missing = ("sha-256", os.urandom(32).hex())
+        bench("lookup() miss", lambda: index.lookup(missing))
+        it = iter([("sha-256-64", d[:16]) for (m, d) in sample] * 100)
+        bench("lookup() truncated sha-256-64", lambda: index.lookup(next(it)))
+        it = iter(sample)
+        bench("remove()", lambda: index.remove(next(it)), number=300)
+        index.close()
+        size = sum(os.path.getsize(os.path.join(tmpdir, f)) for f in os.listdir(tmpdir))
+        print("%-44s %8.1f bytes" % ("database size per entry", size / n))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
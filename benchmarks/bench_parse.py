@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Micro-benchmarks for :mod:`arcp.parse`.
+
+Run from the source checkout with::
+
+    python benchmarks/bench_parse.py
+
+Each line reports the best time per call in microseconds.
+"""
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from arcp import parse, generate
+
+UUID_URI = "arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/folder/file.txt?q=a#frag"
+NI_URI = "arcp://ni,sha-256;f4OxZX_x_FO5LcGBSKHWXfwtSx-j1ncoSt3SABJtkGk/folder/soup;sads"
+
+def bench(label, stmt, number=100000, repeat=5):
+    """Print best time per call of stmt in microseconds"""
+    t = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    print("%-44s %8.3f usec" % (label, t / number * 1e6))
+
+def bench_parse():
+    bench("parse_arcp(uuid)", lambda: parse.parse_arcp(UUID_URI))
+    bench("parse_arcp(ni)", lambda: parse.parse_arcp(NI_URI))
+    bench("urlparse(uuid)", lambda: parse.urlparse(UUID_URI))
+
+def bench_is_arcp_uri():
+    iris = ["http://example.com/%d" % i for i in range(9000)] + [UUID_URI] * 1000
+    bench("is_arcp_uri(http)", lambda: parse.is_arcp_uri("http://example.com/"))
+    bench("is_arcp_uri(arcp)", lambda: parse.is_arcp_uri(UUID_URI))
+    bench("mask_arcp_uris() x 10000", lambda: parse.mask_arcp_uris(iris), number=10)
+
+def bench_nih():
+    rnd = random.Random(6920)
+    digests = ["%064x" % rnd.getrandbits(256) for i in range(1000000)]
+    def checkdigits():
+        for h in digests:
+            parse._nih_checkdigit(h)
+    def segments():
+        for h in digests:
+            parse._nih_segmented(h)
+    bench("_nih_checkdigit() x 1M", checkdigits, number=1, repeat=3)
+    bench("_nih_segmented() x 1M", segments, number=1, repeat=3)
+    results = list(parse.parse_arcp_many(
+        generate.arcp_hash(h.encode("ascii")) for h in digests[:100000]))
+    bench("nih_uris() x 100k", lambda: parse.nih_uris(results), number=1, repeat=3)
+
+def bench_parse_cache():
+    cache = parse.ParseCache()
+    bench("ParseCache.parse_arcp(uuid)", lambda: cache.parse_arcp(UUID_URI))
+    bench("ParseCache.is_arcp_uri(uuid)", lambda: cache.is_arcp_uri(UUID_URI))
+
+def bench_parse_many():
+    uris = [UUID_URI, NI_URI] * 5000
+    def parse_each():
+        for uri in uris:
+            parse.parse_arcp(uri)
+    def parse_many():
+        for u in parse.parse_arcp_many(uris):
+            pass
+    bench("parse_arcp() x 10000", parse_each, number=10)
+    bench("parse_arcp_many() x 10000", parse_many, number=10)
+    bench("parse_arcp_many(columns) x 10000", 
+          lambda: parse.parse_arcp_many(uris, columns=("prefix", "name", "path")), 
+          number=10)
+
+def bench_properties():
+    u = parse.parse_arcp(UUID_URI)
+    n = parse.parse_arcp(NI_URI)
+    bench(".prefix", lambda: u.prefix)
+    bench(".name", lambda: u.name)
+    bench(".uuid", lambda: u.uuid)
+    bench(".ni", lambda: n.ni)
+    bench(".hash", lambda: n.hash)
+    bench("repr(uuid)", lambda: repr(u))
+    bench("repr(ni)", lambda: repr(n))
+
+if __name__ == "__main__":
+    for name, f in sorted(globals().items()):
+        if name.startswith("bench_"):
+            f()
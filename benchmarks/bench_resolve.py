@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Micro-benchmarks for :mod:`arcp.resolve`.
+
+Run from the source checkout with::
+
+    python benchmarks/bench_resolve.py [links]
+
+Each line reports the best time for resolving (or relativizing) all links (default 1 million)
+in milliseconds.
+"""
+
+import os
+import sys
+import random
+import timeit
+
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from arcp import resolve
+
+BASE = "arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/site/docs/index.html"
+
+def bench(label, stmt, repeat=3):
+    """Print best time of stmt in milliseconds"""
+    t = min(timeit.repeat(stmt, number=1, repeat=repeat))
+    print("%-44s %8.1f msec" % (label, t * 1e3))
+
+def links(n):
+    """Typical mix of href/src values in archived HTML"""
+    rnd = random.Random(3986)
+    templates = ["img/%s.png", "../css/%s.css", "/js/%s.js", "%s.html#top",
+                 "./%s/", "?page=%s", "#section%s", "http://example.com/%s"]
+    return [rnd.choice(templates) % i for i in range(n)]
+
+def bench_resolve(refs):
+    bench("urljoin() x %s" % len(refs),
+        lambda: [urljoin(BASE, ref) for ref in refs])
+    r = resolve.ArcpResolver(BASE)
+    bench("ArcpResolver.resolve() x %s" % len(refs),
+        lambda: [r.resolve(ref) for ref in refs])
+    bench("ArcpResolver.resolve_many(%s)" % len(refs),
+        lambda: r.resolve_many(refs))
+
+def bench_relativize(refs):
+    r = resolve.ArcpResolver(BASE)
+    uris = r.resolve_many(refs)
+    bench("relativize() x %s" % len(uris),
+        lambda: [resolve.relativize(uri, BASE) for uri in uris])
+    bench("ArcpResolver.relativize() x %s" % len(uris),
+        lambda: [r.relativize(uri) for uri in uris])
+    bench("ArcpResolver.relativize_many(%s)" % len(uris),
+        lambda: r.relativize_many(uris))
+
+if __name__ == "__main__":
+    refs = links(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
+    for name, f in sorted(globals().items()):
+        if name.startswith("bench_"):
+            f(refs)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+"""
+Load test for :mod:`arcp.server` on localhost.
+
+Run from the source checkout with::
+
+    python benchmarks/load_server.py [--connections 1000] [--requests 20]
+
+Starts ``python -m arcp.server`` on a temporary ZIP file in a subprocess,
+then opens the given number of concurrent keep-alive connections,
+each making a sequence of plain, ``Range`` and ``If-None-Match`` requests.
+Reports requests per second and latency percentiles.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import zipfile
+import argparse
+import tempfile
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def raise_fd_limit():
+    """Allow many open connections, in this process and the server subprocess"""
+    if resource is None:
+        return
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY:
+        hard = 1 << 16
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def make_zip(filename, members):
+    with zipfile.ZipFile(filename, "w") as zf:
+        for i in range(members):
+            zf.writestr("folder%s/file%s.txt" % (i % 10, i), os.urandom(2048))
+            zf.writestr(zipfile.ZipInfo("folder%s/doc%s.html" % (i % 10, i)),
+                        b"<p>Hello</p>" * 200, compress_type=zipfile.ZIP_DEFLATED)
+
+def start_server(filename):
+    proc = subprocess.Popen([sys.executable, "-m", "arcp.server", "--port", "0", filename],
+                            cwd=ROOT, stdout=subprocess.PIPE, universal_newlines=True)
+    proc.stdout.readline() # Serving on ..
+    url = proc.stdout.readline().split()[1]
+    return (proc, url)
+
+async def request(reader, writer, host, path, headers=""):
+    writer.write(("GET %s HTTP/1.1\r\nHost: %s\r\n%s\r\n" % (path, host, headers)).encode("latin-1"))
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line[15:])
+    await reader.readexactly(length)
+    return status
+
+async def client(host, port, prefix, members, requests, latencies, statuses, rnd):
+    # sha-256;... as in ETag
+    ni = prefix[len("/.well-known/ni/"):].rstrip("/").replace("/", ";")
+    (reader, writer) = await asyncio.open_connection(host, port)
+    try:
+        for i in range(requests):
+            n = rnd.randrange(members)
+            kind = i % 4
+            path = "folder%s/file%s.txt" % (n % 10, n)
+            headers = ""
+            if kind == 1:
+                path = "folder%s/doc%s.html" % (n % 10, n)
+            elif kind == 2:
+                headers = "Range: bytes=100-1099\r\n"
+            elif kind == 3:
+                headers = 'If-None-Match: "%s/%s"\r\n' % (ni, path)
+            started = time.perf_counter()
+            status = await request(reader, writer, host, prefix + path, headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+async def load(url, members, connections, requests):
+    (scheme, empty, hostport, prefix) = url.split("/", 3)
+    (host, port) = hostport.split(":")
+    prefix = "/" + prefix
+    latencies = []
+    statuses = {}
+    rnd = random.Random(6920)
+    started = time.perf_counter()
+    await asyncio.gather(*[client(host, int(port), prefix, members, requests,
+                                  latencies, statuses, rnd)
+                           for i in range(connections)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print("%s connections x %s requests in %.2f s: %.0f requests/s" %
+          (connections, requests, elapsed, len(latencies) / elapsed))
+    for p in (50, 90, 99):
+        print("  p%s latency %8.2f ms" % (p, latencies[len(latencies) * p // 100] * 1e3))
+    print("  status codes %s" % sorted(statuses.items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test arcp.server on localhost")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20, help="requests per connection")
+    parser.add_argument("--members", type=int, default=500)
+    args = parser.parse_args()
+    raise_fd_limit()
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, "load.zip")
+        make_zip(filename, args.members)
+        (proc, url) = start_server(filename)
+        try:
+            asyncio.run(load(url, args.members, args.connections, args.requests))
+        finally:
+            proc.terminate()
+            proc.wait()
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    main()
@@ -43,6 +43,7 @@ setup(
   download_url = 'https://github.com/stain/arcp-py/archive/0.1.0.tar.gz',
   keywords = "arcp uri url iri archive package",
   
+  python_requires='>=3.6',
   install_requires=[],
   classifiers=[
     # https://pypi.python.org/pypi?%3Aaction=list_classifiers
@@ -55,9 +56,8 @@ setup(
      # https://github.com/pypa/pypi-legacy/issues/564
     #'License :: OSI Approved',
     # 'License :: OSI Approved :: Apache License, Version 2.0 (Apache-2.0)',  
-    'Programming Language :: Python :: 2.7',
     'Programming Language :: Python :: 3',
-    'Programming Language :: Python :: 3.5',
+    'Programming Language :: Python :: 3 :: Only',
     'Programming Language :: Python :: 3.6',
     'Programming Language :: Python :: 3.7',
     'Programming Language :: Python :: 3.8',
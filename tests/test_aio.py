@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+## Copyright 2018 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+import unittest
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256, sha512
+
+from arcp import aio, generate
+
+DATA = os.urandom(1 << 20)
+
+async def chunked(data, size=10000):
+    for i in range(0, len(data), size):
+        yield data[i:i+size]
+        await asyncio.sleep(0)
+
+@unittest.skipIf(sys.version_info < (3, 7), "requires Python 3.7")
+class HashAsyncTest(unittest.TestCase):
+    """Test arcp_hash_async()"""
+    def testChunks(self):
+        uri = asyncio.run(aio.arcp_hash_async(chunked(DATA), "/file.txt", "q", "f"))
+        self.assertEqual(generate.arcp_hash(DATA, "/file.txt", "q", "f"), uri)
+
+    def testEmpty(self):
+        self.assertEqual(generate.arcp_hash(b""), asyncio.run(aio.arcp_hash_async(chunked(b""))))
+
+    def testMethod(self):
+        uri = asyncio.run(aio.arcp_hash_async(chunked(DATA), method="sha-512"))
+        self.assertEqual(generate.arcp_hash(DATA, method="sha-512"), uri)
+        uri = asyncio.run(aio.arcp_hash_async(chunked(DATA), hash=sha512()))
+        self.assertEqual(generate.arcp_hash(DATA, method="sha-512"), uri)
+
+    def testStreamReader(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(DATA)
+            reader.feed_eof()
+            return await aio.arcp_hash_async(reader, chunk_size=4096)
+        self.assertEqual(generate.arcp_hash(DATA), asyncio.run(run()))
+
+    def testSocketStream(self):
+        """Hash an upload received over a local connection"""
+        async def run():
+            result = asyncio.get_event_loop().create_future()
+            async def handle(reader, writer):
+                result.set_result(await aio.arcp_hash_async(reader))
+                writer.close()
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+            for i in range(0, len(DATA), 65536):
+                writer.write(DATA[i:i+65536])
+                await writer.drain()
+            writer.close()
+            uri = await result
+            server.close()
+            await server.wait_closed()
+            return uri
+        self.assertEqual(generate.arcp_hash(DATA), asyncio.run(run()))
+
+    def testBackPressure(self):
+        received = []
+        hashed = []
+        class SlowHash(object):
+            name = "sha256"
+            digest_size = 32
+            def __init__(self):
+                self.h = sha256()
+            def update(self, chunk):
+                time.sleep(0.001)
+                hashed.append(chunk)
+                self.h.update(chunk)
+            def digest(self):
+                return self.h.digest()
+        async def producer():
+            for i in range(100):
+                received.append(i)
+                # not hashed yet: queued, plus the batch in the executor
+                self.assertTrue(len(received) - len(hashed) <= 2 * 3 + 1)
+                yield b"x" * 100
+        with ThreadPoolExecutor(1) as executor:
+            uri = asyncio.run(aio.arcp_hash_async(producer(), hash=SlowHash(),
+                method="sha-256", executor=executor, max_pending=3))
+        self.assertEqual(generate.arcp_hash(b"x" * 10000), uri)
+
+    def testCancel(self):
+        produced = []
+        async def endless():
+            while True:
+                produced.append(True)
+                yield b"x" * 1000
+                await asyncio.sleep(0.001)
+        async def run():
+            task = asyncio.ensure_future(aio.arcp_hash_async(endless()))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            count = len(produced)
+            await asyncio.sleep(0.02)
+            self.assertEqual(count, len(produced))
+        asyncio.run(run())
+
+    def testMaxPending(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(aio.arcp_hash_async(chunked(DATA), max_pending=0))
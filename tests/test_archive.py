@@ -0,0 +1,720 @@
+#!/usr/bin/env python
+
+## Copyright 2018 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+import unittest
+import io
+import os
+import gzip
+import shutil
+import random
+import socket
+import tarfile
+import subprocess
+import tempfile
+import zipfile
+from uuid import UUID
+
+from arcp import archive, generate
+
+TEST_UUID = UUID("8c36d39a-18be-4aa8-b1ce-fef330b00a28")
+
+def make_zip(file):
+    with zipfile.ZipFile(file, "w") as zf:
+        zf.writestr("README.txt", b"Hello")
+        zf.writestr("folder/file.txt", b"Stored data")
+        zf.writestr(zipfile.ZipInfo("folder/deflated.txt"), b"x" * 1000,
+                    compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("empty/", b"")
+        zf.writestr("a b/c d.txt", b"Spaces")
+        zf.writestr("./deep/er/file.txt", b"Deep")
+
+class ZipArchiveTest(unittest.TestCase):
+    """Test ArcpZipArchive"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "test.zip")
+        make_zip(self.filename)
+        self.archive = archive.ArcpZipArchive(self.filename, base=TEST_UUID)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.dir)
+
+    def testBase(self):
+        self.assertEqual(generate.ArcpBase.from_uuid(TEST_UUID), self.archive.base)
+        self.assertEqual("arcp://uuid,%s/folder/file.txt" % TEST_UUID,
+            self.archive.uri("folder/file.txt"))
+        self.assertEqual("arcp://uuid,%s/a%%20b/c%%20d.txt" % TEST_UUID,
+            self.archive.uri("/a b/c d.txt"))
+
+    def testBaseLocation(self):
+        with archive.ArcpZipArchive(self.filename) as a:
+            location = generate.arcp_location("file://" + os.path.abspath(self.filename))
+            self.assertEqual(generate.ArcpBase.from_uri(location), a.base)
+        with archive.ArcpZipArchive(self.filename,
+                location="http://example.com/test.zip") as a:
+            self.assertEqual(generate.ArcpBase.from_location(
+                "http://example.com/test.zip"), a.base)
+
+    def testBaseHash(self):
+        with open(self.filename, "rb") as f:
+            expected = generate.ArcpBase.from_hash(f.read())
+        with archive.ArcpZipArchive(self.filename, base="hash") as a:
+            self.assertEqual(expected, a.base)
+        with open(self.filename, "rb") as f:
+            with archive.ArcpZipArchive(io.BytesIO(f.read()), base="hash") as a:
+                self.assertEqual(expected, a.base)
+
+    def testBaseUri(self):
+        with archive.ArcpZipArchive(self.filename,
+                base="arcp://name,app.example.com/ignored") as a:
+            self.assertEqual(generate.ArcpBase.from_name("app.example.com"), a.base)
+        with self.assertRaises(ValueError):
+            archive.ArcpZipArchive(self.filename, base="http://example.com/")
+        with self.assertRaises(ValueError):
+            archive.ArcpZipArchive(io.BytesIO(), base="location")
+
+    def testUris(self):
+        base = "arcp://uuid,%s/" % TEST_UUID
+        self.assertEqual([base + "README.txt", base + "folder/file.txt",
+                          base + "folder/deflated.txt", base + "a%20b/c%20d.txt",
+                          base + "deep/er/file.txt"],
+            self.archive.uris())
+        self.assertEqual(self.archive.uris(), list(self.archive))
+        self.assertEqual(5, len(self.archive))
+
+    def testContains(self):
+        a = self.archive
+        self.assertTrue(a.uri("README.txt") in a)
+        self.assertTrue("folder/file.txt" in a)
+        self.assertTrue(a.uri("a b/c d.txt") in a)
+        self.assertFalse(a.uri("folder/") in a)
+        self.assertFalse(a.uri("missing") in a)
+        self.assertFalse("arcp://name,example.com/README.txt" in a)
+        self.assertFalse("../README.txt" in a)
+
+    def testListdir(self):
+        a = self.archive
+        self.assertEqual(["README.txt", "a b/", "deep/", "empty/", "folder/"], a.listdir())
+        self.assertEqual(["deflated.txt", "file.txt"], a.listdir(a.uri("folder/")))
+        self.assertEqual(["deflated.txt", "file.txt"], a.listdir("folder"))
+        self.assertEqual(["er/"], a.listdir(a.uri("deep/")))
+        self.assertEqual([], a.listdir(a.uri("empty/")))
+        self.assertEqual(["c d.txt"], a.listdir(a.uri("a b/")))
+        with self.assertRaises(KeyError):
+            a.listdir(a.uri("missing/"))
+
+    def testIsdir(self):
+        a = self.archive
+        self.assertTrue(a.isdir(a.uri("/")))
+        self.assertTrue(a.isdir(a.uri("deep/er/")))
+        self.assertTrue(a.isdir("deep/er"))
+        self.assertFalse(a.isdir(a.uri("README.txt")))
+
+    def testReadStored(self):
+        a = self.archive
+        data = a.read(a.uri("folder/file.txt"))
+        self.assertTrue(isinstance(data, memoryview))
+        self.assertEqual(b"Stored data", data)
+        self.assertEqual(b"Spaces", a.read(a.uri("a b/c d.txt")))
+        self.assertEqual(b"Deep", a.read(a.uri("deep/er/./file.txt")))
+        del data
+
+    def testReadDeflated(self):
+        data = self.archive.read("folder/deflated.txt")
+        self.assertTrue(isinstance(data, bytes))
+        self.assertEqual(b"x" * 1000, data)
+
+    def testReadFileObj(self):
+        with open(self.filename, "rb") as f:
+            with archive.ArcpZipArchive(io.BytesIO(f.read()), base="random") as a:
+                self.assertEqual(b"Stored data", a.read(a.uri("folder/file.txt")))
+
+    def testOpen(self):
+        a = self.archive
+        with a.open(a.uri("folder/deflated.txt")) as f:
+            self.assertEqual(b"x" * 1000, f.read())
+        with a.open(a.uri("README.txt")) as f:
+            self.assertEqual(b"Hello", f.read())
+
+    def testInfo(self):
+        info = self.archive.info(self.archive.uri("README.txt"))
+        self.assertEqual("README.txt", info.filename)
+        self.assertEqual(5, info.file_size)
+        self.assertEqual(5, self.archive.stat(self.archive.uri("README.txt")).size)
+
+    def testNotFound(self):
+        a = self.archive
+        with self.assertRaises(KeyError):
+            a.read(a.uri("missing.txt"))
+        with self.assertRaises(IsADirectoryError):
+            a.open(a.uri("folder/"))
+        with self.assertRaises(IsADirectoryError):
+            a.read(a.uri("folder"))
+
+    def testOtherArchive(self):
+        with self.assertRaises(ValueError):
+            self.archive.read("arcp://name,example.com/README.txt")
+
+    def testClimbOut(self):
+        with self.assertRaises(ValueError):
+            self.archive.read(self.archive.uri("../README.txt"))
+        with self.assertRaises(ValueError):
+            self.archive.read("arcp://uuid,%s/folder/%%2E%%2E/%%2E%%2E/README.txt" % TEST_UUID)
+
+    def testCloseWithViews(self):
+        a = archive.ArcpZipArchive(self.filename)
+        data = a.read(a.uri("README.txt"))
+        a.close()
+        self.assertEqual(b"Hello", data)
+
+
+def make_tar(filename, mode="w"):
+    """Make tar file, return dictionary of member data"""
+    rnd = random.Random(1)
+    members = {
+        "README.txt": b"Hello",
+        "folder/file.txt": b"Tar data",
+        "a b/c d.txt": b"Spaces",
+        "./deep/er/file.txt": b"Deep",
+    }
+    for i in range(20):
+        members["big/%s.bin" % i] = bytes(rnd.getrandbits(8) for x in range(rnd.randint(0, 20000)))
+    with tarfile.open(filename, mode) as tar:
+        for (name, data) in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1500000000
+            tar.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo("empty")
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+        info = tarfile.TarInfo("folder/link.txt")
+        info.type = tarfile.SYMTYPE
+        info.linkname = "../README.txt"
+        tar.addfile(info)
+        info = tarfile.TarInfo("hardlink.txt")
+        info.type = tarfile.LNKTYPE
+        info.linkname = "folder/file.txt"
+        tar.addfile(info)
+    return members
+
+class TarArchiveTest(unittest.TestCase):
+    """Test ArcpTarArchive"""
+    mode = "w"
+    suffix = ".tar"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "test" + self.suffix)
+        self.members = make_tar(self.filename, self.mode)
+        self.archive = archive.ArcpTarArchive(self.filename, base=TEST_UUID,
+                                              checkpoint_interval=16384)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.dir)
+
+    def testCompression(self):
+        self.assertEqual(None, self.archive.compression)
+
+    def testRead(self):
+        a = self.archive
+        self.assertEqual(b"Hello", a.read(a.uri("README.txt")))
+        self.assertEqual(b"Tar data", a.read(a.uri("folder/file.txt")))
+        self.assertEqual(b"Spaces", a.read(a.uri("a b/c d.txt")))
+        self.assertEqual(b"Deep", a.read("deep/er/file.txt"))
+
+    def testReadRandomOrder(self):
+        names = list(self.members) * 2
+        random.Random(2).shuffle(names)
+        for name in names:
+            self.assertEqual(self.members[name], bytes(self.archive.read(name)), name)
+
+    def testOpen(self):
+        a = self.archive
+        data = self.members["big/3.bin"]
+        with a.open(a.uri("big/3.bin")) as f:
+            self.assertEqual(data[:100], f.read(100))
+            self.assertEqual(data[100:], f.read())
+            self.assertEqual(b"", f.read())
+
+    def testLinks(self):
+        a = self.archive
+        self.assertEqual(b"Hello", a.read(a.uri("folder/link.txt")))
+        self.assertEqual(b"Tar data", a.read(a.uri("hardlink.txt")))
+        self.assertTrue(a.uri("hardlink.txt") in a)
+
+    def testListdir(self):
+        a = self.archive
+        self.assertEqual(["README.txt", "a b/", "big/", "deep/", "empty/",
+                          "folder/", "hardlink.txt"], a.listdir())
+        self.assertEqual(["file.txt", "link.txt"], a.listdir("folder/"))
+        self.assertEqual([], a.listdir("empty"))
+
+    def testInfo(self):
+        info = self.archive.info(self.archive.uri("README.txt"))
+        self.assertEqual(5, info.size)
+        self.assertEqual(1500000000, info.mtime)
+        self.assertEqual((5, 1500000000), self.archive.stat("folder/link.txt"))
+
+    def testNotFound(self):
+        a = self.archive
+        with self.assertRaises(KeyError):
+            a.read(a.uri("missing.txt"))
+        with self.assertRaises(IsADirectoryError):
+            a.read(a.uri("folder/"))
+        with self.assertRaises(ValueError):
+            a.read(a.uri("../README.txt"))
+
+    def testIndexSaved(self):
+        index = self.filename + ".arcpindex.json"
+        self.assertTrue(os.path.exists(index))
+        class NoBuild(archive.ArcpTarArchive):
+            def _build_index(self):
+                raise AssertionError("index not loaded")
+        with NoBuild(self.filename, base=TEST_UUID) as a:
+            self.assertEqual(b"Tar data", bytes(a.read(a.uri("folder/file.txt"))))
+            self.assertEqual(b"Hello", bytes(a.read(a.uri("folder/link.txt"))))
+            self.assertEqual(self.archive.listdir(), a.listdir())
+            self.assertEqual(self.archive.uris(), a.uris())
+
+    def testIndexStale(self):
+        st = os.stat(self.filename)
+        os.utime(self.filename, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        built = []
+        class CountBuild(archive.ArcpTarArchive):
+            def _build_index(self):
+                built.append(True)
+                return super(CountBuild, self)._build_index()
+        CountBuild(self.filename).close()
+        self.assertEqual([True], built)
+        CountBuild(self.filename).close()
+        self.assertEqual([True], built)
+
+    def testIndexDir(self):
+        index_dir = os.path.join(self.dir, "index")
+        os.mkdir(index_dir)
+        with archive.ArcpTarArchive(self.filename, base="hash", index_dir=index_dir) as a:
+            digest = a.base.authority.split(";")[1]
+            self.assertEqual([digest + ".arcpindex.json"], os.listdir(index_dir))
+        with archive.ArcpTarArchive(self.filename, index_dir=index_dir) as a:
+            # same hash, different base
+            self.assertEqual([digest + ".arcpindex.json"], os.listdir(index_dir))
+            self.assertEqual(b"Hello", bytes(a.read("README.txt")))
+
+    def testNoSave(self):
+        filename = os.path.join(self.dir, "nosave" + self.suffix)
+        shutil.copy(self.filename, filename)
+        with archive.ArcpTarArchive(filename, save_index=False) as a:
+            self.assertEqual(b"Hello", bytes(a.read("README.txt")))
+        self.assertFalse(os.path.exists(filename + ".arcpindex.json"))
+
+    def testFileObj(self):
+        with open(self.filename, "rb") as f:
+            data = io.BytesIO(f.read())
+        with archive.ArcpTarArchive(data, base="random") as a:
+            self.assertEqual(b"Tar data", a.read(a.uri("folder/file.txt")))
+        self.assertFalse(data.closed)
+
+    def testOpenArchive(self):
+        with archive.open_archive(self.filename) as a:
+            self.assertTrue(isinstance(a, archive.ArcpTarArchive))
+        zipname = os.path.join(self.dir, "test.zip")
+        make_zip(zipname)
+        with archive.open_archive(zipname) as a:
+            self.assertTrue(isinstance(a, archive.ArcpZipArchive))
+
+    @unittest.skipUnless(shutil.which("tar"), "tar command not found")
+    def testSparse(self):
+        sparse = os.path.join(self.dir, "sparse.bin")
+        with open(sparse, "wb") as f:
+            f.seek(1 << 19)
+            f.write(b"middle")
+            f.seek(1 << 20)
+            f.write(b"end")
+        with open(sparse, "rb") as f:
+            data = f.read()
+        filename = os.path.join(self.dir, "sparse.tar")
+        subprocess.check_call(["tar", "--sparse", "--format=gnu", "-cf", filename,
+                               "-C", self.dir, "sparse.bin"])
+        if self.mode == "w:gz":
+            with open(filename, "rb") as f:
+                compressed = gzip.compress(f.read())
+            filename += ".gz"
+            with open(filename, "wb") as f:
+                f.write(compressed)
+        with tarfile.open(filename) as tar:
+            if not tar.getmember("sparse.bin").issparse():
+                self.skipTest("tar did not store a sparse member")
+        with archive.ArcpTarArchive(filename) as a:
+            self.assertEqual(data, a.read("sparse.bin"))
+            with a.open("sparse.bin") as f:
+                f.seek((1 << 19) - 2)
+                self.assertEqual(b"\0\0middle\0", f.read(9))
+                f.seek(0)
+                self.assertEqual(data, f.read())
+        # from saved index
+        with archive.ArcpTarArchive(filename) as a:
+            self.assertEqual(data, a.read("sparse.bin"))
+
+class TarGzArchiveTest(TarArchiveTest):
+    """Test ArcpTarArchive with tar.gz"""
+    mode = "w:gz"
+    suffix = ".tar.gz"
+
+    def testCompression(self):
+        self.assertEqual("gz", self.archive.compression)
+        self.assertTrue(isinstance(self.archive.read("README.txt"), bytes))
+
+    def testCheckpoints(self):
+        reader = self.archive._reader
+        # ~200 kB uncompressed, every 16 kB
+        self.assertTrue(len(reader._checkpoints) > 5)
+        offsets = [c[0] for c in reader._checkpoints]
+        self.assertEqual(sorted(offsets), offsets)
+
+    def testCheckpointsAfterLoad(self):
+        with archive.ArcpTarArchive(self.filename, checkpoint_interval=16384) as a:
+            self.assertEqual(1, len(a._reader._checkpoints))
+            self.assertEqual(self.members["big/19.bin"], a.read("big/19.bin"))
+            self.assertTrue(len(a._reader._checkpoints) > 5)
+            self.assertEqual(self.members["big/0.bin"], a.read("big/0.bin"))
+
+    def testConcatenated(self):
+        filename = os.path.join(self.dir, "concat.tar.gz")
+        with open(self.filename, "rb") as f:
+            data = gzip.decompress(f.read())
+        with open(filename, "wb") as f:
+            half = len(data) // 2
+            f.write(gzip.compress(data[:half]))
+            f.write(gzip.compress(data[half:]))
+        with archive.ArcpTarArchive(filename, checkpoint_interval=8192) as a:
+            for (name, data) in self.members.items():
+                self.assertEqual(data, a.read(name), name)
+
+class DirectoryArchiveTest(unittest.TestCase):
+    """Test ArcpDirectoryArchive"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.dir, "crate")
+        os.makedirs(os.path.join(self.root, "folder"))
+        os.makedirs(os.path.join(self.root, "a b"))
+        os.makedirs(os.path.join(self.root, "empty"))
+        self.files = {
+            "README.txt": b"Hello",
+            "folder/file.txt": b"Directory data",
+            "a b/c d.txt": b"Spaces",
+            "big.bin": os.urandom(100000),
+        }
+        for (name, data) in self.files.items():
+            with open(os.path.join(self.root, name), "wb") as f:
+                f.write(data)
+        with open(os.path.join(self.dir, "secret.txt"), "wb") as f:
+            f.write(b"Secret")
+        self.archive = archive.ArcpDirectoryArchive(self.root, base=TEST_UUID)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.dir)
+
+    def testBaseLocation(self):
+        with archive.ArcpDirectoryArchive(self.root) as a:
+            self.assertEqual(generate.ArcpBase.from_location(
+                "file://" + os.path.abspath(self.root) + "/"), a.base)
+        with self.assertRaises(ValueError):
+            archive.ArcpDirectoryArchive(self.root, base="hash")
+        with self.assertRaises(NotADirectoryError):
+            archive.ArcpDirectoryArchive(os.path.join(self.root, "README.txt"))
+
+    def testRead(self):
+        a = self.archive
+        for (name, data) in self.files.items():
+            self.assertEqual(data, a.read(a.uri(name)), name)
+        self.assertTrue(isinstance(a.read("README.txt"), memoryview))
+
+    def testOpen(self):
+        with self.archive.open(self.archive.uri("folder/file.txt")) as f:
+            self.assertEqual(b"Directory data", f.read())
+
+    def testSendfile(self):
+        a = self.archive
+        out = io.BytesIO()
+        self.assertEqual(100000, a.sendfile(a.uri("big.bin"), out))
+        self.assertEqual(self.files["big.bin"], out.getvalue())
+        out = io.BytesIO()
+        self.assertEqual(1000, a.sendfile(a.uri("big.bin"), out, 500, 1000))
+        self.assertEqual(self.files["big.bin"][500:1500], out.getvalue())
+
+    def testSendfileSocket(self):
+        (s1, s2) = socket.socketpair()
+        try:
+            self.assertEqual(5, self.archive.sendfile("README.txt", s1))
+            self.assertEqual(b"Hello", s2.recv(100))
+            with open(os.path.join(self.root, "empty.txt"), "wb"):
+                pass
+            self.assertEqual(0, self.archive.sendfile("empty.txt", s1))
+            self.assertEqual(0, self.archive.sendfile("README.txt", s1, offset=5))
+            self.assertEqual(0, self.archive.sendfile("README.txt", s1, offset=10))
+            out = io.BytesIO()
+            self.assertEqual(0, self.archive.sendfile("empty.txt", out))
+            self.assertEqual(b"", out.getvalue())
+        finally:
+            s1.close()
+            s2.close()
+
+    def testListdir(self):
+        a = self.archive
+        self.assertEqual(["README.txt", "a b/", "big.bin", "empty/", "folder/"], a.listdir())
+        self.assertEqual(["file.txt"], a.listdir(a.uri("folder/")))
+        self.assertEqual([], a.listdir("empty"))
+        with self.assertRaises(KeyError):
+            a.listdir("missing/")
+        with self.assertRaises(NotADirectoryError):
+            a.listdir("README.txt")
+
+    def testListdirInvalidated(self):
+        a = archive.ArcpDirectoryArchive(self.root, stat_ttl=0)
+        self.assertEqual(["file.txt"], a.listdir("folder/"))
+        filename = os.path.join(self.root, "folder", "new.txt")
+        with open(filename, "wb") as f:
+            f.write(b"New")
+        # ensure directory mtime changes on coarse file systems
+        st = os.stat(os.path.dirname(filename))
+        os.utime(os.path.dirname(filename), ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(["file.txt", "new.txt"], a.listdir("folder/"))
+        self.assertEqual(b"New", a.read("folder/new.txt"))
+
+    def testStatCached(self):
+        a = self.archive
+        a.info("README.txt")
+        a.info("README.txt")
+        a.read(a.uri("README.txt"))
+        self.assertEqual((2, 1, 65536, 1), a.cache_info())
+        a.clear()
+        self.assertEqual((0, 0, 65536, 0), a.cache_info())
+
+    def testInfo(self):
+        self.assertEqual(5, self.archive.info(self.archive.uri("README.txt")).st_size)
+        st = os.stat(os.path.join(self.root, "README.txt"))
+        self.assertEqual((5, st.st_mtime), self.archive.stat("README.txt"))
+        self.assertTrue(self.archive.isdir(self.archive.uri("folder/")))
+        self.assertTrue(self.archive.isdir("folder"))
+        self.assertFalse(self.archive.isdir("README.txt"))
+        self.assertFalse(self.archive.isdir("missing"))
+
+    def testNotFound(self):
+        a = self.archive
+        with self.assertRaises(KeyError):
+            a.read(a.uri("missing.txt"))
+        with self.assertRaises(KeyError):
+            a.read(a.uri("README.txt/"))
+        with self.assertRaises(KeyError):
+            a.read(a.uri("README.txt/x"))
+        with self.assertRaises(IsADirectoryError):
+            a.read(a.uri("folder/"))
+        self.assertFalse(a.uri("missing.txt") in a)
+        self.assertTrue(a.uri("README.txt") in a)
+
+    def testClimbOut(self):
+        a = self.archive
+        with self.assertRaises(ValueError):
+            a.read(a.uri("../secret.txt"))
+        with self.assertRaises(ValueError):
+            a.read("arcp://uuid,%s/folder/%%2E%%2E/%%2E%%2E/secret.txt" % TEST_UUID)
+        with self.assertRaises(ValueError):
+            a.read("arcp://uuid,%s/folder/x%%00y" % TEST_UUID)
+        self.assertFalse(a.uri("../secret.txt") in a)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "symlinks not supported")
+    def testSymlinkClimbOut(self):
+        os.symlink(os.path.join(self.dir, "secret.txt"), os.path.join(self.root, "evil.txt"))
+        os.symlink("../README.txt", os.path.join(self.root, "folder", "good.txt"))
+        os.symlink(self.dir, os.path.join(self.root, "evildir"))
+        a = self.archive
+        with self.assertRaises(ValueError):
+            a.read(a.uri("evil.txt"))
+        with self.assertRaises(ValueError):
+            a.read(a.uri("evildir/secret.txt"))
+        self.assertEqual(b"Hello", a.read(a.uri("folder/good.txt")))
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "symlinks not supported")
+    def testSymlinkSwapped(self):
+        outside = os.path.join(self.dir, "outside")
+        os.makedirs(outside)
+        with open(os.path.join(outside, "file.txt"), "wb") as f:
+            f.write(b"Secret")
+        with archive.ArcpDirectoryArchive(self.root, stat_ttl=3600) as a:
+            self.assertEqual(b"Directory data", a.read("folder/file.txt"))
+            # swapped while the stat result is still cached
+            os.rename(os.path.join(self.root, "folder"), os.path.join(self.root, "moved"))
+            os.symlink(outside, os.path.join(self.root, "folder"))
+            with self.assertRaises(ValueError):
+                a.read("folder/file.txt")
+            with self.assertRaises(ValueError):
+                a.open("folder/file.txt")
+            with self.assertRaises(ValueError):
+                a.sendfile("folder/file.txt", io.BytesIO())
+
+    def testUris(self):
+        base = "arcp://uuid,%s/" % TEST_UUID
+        self.assertEqual([base + "README.txt", base + "big.bin",
+                          base + "a%20b/c%20d.txt", base + "folder/file.txt"],
+            self.archive.uris())
+        self.assertEqual(4, len(self.archive))
+
+    def testOpenArchive(self):
+        with archive.open_archive(self.root, stat_ttl=0) as a:
+            self.assertTrue(isinstance(a, archive.ArcpDirectoryArchive))
+            self.assertEqual(0, a.stat_ttl)
+
+class CountingOpener(object):
+    """Opener keeping track of opened archives"""
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self, file, base):
+        a = archive.ArcpZipArchive(file, base=base)
+        self.opened.append(a)
+        return a
+
+def closed(a):
+    return a._zip.fp is None
+
+class RegistryTest(unittest.TestCase):
+    """Test ArcpArchiveRegistry"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.bases = []
+        self.opener = CountingOpener()
+        self.registry = archive.ArcpArchiveRegistry(maxsize=2, opener=self.opener)
+        for i in range(4):
+            filename = os.path.join(self.dir, "test%s.zip" % i)
+            make_zip(filename)
+            base = generate.ArcpBase.from_name("app%s.example.com" % i)
+            self.registry.register(base, filename)
+            self.bases.append(base)
+
+    def tearDown(self):
+        self.registry.close()
+        shutil.rmtree(self.dir)
+
+    def testRegister(self):
+        self.assertEqual(4, len(self.registry))
+        self.assertTrue("name,app0.example.com" in self.registry)
+        self.assertTrue("arcp://name,app1.example.com/README.txt" in self.registry)
+        self.assertTrue(self.bases[2] in self.registry)
+        self.assertFalse("name,missing.example.com" in self.registry)
+        self.registry.unregister("name,app3.example.com")
+        self.assertEqual(3, len(self.registry))
+
+    def testRead(self):
+        self.assertEqual(b"Hello", self.registry.read(self.bases[0].uri("README.txt")))
+        with self.registry.open(self.bases[1].uri("folder/deflated.txt")) as f:
+            self.assertEqual(b"x" * 1000, f.read())
+        with self.registry.archive(self.bases[2].uri("folder/")) as a:
+            self.assertEqual(self.bases[2], a.base)
+            self.assertEqual(["deflated.txt", "file.txt"],
+                             a.listdir(self.bases[2].uri("folder/")))
+
+    def testNotRegistered(self):
+        with self.assertRaises(KeyError):
+            self.registry.read("arcp://name,missing.example.com/README.txt")
+
+    def testHitsMisses(self):
+        uri = self.bases[0].uri("README.txt")
+        for i in range(3):
+            self.registry.read(uri)
+        self.assertEqual((2, 1, 2, 1), self.registry.cache_info())
+        self.assertEqual(1, len(self.opener.opened))
+
+    def testEvictLRU(self):
+        reg = self.registry
+        reg.read(self.bases[0].uri("README.txt"))
+        reg.read(self.bases[1].uri("README.txt"))
+        reg.read(self.bases[0].uri("README.txt"))
+        reg.read(self.bases[2].uri("README.txt"))
+        (a0, a1, a2) = self.opener.opened
+        self.assertFalse(closed(a0))
+        self.assertTrue(closed(a1))
+        self.assertFalse(closed(a2))
+        self.assertEqual((1, 3, 2, 2), reg.cache_info())
+
+    def testInUseNotClosed(self):
+        reg = self.registry
+        in_use = [reg.acquire(base.uri()) for base in self.bases[:3]]
+        # over maxsize, but all in use
+        self.assertEqual(3, reg.cache_info().currsize)
+        self.assertFalse(any(closed(a) for a in in_use))
+        self.assertEqual(b"Hello", in_use[0].read(self.bases[0].uri("README.txt")))
+        # released least recently used is evicted as the pool is over capacity
+        reg.release(in_use[0])
+        self.assertTrue(closed(in_use[0]))
+        self.assertEqual(2, reg.cache_info().currsize)
+        reg.release(in_use[1])
+        reg.release(in_use[2])
+        self.assertFalse(closed(in_use[1]))
+        self.assertFalse(closed(in_use[2]))
+
+    def testNestedAcquire(self):
+        reg = self.registry
+        a = reg.acquire(self.bases[0])
+        self.assertTrue(a is reg.acquire(self.bases[0]))
+        reg.clear()
+        reg.release(a)
+        self.assertFalse(closed(a))
+        reg.release(a)
+        self.assertTrue(closed(a))
+        with self.assertRaises(KeyError):
+            reg.release(a)
+
+    def testReregister(self):
+        reg = self.registry
+        reg.read(self.bases[0].uri("README.txt"))
+        filename = os.path.join(self.dir, "other.zip")
+        with zipfile.ZipFile(filename, "w") as zf:
+            zf.writestr("README.txt", b"Other")
+        reg.register(self.bases[0], filename)
+        self.assertTrue(closed(self.opener.opened[0]))
+        self.assertEqual(b"Other", reg.read(self.bases[0].uri("README.txt")))
+
+    def testClear(self):
+        reg = self.registry
+        reg.read(self.bases[0].uri("README.txt"))
+        reg.clear()
+        self.assertTrue(closed(self.opener.opened[0]))
+        self.assertEqual((0, 0, 2, 0), reg.cache_info())
+
+    def testMaxsize(self):
+        with self.assertRaises(ValueError):
+            archive.ArcpArchiveRegistry(maxsize=0)
+
+    def testOpenAfterEvict(self):
+        reg = archive.ArcpArchiveRegistry(maxsize=1)
+        for (name, mode) in (("a.tar", "w"), ("b.tar", "w"), ("c.tar.gz", "w:gz")):
+            filename = os.path.join(self.dir, name)
+            members = make_tar(filename, mode)
+            reg.register(generate.ArcpBase.from_name(name), filename)
+        a = generate.ArcpBase.from_name("a.tar")
+        c = generate.ArcpBase.from_name("c.tar.gz")
+        with reg.open(a.uri("big/1.bin")) as s, reg.open(c.uri("big/2.bin")) as g:
+            self.assertEqual(b"Hello",
+                reg.read(generate.ArcpBase.from_name("b.tar").uri("README.txt")))
+            reg.clear()
+            self.assertEqual(members["big/1.bin"], s.read())
+            self.assertEqual(members["big/2.bin"], g.read())
+        self.assertTrue(s.raw._archive._fp.closed)
+        self.assertTrue(g.raw._archive._fp.closed)
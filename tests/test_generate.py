@@ -15,11 +15,19 @@
 ## limitations under the License.
 
 import unittest
+import io
+import os
+import gzip
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from uuid import UUID, RFC_4122, NAMESPACE_OID
 import re
 
-from arcp import generate
-from hashlib import sha256, md5
+from arcp import generate, parse
+from hashlib import sha256, sha512, md5
+from binascii import hexlify
 
 # Some test data
 TEST_UUID_v1 = UUID("dbc0802a-0682-11e8-9895-b8ca3ad10ac0")
@@ -145,6 +153,33 @@ class RandomTest(unittest.TestCase):
             generate.arcp_random(uuid="")      
 
 
+class RandomManyTest(unittest.TestCase):
+    """Test arcp_random_many()"""
+    def testRandomMany(self):
+        uris = generate.arcp_random_many(10000)
+        self.assertEqual(10000, len(uris))
+        self.assertEqual(10000, len(set(uris)))
+        for u in uris:
+            self.assertTrue(u.startswith("arcp://uuid,"))
+            self.assertTrue(u.endswith("/"))
+            uuidStr = u.replace("arcp://uuid,", "").strip("/")
+            self.assertIsNotNone(uuid_re.match(uuidStr))
+            uuid = UUID(uuidStr)
+            self.assertEqual(RFC_4122, uuid.variant)
+            self.assertEqual(4, uuid.version)
+            self.assertEqual(u, generate.arcp_random(uuid=uuid))
+
+    def testRandomManyEmpty(self):
+        self.assertEqual([], generate.arcp_random_many(0))
+
+    def testRandomManyPathQueryFrag(self):
+        for args in (("/folder/file.txt", "a=b&c=d", "frag"), ("file%20.txt",), 
+                     ("",), (None, "q=%s")):
+            for u in generate.arcp_random_many(3, *args):
+                uuid = u[len("arcp://uuid,"):len("arcp://uuid,")+36]
+                self.assertEqual(generate.arcp_random(*args, uuid=uuid), u)
+
+
 class LocationTest(unittest.TestCase):
     """Test arcp_location()"""
     def testExampleZip(self):
@@ -181,6 +216,50 @@ class LocationTest(unittest.TestCase):
                 namespace=NAMESPACE_OID))
 
 
+class LocationMinterTest(unittest.TestCase):
+    """Test LocationMinter"""
+    def testMint(self):
+        minter = generate.LocationMinter()
+        self.assertEqual("arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/", 
+            minter.mint("http://example.com/data.zip"))
+        self.assertEqual("arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/pics/flower.jpeg", 
+            minter.mint("http://example.com/data.zip", "/pics/flower.jpeg"))
+        self.assertEqual(UUID("b7749d0b-0e47-5fc4-999d-f154abe68065"), 
+            minter.uuid("http://example.com/data.zip"))
+
+    def testSameAsLocation(self):
+        minter = generate.LocationMinter(maxsize=10)
+        locations = ["http://example.com/%s.zip" % i for i in range(20)] 
+        locations += ["", "\u00e6\u00f8\u00e5", "http://example.com/0.zip"]
+        for location in locations:
+            self.assertEqual(generate.arcp_location(location, "/a b", "q", "f"), 
+                minter.mint(location, "/a b", "q", "f"))
+        self.assertEqual([generate.arcp_location(l) for l in locations],
+            minter.mint_many(locations))
+
+    def testNamespace(self):
+        minter = generate.LocationMinter(NAMESPACE_OID)
+        self.assertEqual("arcp://uuid,215aa48f-233f-507f-8484-3eb5d6e23e9d/example", 
+            minter.mint(OID, "/example"))
+        minter = generate.LocationMinter(str(NAMESPACE_OID))
+        self.assertEqual("arcp://uuid,215aa48f-233f-507f-8484-3eb5d6e23e9d/example", 
+            minter.mint(OID, "/example"))
+
+    def testCache(self):
+        minter = generate.LocationMinter(maxsize=2)
+        minter.mint_many(["a", "b", "a", "c", "b"])
+        # b was evicted by c
+        self.assertEqual((1, 4, 2, 2), minter.cache_info())
+        minter.clear()
+        self.assertEqual((0, 0, 2, 0), minter.cache_info())
+
+    def testNoCache(self):
+        minter = generate.LocationMinter(maxsize=0)
+        self.assertEqual(generate.arcp_location("a"), minter.mint("a"))
+        self.assertEqual(generate.arcp_location("a"), minter.mint("a"))
+        self.assertEqual((0, 0, 0, 0), minter.cache_info())
+
+
 class NameTest(unittest.TestCase):
     """Test arcp_name()"""
     def testExampleName(self):
@@ -278,3 +357,452 @@ class HashTest(unittest.TestCase):
         with self.assertRaises(Exception):
             generate.arcp_hash(hash=h)
 
+    def testHashMethod(self):
+        self.assertEqual(ARCP, generate.arcp_hash(BYTES, method="sha-256"))
+        self.assertEqual(ARCP, generate.arcp_hash(BYTES, method="SHA-256"))
+        # https://tools.ietf.org/html/rfc6920#section-8.2
+        self.assertEqual("arcp://ni,sha-256-120;f4OxZX_x_FO5LcGBSKHW/", 
+            generate.arcp_hash(BYTES, method="sha-256-120"))
+        self.assertEqual("arcp://ni,sha-256-32;f4OxZQ/", 
+            generate.arcp_hash(BYTES, method="sha-256-32"))
+
+    def testHashSha512(self):
+        u = generate.arcp_hash(BYTES, method="sha-512")
+        self.assertEqual(u, generate.arcp_hash(hash=sha512(BYTES)))
+        self.assertTrue(u.startswith("arcp://ni,sha-512;hhhE1nBOhXP-w02WfiC8_vPUJM9IvgTm3AjyvVjHKXQzcQFerYkcw88cnTS0kmS1EHUbH_nlN5N7xGtdb_TsyA/"))
+
+    def testHashMethodMismatch(self):
+        with self.assertRaises(Exception):
+            generate.arcp_hash(hash=sha512(BYTES), method="sha-256")
+        with self.assertRaises(Exception):
+            generate.arcp_hash(BYTES, method="sha-1")
+
+    def testHashParseRoundtrip(self):
+        for method in ("sha-256", "sha-256-128", "sha-256-120", "sha-256-96", 
+                       "sha-256-64", "sha-256-32", "sha-384", "sha-512"):
+            algorithm = generate.ni_algorithm(method)
+            digest = algorithm.new(BYTES).digest()[:algorithm.truncate]
+            u = parse.parse_arcp(generate.arcp_hash(BYTES, method=method))
+            self.assertEqual((method, hexlify(digest).decode("ascii")), u.hash)
+
+    def testRegisterAlgorithm(self):
+        generate.register_ni_algorithm("x-sha-512-64", sha512, 8)
+        try:
+            u = generate.arcp_hash(BYTES, method="x-sha-512-64")
+            self.assertEqual(("x-sha-512-64", sha512(BYTES).hexdigest()[:16]),
+                parse.parse_arcp(u).hash)
+            # untruncated sha512 hash still maps to sha-512
+            self.assertEqual("sha-512", generate.ni_algorithm(hash=sha512()).name)
+        finally:
+            del generate._NI_ALGORITHMS["x-sha-512-64"]
+            del generate._NI_HASH_KEYS["x-sha-512-64"]
+        with self.assertRaises(ValueError):
+            generate.register_ni_algorithm("x-sha-256-512", sha256, 64)
+        self.assertFalse("x-sha-256-512" in generate._NI_ALGORITHMS)
+        self.assertFalse("x-sha-256-512" in generate._NI_HASH_KEYS)
+
+    def testHashFileMethod(self):
+        self.assertEqual("arcp://ni,sha-256-32;f4OxZQ/", 
+            generate.arcp_hash_file(io.BytesIO(BYTES), method="sha-256-32"))
+
+
+class HashFileTest(unittest.TestCase):
+    """Test arcp_hash_file()"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "hello.txt")
+        with open(self.filename, "wb") as f:
+            f.write(BYTES)
+        # Bigger than a chunk
+        self.data = os.urandom(100000)
+        self.bigfile = os.path.join(self.dir, "big.bin")
+        with open(self.bigfile, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testHashFilename(self):
+        self.assertEqual(ARCP, generate.arcp_hash_file(self.filename))
+
+    def testHashFilePathQueryFragment(self):
+        self.assertEqual(ARCP + "bin/evil?a=b&c=d#frag", 
+            generate.arcp_hash_file(self.filename, "/bin/evil", "a=b&c=d", "frag"))
+
+    def testHashFileObj(self):
+        with open(self.filename, "rb") as f:
+            self.assertEqual(ARCP, generate.arcp_hash_file(f))
+            self.assertFalse(f.closed)
+        self.assertEqual(ARCP, generate.arcp_hash_file(io.BytesIO(BYTES)))
+
+    def testHashFileObjNoReadinto(self):
+        class Reader(object):
+            def __init__(self, data):
+                self.f = io.BytesIO(data)
+            def read(self, size=-1):
+                return self.f.read(size)
+        self.assertEqual(ARCP, generate.arcp_hash_file(Reader(BYTES)))
+
+    def testHashFileChunks(self):
+        expected = generate.arcp_hash(self.data)
+        for use_mmap in (False, True):
+            for overlap in (False, True):
+                self.assertEqual(expected, 
+                    generate.arcp_hash_file(self.bigfile, chunk_size=4096, 
+                        use_mmap=use_mmap, overlap=overlap))
+        
+    def testHashFileMmapPosition(self):
+        with open(self.bigfile, "rb") as f:
+            f.seek(1000)
+            self.assertEqual(generate.arcp_hash(self.data[1000:]), 
+                generate.arcp_hash_file(f, use_mmap=True))
+            self.assertEqual(b"", f.read())
+
+    def testHashFileMmapFallback(self):
+        empty = os.path.join(self.dir, "empty")
+        open(empty, "wb").close()
+        self.assertEqual(generate.arcp_hash(b""), 
+            generate.arcp_hash_file(empty, use_mmap=True))
+        self.assertEqual(ARCP, 
+            generate.arcp_hash_file(io.BytesIO(BYTES), use_mmap=True))
+
+    def testHashFileMmapWrapped(self):
+        gzname = os.path.join(self.dir, "big.gz")
+        with gzip.open(gzname, "wb") as f:
+            f.write(self.data)
+        for use_mmap in (False, True):
+            with gzip.open(gzname, "rb") as f:
+                f.read(1000)
+                self.assertEqual(generate.arcp_hash(self.data[1000:]),
+                    generate.arcp_hash_file(f, use_mmap=use_mmap))
+
+    def testHashFileOverlapError(self):
+        class Failing(io.RawIOBase):
+            def readinto(self, b):
+                raise IOError("Disk on fire")
+        with self.assertRaises(IOError):
+            generate.arcp_hash_file(Failing(), overlap=True)
+
+    def testHashFileMissing(self):
+        with self.assertRaises(IOError):
+            generate.arcp_hash_file(os.path.join(self.dir, "missing"))
+
+
+class HashMultiTest(unittest.TestCase):
+    """Test arcp_hash_multi(), arcp_hash_file_multi() and MultiHash"""
+    METHODS = ("sha-256", "sha-512", "sha-256-32", "sha-384")
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # Big enough to be hashed in threads
+        self.data = os.urandom(300000)
+        self.bigfile = os.path.join(self.dir, "big.bin")
+        with open(self.bigfile, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def expected(self, data, path="/"):
+        return [generate.arcp_hash(data, path, method=m) for m in self.METHODS]
+
+    def testHashMulti(self):
+        uris = generate.arcp_hash_multi(BYTES)
+        self.assertEqual(["sha-256", "sha-512"], list(uris))
+        self.assertEqual(ARCP, uris["sha-256"])
+        self.assertEqual(generate.arcp_hash(BYTES, method="sha-512"), uris["sha-512"])
+
+    def testHashMultiThreads(self):
+        for threads in (False, True):
+            uris = generate.arcp_hash_multi(self.data, self.METHODS, 
+                "/a", threads=threads)
+            self.assertEqual(list(self.METHODS), list(uris))
+            self.assertEqual(self.expected(self.data, "/a"), list(uris.values()))
+
+    def testHashFileMulti(self):
+        expected = self.expected(self.data)
+        for use_mmap in (False, True):
+            for overlap in (False, True):
+                uris = generate.arcp_hash_file_multi(self.bigfile, self.METHODS,
+                    threads=True, chunk_size=100000, use_mmap=use_mmap, overlap=overlap)
+                self.assertEqual(expected, list(uris.values()))
+
+    def testHashFileMultiFileObj(self):
+        with open(self.bigfile, "rb") as f:
+            f.seek(1000)
+            uris = generate.arcp_hash_file_multi(f, self.METHODS)
+            self.assertFalse(f.closed)
+        self.assertEqual(self.expected(self.data[1000:]), list(uris.values()))
+
+    def testMultiHashSharesHash(self):
+        with generate.MultiHash(("sha-256", "sha-256-128", "SHA-512")) as multi:
+            self.assertIs(multi.hash("sha-256"), multi.hash("sha-256-128"))
+            self.assertIsNot(multi.hash("sha-256"), multi.hash("sha-512"))
+            multi.update(BYTES)
+            self.assertEqual(ARCP, multi.arcp_uris()["sha-256"])
+            # still updatable
+            multi.update(BYTES)
+            self.assertEqual(generate.arcp_hash(BYTES + BYTES), 
+                multi.arcp_uris()["sha-256"])
+            with self.assertRaises(KeyError):
+                multi.hash("sha-384")
+
+    def testMultiHashSingleMethod(self):
+        self.assertEqual(ARCP, generate.arcp_hash_multi(BYTES, "sha-256")["sha-256"])
+
+    def testMultiHashInvalid(self):
+        with self.assertRaises(ValueError):
+            generate.MultiHash(())
+        with self.assertRaises(Exception):
+            generate.MultiHash(("sha-256", "md5"))
+
+
+class HashingWriterTest(unittest.TestCase):
+    """Test HashingWriter"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "archive.zip")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self):
+        with open(self.filename, "rb") as f:
+            return f.read()
+
+    def writeZip(self, w):
+        with zipfile.ZipFile(w, "w") as z:
+            z.writestr("hello.txt", BYTES)
+            z.writestr("big.bin", os.urandom(50000))
+            z.writestr("text.txt", BYTES * 1000, compress_type=zipfile.ZIP_DEFLATED)
+            with z.open("stream.bin", "w") as f:
+                f.write(os.urandom(3000))
+
+    def testWrite(self):
+        with generate.HashingWriter(self.filename) as w:
+            self.assertIsNone(w.uri)
+            self.assertEqual(len(BYTES), w.write(BYTES))
+            self.assertEqual(ARCP + "a", w.arcp_uri("/a"))
+            self.assertEqual(len(BYTES), w.tell())
+        self.assertTrue(w.closed)
+        self.assertEqual(ARCP, w.uri)
+        self.assertEqual(ARCP + "b?q#f", w.arcp_uri("/b", "q", "f"))
+        self.assertEqual(BYTES, self.read())
+        with self.assertRaises(ValueError):
+            w.write(BYTES)
+
+    def testMethod(self):
+        with generate.HashingWriter(io.BytesIO(), method="sha-512") as w:
+            w.write(BYTES)
+        self.assertEqual(generate.arcp_hash(BYTES, method="sha-512"), w.uri)
+
+    def testZipNotSeekable(self):
+        with generate.HashingWriter(self.filename) as w:
+            self.assertFalse(w.seekable())
+            self.writeZip(w)
+        data = self.read()
+        self.assertEqual(generate.arcp_hash(data), w.uri)
+        # data descriptor rather than patched local header
+        self.assertTrue(data[6] & 0x08)
+        with zipfile.ZipFile(self.filename) as z:
+            self.assertEqual(BYTES, z.read("hello.txt"))
+            self.assertIsNone(z.testzip())
+
+    def testZipSeekable(self):
+        with generate.HashingWriter(self.filename, seekable=True, 
+                                    checkpoint_interval=4096) as w:
+            self.assertTrue(w.seekable())
+            self.writeZip(w)
+        data = self.read()
+        self.assertEqual(generate.arcp_hash(data), w.uri)
+        self.assertFalse(data[6] & 0x08)
+
+    def testFileObjPosition(self):
+        f = io.BytesIO()
+        f.write(b"prefix")
+        with generate.HashingWriter(f, seekable=True) as w:
+            self.assertEqual(6, w.tell())
+            w.write(BYTES)
+            with self.assertRaises(ValueError):
+                w.seek(0)
+        self.assertFalse(f.closed)
+        self.assertEqual(ARCP, w.uri)
+        self.assertEqual(b"prefix" + BYTES, f.getvalue())
+
+    def testSeekPatch(self):
+        data = bytearray(os.urandom(10000))
+        f = io.BytesIO()
+        with generate.HashingWriter(f, seekable=True, checkpoint_interval=1000) as w:
+            w.write(data)
+            w.seek(5500)
+            w.write(b"patch")
+            data[5500:5505] = b"patch"
+            self.assertEqual(generate.arcp_hash(bytes(data)), w.arcp_uri())
+            self.assertEqual(5505, w.tell())
+            w.seek(0, io.SEEK_END)
+            w.write(b"end")
+            w.seek(-3, io.SEEK_CUR)
+            w.write(b"END")
+            w.seek(100)
+            w.write(b"start")
+        data[100:105] = b"start"
+        self.assertEqual(generate.arcp_hash(bytes(data) + b"END"), w.uri)
+
+    def testSeekGap(self):
+        f = io.BytesIO()
+        with generate.HashingWriter(f, seekable=True) as w:
+            w.write(BYTES)
+            w.seek(100, io.SEEK_END)
+            w.write(BYTES)
+        self.assertEqual(f.getvalue(), BYTES + bytes(100) + BYTES)
+        self.assertEqual(generate.arcp_hash(f.getvalue()), w.uri)
+
+    def testNotReadable(self):
+        with open(self.filename, "wb") as f:
+            w = generate.HashingWriter(f, seekable=True)
+            self.assertFalse(w.seekable())
+            with self.assertRaises(io.UnsupportedOperation):
+                w.seek(0)
+            w.close()
+            self.assertFalse(f.closed)
+
+
+class HashManyTest(unittest.TestCase):
+    """Test arcp_hash_many()"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.files = []
+        for i in range(10):
+            filename = os.path.join(self.dir, "%s.bin" % i)
+            with open(filename, "wb") as f:
+                f.write(BYTES * i)
+            self.files.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def expected(self, filename, path="/"):
+        with open(filename, "rb") as f:
+            return generate.arcp_hash(f.read(), path)
+
+    def testHashManyThreads(self):
+        results = list(generate.arcp_hash_many(self.files, workers=3))
+        self.assertEqual(self.files, [f for (f, uri, error) in results])
+        for (f, uri, error) in results:
+            self.assertIsNone(error)
+            self.assertEqual(self.expected(f), uri)
+
+    def testHashManyProcesses(self):
+        results = list(generate.arcp_hash_many(self.files, "/a.txt", 
+            workers=2, executor="process"))
+        self.assertEqual(self.files, [f for (f, uri, error) in results])
+        for (f, uri, error) in results:
+            self.assertEqual(self.expected(f, "/a.txt"), uri)
+
+    def testHashManyUnordered(self):
+        results = list(generate.arcp_hash_many(iter(self.files), 
+            workers=4, ordered=False, use_mmap=True))
+        self.assertEqual(sorted(self.files), sorted(f for (f, uri, error) in results))
+        for (f, uri, error) in results:
+            self.assertEqual(self.expected(f), uri)
+
+    def testHashManyErrors(self):
+        missing = os.path.join(self.dir, "missing")
+        files = [self.files[1], missing, self.files[2]]
+        results = list(generate.arcp_hash_many(files))
+        self.assertEqual(files, [f for (f, uri, error) in results])
+        self.assertEqual(self.expected(self.files[1]), results[0][1])
+        self.assertIsNone(results[1][1])
+        self.assertIsInstance(results[1][2], IOError)
+        self.assertEqual(self.expected(self.files[2]), results[2][1])
+
+    def testHashManyExecutor(self):
+        with ThreadPoolExecutor(2) as pool:
+            results = list(generate.arcp_hash_many(self.files, executor=pool))
+            # still usable
+            self.assertEqual(2, pool.submit(lambda: 2).result())
+        self.assertEqual(len(self.files), len(results))
+
+    def testHashManyLazyPool(self):
+        created = []
+        class CountingPool(ThreadPoolExecutor):
+            def __init__(self, *args):
+                created.append(self)
+                super(CountingPool, self).__init__(*args)
+        original = generate.ThreadPoolExecutor
+        generate.ThreadPoolExecutor = CountingPool
+        try:
+            results = generate.arcp_hash_many(self.files)
+            # not iterated, nothing to shut down
+            self.assertEqual([], created)
+            next(results)
+            self.assertEqual(1, len(created))
+            results.close()
+            self.assertTrue(created[0]._shutdown)
+        finally:
+            generate.ThreadPoolExecutor = original
+
+    def testHashManyUnknownExecutor(self):
+        with self.assertRaises(ValueError):
+            generate.arcp_hash_many(self.files, executor="gpu")
+
+
+class ArcpBaseTest(unittest.TestCase):
+    """Test ArcpBase"""
+    ARGS = [("/",), ("",), ("folder/file.txt",), ("/folder/file.txt", "q=s", "frag"),
+            ("/", "", ""), ("/a", None, "f"), ("//double", "q")]
+
+    def testFromUUID(self):
+        base = generate.ArcpBase.from_uuid(TEST_UUID_v1)
+        self.assertEqual("uuid,dbc0802a-0682-11e8-9895-b8ca3ad10ac0", base.authority)
+        self.assertEqual(base, generate.ArcpBase.from_uuid(str(TEST_UUID_v1)))
+        for args in self.ARGS:
+            self.assertEqual(generate.arcp_uuid(TEST_UUID_v1, *args), base.uri(*args))
+        with self.assertRaises(Exception):
+            generate.ArcpBase.from_uuid("5da78af6")
+
+    def testFromName(self):
+        base = generate.ArcpBase.from_name("app.example.org")
+        for args in self.ARGS:
+            self.assertEqual(generate.arcp_name("app.example.org", *args), base.uri(*args))
+        with self.assertRaises(Exception):
+            generate.ArcpBase.from_name("example com")
+
+    def testFromHash(self):
+        base = generate.ArcpBase.from_hash(BYTES)
+        self.assertEqual(ARCP, str(base))
+        self.assertEqual(base, generate.ArcpBase.from_hash(hash=sha256(BYTES)))
+        for args in self.ARGS:
+            self.assertEqual(generate.arcp_hash(BYTES, *args), base.uri(*args))
+        self.assertEqual(generate.arcp_hash(BYTES, method="sha-256-32"),
+            generate.ArcpBase.from_hash(BYTES, method="sha-256-32").uri())
+
+    def testFromLocation(self):
+        self.assertEqual("arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/pics/", 
+            generate.ArcpBase.from_location("http://example.com/data.zip").uri("/pics/"))
+        self.assertEqual("arcp://uuid,215aa48f-233f-507f-8484-3eb5d6e23e9d/example",
+            generate.ArcpBase.from_location(OID, NAMESPACE_OID).uri("/example"))
+
+    def testFromRandom(self):
+        base = generate.ArcpBase.from_random()
+        self.assertTrue(base.authority.startswith("uuid,"))
+        self.assertNotEqual(base, generate.ArcpBase.from_random())
+
+    def testFromURI(self):
+        base = generate.ArcpBase.from_uri(ARCP + "folder/file?q#f")
+        self.assertEqual(generate.ArcpBase.from_hash(BYTES), base)
+        self.assertEqual(hash(generate.ArcpBase.from_hash(BYTES)), hash(base))
+
+    def testQuote(self):
+        base = generate.ArcpBase.from_name("app.example.org")
+        self.assertEqual("arcp://name,app.example.org/b%20c/%25d%3F%23;e=f@g:h", 
+            base.uri("b c/%d?#;e=f@g:h", quote=True))
+        self.assertEqual("arcp://name,app.example.org/%C3%A6", 
+            base.uri("\u00e6", quote=True))
+
+    def testURIs(self):
+        base = generate.ArcpBase.from_uuid(TEST_UUID_v1)
+        paths = ["/a", "b/c", "", "d e/"]
+        self.assertEqual([base.uri(p) for p in paths], base.uris(paths))
+        self.assertEqual([base.uri(p, quote=True) for p in paths], 
+            base.uris(iter(paths), quote=True))
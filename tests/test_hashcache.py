@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+import unittest
+import os
+import time
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from arcp import generate, hashcache
+from arcp.hashcache import HashCache
+
+BYTES = b"Hello World!"
+ARCP = "arcp://ni,sha-256;f4OxZX_x_FO5LcGBSKHWXfwtSx-j1ncoSt3SABJtkGk/"
+
+def hash_with(args):
+    """Hash in another process"""
+    (filename, cache) = args
+    return (generate.arcp_hash_file(filename, cache=cache), cache.cache_info().hits)
+
+class HashCacheTest(unittest.TestCase):
+    """Test HashCache"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.dir, "cache", "hashes.sqlite")
+        self.cache = HashCache(self.db)
+        self.filename = self.write("hello.txt", BYTES)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data, age=60):
+        """Write file, modified age seconds ago"""
+        filename = os.path.join(self.dir, name)
+        with open(filename, "wb") as f:
+            f.write(data)
+        mtime = time.time() - age
+        os.utime(filename, (mtime, mtime))
+        return filename
+
+    def testHit(self):
+        self.assertEqual(ARCP, generate.arcp_hash_file(self.filename, cache=self.cache))
+        self.assertEqual((0, 1, None, 1), self.cache.cache_info())
+        self.assertEqual(ARCP + "a?q#f", generate.arcp_hash_file(
+            self.filename, "/a", "q", "f", cache=self.cache))
+        self.assertEqual((1, 1, None, 1), self.cache.cache_info())
+
+    def testPersistent(self):
+        generate.arcp_hash_file(self.filename, cache=self.cache)
+        self.cache.close()
+        with HashCache(self.db) as other:
+            self.assertEqual(ARCP, generate.arcp_hash_file(self.filename, cache=other))
+            self.assertEqual(1, other.cache_info().hits)
+
+    def testTruncatedShareDigest(self):
+        generate.arcp_hash_file(self.filename, cache=self.cache)
+        self.assertEqual(generate.arcp_hash(BYTES, method="sha-256-32"),
+            generate.arcp_hash_file(self.filename, method="sha-256-32", cache=self.cache))
+        self.assertEqual(1, self.cache.cache_info().hits)
+        self.assertEqual(generate.arcp_hash(BYTES, method="sha-512"),
+            generate.arcp_hash_file(self.filename, method="sha-512", cache=self.cache))
+        self.assertEqual(2, len(self.cache))
+
+    def testChanged(self):
+        generate.arcp_hash_file(self.filename, cache=self.cache)
+        self.write("hello.txt", b"Hello World?", age=30)
+        self.assertEqual(generate.arcp_hash(b"Hello World?"),
+            generate.arcp_hash_file(self.filename, cache=self.cache))
+        self.assertEqual(0, self.cache.cache_info().hits)
+        # old entry replaced
+        self.assertEqual(1, len(self.cache))
+
+    def testRecentlyModifiedNotCached(self):
+        recent = self.write("recent.txt", BYTES, age=0)
+        self.assertEqual(ARCP, generate.arcp_hash_file(recent, cache=self.cache))
+        self.assertEqual(0, len(self.cache))
+
+    def testStale(self):
+        generate.arcp_hash_file(self.filename, cache=self.cache)
+        st = os.stat(self.filename)
+        with open(self.filename, "r+b") as f:
+            f.write(b"J")
+        os.utime(self.filename, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # not detected without verifying
+        self.assertEqual(ARCP, generate.arcp_hash_file(self.filename, cache=self.cache))
+        self.assertEqual([self.filename], self.cache.verify())
+        self.assertEqual(generate.arcp_hash(b"Jello World!"),
+            generate.arcp_hash_file(self.filename, cache=self.cache))
+        self.assertEqual([], self.cache.verify(None))
+
+    def testVerifyRate(self):
+        cache = HashCache(self.db, verify_rate=1.0)
+        generate.arcp_hash_file(self.filename, cache=cache)
+        st = os.stat(self.filename)
+        with open(self.filename, "r+b") as f:
+            f.write(b"J")
+        os.utime(self.filename, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(generate.arcp_hash(b"Jello World!"),
+            generate.arcp_hash_file(self.filename, cache=cache))
+        cache.close()
+        with self.assertRaises(ValueError):
+            HashCache(self.db, verify_rate=2)
+
+    def testVerifyRemovesMissing(self):
+        generate.arcp_hash_file(self.filename, cache=self.cache)
+        os.remove(self.filename)
+        self.assertEqual([], self.cache.verify())
+        self.assertEqual(0, len(self.cache))
+
+    def testEvict(self):
+        for i in range(5):
+            generate.arcp_hash_file(self.write("%s.txt" % i, BYTES * i), cache=self.cache)
+        self.assertEqual(5, len(self.cache))
+        self.assertEqual(2, self.cache.evict(max_entries=3))
+        self.assertEqual(3, len(self.cache))
+        self.assertEqual(0, self.cache.evict(max_age=3600))
+        self.assertEqual(3, self.cache.evict(max_age=-1))
+        self.assertEqual(0, len(self.cache))
+
+    def testMaxEntriesOnOpen(self):
+        for i in range(5):
+            generate.arcp_hash_file(self.write("%s.txt" % i, BYTES * i), cache=self.cache)
+        with HashCache(self.db, max_entries=2) as cache:
+            self.assertEqual(2, len(cache))
+
+    def testClear(self):
+        generate.arcp_hash_file(self.filename, cache=self.cache)
+        self.cache.clear()
+        self.assertEqual((0, 0, None, 0), self.cache.cache_info())
+
+    def testFileObjectNotCached(self):
+        with open(self.filename, "rb") as f:
+            self.assertEqual(ARCP, generate.arcp_hash_file(f, cache=self.cache))
+        self.assertEqual(0, len(self.cache))
+
+    def testMissing(self):
+        with self.assertRaises(IOError):
+            generate.arcp_hash_file(os.path.join(self.dir, "missing"), cache=self.cache)
+
+    def testHashMany(self):
+        files = [self.write("%s.txt" % i, BYTES * i) for i in range(5)]
+        results = list(generate.arcp_hash_many(files, workers=2, cache=self.cache))
+        self.assertEqual(5, len(self.cache))
+        for (f, uri, error) in results:
+            self.assertEqual(generate.arcp_hash_file(f), uri)
+
+    def testProcesses(self):
+        generate.arcp_hash_file(self.filename, cache=self.cache)
+        self.assertEqual(HashCache, type(pickle.loads(pickle.dumps(self.cache))))
+        with ProcessPoolExecutor(2) as pool:
+            results = list(pool.map(hash_with, [(self.filename, self.cache)] * 4))
+        for (uri, hits) in results:
+            self.assertEqual(ARCP, uri)
+            self.assertTrue(hits >= 1)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "fork() not supported")
+    def testFork(self):
+        generate.arcp_hash_file(self.filename, cache=self.cache)
+        parent_db = self.cache._db
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                ok = (ARCP == generate.arcp_hash_file(self.filename, cache=self.cache) and
+                      self.cache._db is not parent_db and
+                      any(db is parent_db for db in hashcache._INHERITED))
+                self.cache.close()
+            finally:
+                os._exit(0 if ok else 1)
+        (pid, status) = os.waitpid(pid, 0)
+        self.assertEqual(0, status)
+        self.assertIs(parent_db, self.cache._db)
+        self.assertEqual(ARCP, generate.arcp_hash_file(self.filename, cache=self.cache))
+        self.assertEqual(1, self.cache.cache_info().hits)
+
+    def testDefaultFilename(self):
+        old = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = self.dir
+        try:
+            with HashCache() as cache:
+                self.assertEqual(os.path.join(self.dir, "arcp", "hashes.sqlite"),
+                                 cache.filename)
+                self.assertTrue(os.path.exists(cache.filename))
+        finally:
+            if old is None:
+                del os.environ["XDG_CACHE_HOME"]
+            else:
+                os.environ["XDG_CACHE_HOME"] = old
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+## Copyright 2018-2020 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+
+from arcp import generate, parse
+from arcp.archive import ArcpArchiveRegistry
+from arcp.hashcache import HashCache
+from arcp.niindex import NiIndex
+
+BYTES = b"Hello World!"
+ARCP = "arcp://ni,sha-256;f4OxZX_x_FO5LcGBSKHWXfwtSx-j1ncoSt3SABJtkGk/"
+
+class NiIndexTest(unittest.TestCase):
+    """Test NiIndex"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.index = NiIndex(os.path.join(self.dir, "index", "ni.sqlite"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data):
+        filename = os.path.join(self.dir, "archives", name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "wb") as f:
+            f.write(data)
+        return filename
+
+    def testAddLookup(self):
+        self.assertTrue(self.index.add(ARCP + "file.txt", "/b.zip"))
+        self.assertFalse(self.index.add(ARCP, "/b.zip"))
+        self.assertTrue(self.index.add(ARCP, "/a.zip"))
+        self.assertEqual(["/a.zip", "/b.zip"], self.index.lookup(ARCP + "other.txt?q#f"))
+        self.assertEqual(2, len(self.index))
+        self.assertIn(ARCP, self.index)
+        self.assertNotIn(generate.arcp_hash(b"other"), self.index)
+        self.assertEqual([], self.index.lookup(generate.arcp_hash(BYTES, method="sha-512")))
+
+    def testHashForms(self):
+        self.index.add(ARCP, "/a.zip")
+        u = parse.parse_arcp(ARCP)
+        for ni in (u.hash, u.ni, "ni," + u.ni, u.ni_uri(), u.ni_uri("example.com"),
+                   "ni:" + u.ni, "ni:///%s?ct=application/zip#f" % u.ni,
+                   "ni://example.com/%s#f" % u.ni):
+            self.assertEqual(["/a.zip"], self.index.lookup(ni))
+        with self.assertRaises(ValueError):
+            self.index.lookup("arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/")
+        with self.assertRaises(ValueError):
+            self.index.lookup(("sha-256", "abcd"))
+        with self.assertRaises(Exception):
+            self.index.lookup(("md5", "abcd"))
+
+    def testTruncated(self):
+        self.index.add(ARCP, "/a.zip")
+        self.index.add(generate.arcp_hash(b"other"), "/b.zip")
+        self.assertEqual(["/a.zip"], self.index.lookup(
+            generate.arcp_hash(BYTES, method="sha-256-32")))
+        with self.assertRaises(ValueError):
+            self.index.add(generate.arcp_hash(BYTES, method="sha-256-32"), "/c.zip")
+
+    def testPrefixEnd(self):
+        digest = b"\x01\xff" + bytes(30)
+        self.index.add(("sha-256", digest.hex()), "/ff.zip")
+        self.index.add(("sha-256", (b"\x02" + bytes(31)).hex()), "/02.zip")
+        self.assertEqual(["/ff.zip"], self.index.lookup(("sha-256-32", "01ff0000")))
+        top = b"\xff" * 32
+        self.index.add(("sha-256", top.hex()), "/top.zip")
+        self.assertEqual(["/top.zip"], self.index.lookup(("sha-256-32", "ffffffff")))
+
+    def testMultipleMethods(self):
+        uris = generate.arcp_hash_multi(BYTES, ("sha-256", "sha-512"))
+        for uri in uris.values():
+            self.index.add(uri, "/a.zip")
+        self.assertEqual(["/a.zip"], self.index.lookup(uris["sha-512"]))
+        self.assertEqual(sorted(parse.parse_arcp(u).netloc for u in uris.values()),
+                         self.index.hashes("/a.zip"))
+
+    def testRemove(self):
+        other = generate.arcp_hash(b"other")
+        self.index.add_many([(ARCP, "/a.zip"), (ARCP, "/b.zip"), (other, "/b.zip")])
+        self.assertEqual(1, self.index.remove(ARCP, "/a.zip"))
+        self.assertEqual(["/b.zip"], self.index.locations())
+        self.assertEqual(0, self.index.remove(ARCP, "/missing.zip"))
+        self.assertEqual(1, self.index.remove(ARCP))
+        self.assertEqual(["/b.zip"], self.index.lookup(other))
+        self.assertEqual(0, self.index.remove(generate.arcp_hash(BYTES, method="sha-512")))
+
+    def testRemoveLocation(self):
+        self.index.add_many([(ARCP, "/a.zip"), (ARCP, "/b.zip")])
+        self.assertEqual(1, self.index.remove_location("/a.zip"))
+        self.assertEqual(0, self.index.remove_location("/a.zip"))
+        self.assertEqual(["/b.zip"], self.index.lookup(ARCP))
+        self.assertEqual(["/b.zip"], self.index.locations())
+
+    def testAddManyBatches(self):
+        entries = [(generate.arcp_hash(b"%d" % i), "/%d.zip" % (i % 100))
+                   for i in range(25000)]
+        self.assertEqual(25000, self.index.add_many(iter(entries)))
+        self.assertEqual(0, self.index.add_many(entries[:10]))
+        self.assertEqual(25000, len(self.index))
+        self.assertEqual(100, len(self.index.locations()))
+        self.assertEqual(["/42.zip"], self.index.lookup(generate.arcp_hash(b"1342")))
+
+    def testAddManyInvalidRollsBack(self):
+        with self.assertRaises(ValueError):
+            self.index.add_many([(ARCP, "/a.zip"), ("sha-256;invalid", "/b.zip")])
+        self.assertEqual(0, len(self.index))
+        self.index.add(ARCP, "/a.zip")
+        self.assertEqual(["/a.zip"], self.index.lookup(ARCP))
+
+    def testScan(self):
+        a = self.write("a.zip", BYTES)
+        b = self.write(os.path.join("sub", "b.TAR.GZ"), b"other")
+        self.write("notes.txt", b"notes")
+        archives = os.path.join(self.dir, "archives")
+        self.assertEqual(2, self.index.scan(archives))
+        self.assertEqual(0, self.index.scan(archives))
+        self.assertEqual([a], self.index.lookup(ARCP))
+        self.assertEqual([b], self.index.lookup(generate.arcp_hash(b"other")))
+        self.assertEqual(3, self.index.scan(archives, method="sha-512", extensions=None))
+
+    def testScanCache(self):
+        os.utime(self.write("a.zip", BYTES), (0, 0))
+        with HashCache(os.path.join(self.dir, "cache.sqlite")) as cache:
+            self.index.scan(os.path.join(self.dir, "archives"), cache=cache)
+            self.assertEqual(1, len(cache))
+
+    def testRegister(self):
+        a = self.write("a.zip", BYTES)
+        self.index.add(ARCP, os.path.join(self.dir, "archives", "deleted.zip"))
+        self.index.add(ARCP, a)
+        registry = ArcpArchiveRegistry()
+        self.assertEqual(a, self.index.register(registry, ARCP + "file.txt"))
+        self.assertEqual(a, registry.filename(ARCP))
+        with self.assertRaises(KeyError):
+            self.index.register(registry, generate.arcp_hash(b"other"))
+
+    def testPersistent(self):
+        self.index.add(ARCP, "/a.zip")
+        other = pickle.loads(pickle.dumps(self.index))
+        self.assertEqual(["/a.zip"], other.lookup(ARCP))
+        other.close()
+
+    def testClear(self):
+        self.index.add(ARCP, "/a.zip")
+        self.index.clear()
+        self.assertEqual(0, len(self.index))
+        self.assertEqual([], self.index.locations())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+## Copyright 2018 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+from urllib.request import build_opener
+from urllib.error import URLError
+
+from arcp import archive, generate, request
+
+class ArcpHandlerTest(unittest.TestCase):
+    """Test ArcpHandler"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        filename = os.path.join(self.dir, "test.zip")
+        with zipfile.ZipFile(filename, "w") as zf:
+            zf.writestr("index.html", b"<html></html>")
+            zf.writestr("data/doc.jsonld", b'{"@id": "doc"}')
+            zf.writestr("a b/c d.bin", b"\0" * 100)
+        self.base = generate.ArcpBase.from_name("app.example.com")
+        self.registry = archive.ArcpArchiveRegistry(maxsize=1)
+        self.registry.register(self.base, filename)
+        self.opener = build_opener(request.ArcpHandler(self.registry))
+
+    def tearDown(self):
+        self.registry.close()
+        shutil.rmtree(self.dir)
+
+    def testOpen(self):
+        uri = self.base.uri("index.html")
+        with self.opener.open(uri) as f:
+            self.assertEqual("text/html", f.headers["Content-Type"])
+            self.assertEqual("13", f.headers["Content-Length"])
+            self.assertTrue(f.headers["Last-Modified"].endswith("GMT"))
+            self.assertEqual(uri, f.geturl())
+            self.assertEqual(b"<html></html>", f.read())
+
+    def testJSON(self):
+        with self.opener.open(self.base.uri("data/doc.jsonld#frag")) as f:
+            self.assertEqual({"@id": "doc"}, json.load(f))
+
+    def testQuoted(self):
+        with self.opener.open(self.base.uri("a b/c d.bin", quote=True)) as f:
+            self.assertEqual("application/octet-stream", f.headers["Content-Type"])
+            self.assertEqual(b"\0" * 100, f.read())
+
+    def testReleased(self):
+        f = self.opener.open(self.base.uri("index.html"))
+        a = self.registry.acquire(self.base)
+        self.assertEqual(2, self.registry._refs[id(a)][1])
+        self.registry.release(a)
+        f.close()
+        self.assertEqual({}, self.registry._refs)
+
+    def testNotFound(self):
+        with self.assertRaises(URLError):
+            self.opener.open(self.base.uri("missing.html"))
+        with self.assertRaises(URLError):
+            self.opener.open(self.base.uri("data/"))
+        with self.assertRaises(URLError):
+            self.opener.open(self.base.uri("../index.html"))
+        with self.assertRaises(URLError):
+            self.opener.open("arcp://name,missing.example.com/index.html")
+        self.assertEqual({}, self.registry._refs)
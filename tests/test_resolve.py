@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+## Copyright 2018 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+
+import unittest
+import random
+import re
+
+from urllib.parse import urljoin
+
+from arcp import resolve, generate
+
+BASE = "arcp://a/b/c/d;p?q"
+
+# https://tools.ietf.org/html/rfc3986#section-5.4 with arcp://a/ as base
+RFC3986_EXAMPLES = {
+    "g:h": "g:h",
+    "g": "arcp://a/b/c/g",
+    "./g": "arcp://a/b/c/g",
+    "g/": "arcp://a/b/c/g/",
+    "/g": "arcp://a/g",
+    "//g": "arcp://g",
+    "?y": "arcp://a/b/c/d;p?y",
+    "g?y": "arcp://a/b/c/g?y",
+    "#s": "arcp://a/b/c/d;p?q#s",
+    "g#s": "arcp://a/b/c/g#s",
+    "g?y#s": "arcp://a/b/c/g?y#s",
+    ";x": "arcp://a/b/c/;x",
+    "g;x": "arcp://a/b/c/g;x",
+    "g;x?y#s": "arcp://a/b/c/g;x?y#s",
+    "": "arcp://a/b/c/d;p?q",
+    ".": "arcp://a/b/c/",
+    "./": "arcp://a/b/c/",
+    "..": "arcp://a/b/",
+    "../": "arcp://a/b/",
+    "../g": "arcp://a/b/g",
+    "../..": "arcp://a/",
+    "../../": "arcp://a/",
+    "../../g": "arcp://a/g",
+    # abnormal examples
+    "/./g": "arcp://a/g",
+    "g.": "arcp://a/b/c/g.",
+    ".g": "arcp://a/b/c/.g",
+    "g..": "arcp://a/b/c/g..",
+    "..g": "arcp://a/b/c/..g",
+    "./../g": "arcp://a/b/g",
+    "./g/.": "arcp://a/b/c/g/",
+    "g/./h": "arcp://a/b/c/g/h",
+    "g/../h": "arcp://a/b/c/h",
+    "g;x=1/./y": "arcp://a/b/c/g;x=1/y",
+    "g;x=1/../y": "arcp://a/b/c/y",
+    "g?y/./x": "arcp://a/b/c/g?y/./x",
+    "g?y/../x": "arcp://a/b/c/g?y/../x",
+    "g#s/./x": "arcp://a/b/c/g#s/./x",
+    "g#s/../x": "arcp://a/b/c/g#s/../x",
+}
+
+# These climb out of the root
+CLIMB_OUT = {
+    "../../../g": "arcp://a/g",
+    "../../../../g": "arcp://a/g",
+    "/../g": "arcp://a/g",
+}
+
+class RemoveDotSegments(unittest.TestCase):
+    """Test remove_dot_segments()"""
+    def test_remove(self):
+        self.assertEqual("/a/g", resolve.remove_dot_segments("/a/b/c/./../../g"))
+        self.assertEqual("/", resolve.remove_dot_segments("/"))
+        self.assertEqual("/", resolve.remove_dot_segments("/."))
+        self.assertEqual("/", resolve.remove_dot_segments("/a/.."))
+        self.assertEqual("/a/", resolve.remove_dot_segments("/a/b/.."))
+        self.assertEqual("/a/b", resolve.remove_dot_segments("/a//../b"))
+        self.assertEqual("/a/b/", resolve.remove_dot_segments("/a/b/"))
+
+    def test_climb_out(self):
+        with self.assertRaises(ValueError):
+            resolve.remove_dot_segments("/..")
+        with self.assertRaises(ValueError):
+            resolve.remove_dot_segments("/a/../../b")
+        self.assertEqual("/b", resolve.remove_dot_segments("/a/../../b", strict=False))
+
+
+class Resolver(unittest.TestCase):
+    """Test ArcpResolver"""
+    def test_rfc3986_examples(self):
+        r = resolve.ArcpResolver(BASE)
+        for (ref, expected) in RFC3986_EXAMPLES.items():
+            self.assertEqual(expected, r.resolve(ref), ref)
+
+    def test_climb_out(self):
+        r = resolve.ArcpResolver(BASE)
+        for ref in CLIMB_OUT:
+            with self.assertRaises(ValueError):
+                r.resolve(ref)
+
+    def test_not_strict(self):
+        r = resolve.ArcpResolver(BASE, strict=False)
+        for (ref, expected) in list(RFC3986_EXAMPLES.items()) + list(CLIMB_OUT.items()):
+            self.assertEqual(expected, r.resolve(ref), ref)
+
+    def test_same_as_urljoin(self):
+        rnd = random.Random(3986)
+        # No ";" as urljoin() handles params before dot-segments
+        parts = ["a", "b", ".", "..", "/", "/", "?q", "#f", "=", ":"]
+        bases = ["arcp://name,example.com/", "arcp://name,example.com/a/b/c.html",
+                 "arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/a/?x=y", 
+                 "arcp://name,example.com"]
+        for base in bases:
+            r = resolve.ArcpResolver(base, strict=False)
+            for i in range(2000):
+                ref = "".join(rnd.choice(parts) for x in range(rnd.randint(1, 8)))
+                if "//" in ref:
+                    # urljoin() drops empty segments and empty authorities,
+                    # RFC3986 keeps them
+                    continue
+                if ":" in re.split("[/?#]", ref, 1)[0]:
+                    # a scheme, or not a relative reference, but
+                    # urljoin() parses e.g. ".:" differently across versions
+                    continue
+                self.assertEqual(urljoin(base, ref), r.resolve(ref), (base, ref))
+
+    def test_base_fragment_dropped(self):
+        r = resolve.ArcpResolver("arcp://name,example.com/a?q#f")
+        self.assertEqual("arcp://name,example.com/a?q", r.resolve(""))
+        self.assertEqual("arcp://name,example.com/a?q#g", r.resolve("#g"))
+
+    def test_base_not_arcp(self):
+        with self.assertRaises(Exception):
+            resolve.ArcpResolver("http://example.com/")
+
+    def test_base_climbs_out(self):
+        with self.assertRaises(ValueError):
+            resolve.ArcpResolver("arcp://name,example.com/../a")
+
+    def test_arcp_base(self):
+        base = generate.ArcpBase.from_name("app.example.com")
+        r = resolve.ArcpResolver(base)
+        self.assertEqual("arcp://name,app.example.com/css/style.css", r.resolve("css/style.css"))
+
+    def test_resolve_many(self):
+        r = resolve.ArcpResolver("arcp://name,app.example.com/css/style.css")
+        self.assertEqual(["arcp://name,app.example.com/fonts/foo.woff", 
+                          "arcp://name,app.example.com/css/a.png",
+                          "http://example.com/"],
+            r.resolve_many(iter(["../fonts/foo.woff", "a.png", "http://example.com/"])))
+        with self.assertRaises(ValueError):
+            r.resolve_many(["../../x"])
+
+
+class Relativize(unittest.TestCase):
+    """Test relativize() and ArcpResolver.relativize()"""
+    def test_relativize(self):
+        expected = {
+            "arcp://a/b/c/g": "g",
+            "arcp://a/b/c/g/": "g/",
+            "arcp://a/b/c/": "./",
+            "arcp://a/b/g": "../g",
+            "arcp://a/g": "../../g",
+            "arcp://a/": "../../",
+            "arcp://a/b/c/d;p?q": "",
+            "arcp://a/b/c/d;p?q#s": "#s",
+            "arcp://a/b/c/d;p?y": "?y",
+            "arcp://a/b/c/d;p": "d;p",
+            "arcp://a/b/c/g?y#s": "g?y#s",
+            "arcp://a/b/c/g:h": "./g:h",
+            "arcp://a/b/c//g": ".//g",
+            "arcp://a/b/x/y/z": "../x/y/z",
+        }
+        for (uri, rel) in expected.items():
+            self.assertEqual(rel, resolve.relativize(uri, BASE), uri)
+
+    def test_unchanged(self):
+        for uri in ["http://example.com/", "arcp://other/b/c/g", "arcp://ab/c/g",
+                    "arcp://a", "arcp://a?q", "ARCP://a/b/c/g", "arcp://a/b/./g",
+                    "arcp://a/b/c/.."]:
+            self.assertEqual(uri, resolve.relativize(uri, BASE))
+
+    def test_round_trip(self):
+        rnd = random.Random(6920)
+        parts = ["a", "b", ";", ".", "..", "/", "/", "?q", "#f", ":", ".g"]
+        bases = ["arcp://name,example.com/", "arcp://name,example.com/a/b/c.html",
+                 "arcp://uuid,b7749d0b-0e47-5fc4-999d-f154abe68065/a/?x=y",
+                 "arcp://name,example.com", BASE]
+        for base in bases:
+            r = resolve.ArcpResolver(base)
+            prefix = base[:base.find("/", len("arcp://"))] if base.count("/") > 2 else base
+            for i in range(2000):
+                uri = prefix + "".join(rnd.choice(parts) for x in range(rnd.randint(0, 8)))
+                self.assertEqual(uri, r.resolve(r.relativize(uri)), (base, uri))
+
+    def test_arcp_base(self):
+        base = generate.ArcpBase.from_name("app.example.com")
+        self.assertEqual("css/style.css",
+            resolve.relativize("arcp://name,app.example.com/css/style.css", base))
+
+    def test_relativize_many(self):
+        r = resolve.ArcpResolver("arcp://name,app.example.com/css/style.css")
+        uris = ["arcp://name,app.example.com/fonts/foo.woff",
+                "arcp://name,app.example.com/fonts/bar.woff",
+                "arcp://name,app.example.com/css/a.png",
+                "http://example.com/"]
+        self.assertEqual(["../fonts/foo.woff", "../fonts/bar.woff", "a.png",
+                          "http://example.com/"],
+            r.relativize_many(iter(uris)))
+        self.assertEqual(uris, r.resolve_many(r.relativize_many(uris)))
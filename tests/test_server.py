@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+## Copyright 2018 Stian Soiland-Reyes, The University of Manchester, UK
+##
+## Licensed under the Apache License, Version 2.0 (the "License");
+## you may not use this file except in compliance with the License.
+## You may obtain a copy of the License at
+##
+##     http://www.apache.org/licenses/LICENSE-2.0
+##
+## Unless required by applicable law or agreed to in writing, software
+## distributed under the License is distributed on an "AS IS" BASIS,
+## WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+## See the License for the specific language governing permissions and
+## limitations under the License.
+
+import unittest
+import asyncio
+import io
+import os
+import sys
+import shutil
+import socket
+import tarfile
+import tempfile
+import threading
+import zipfile
+from http.client import HTTPConnection, IncompleteRead
+
+from arcp import archive, parse, server
+
+DATA = bytes(range(256)) * 1000
+
+@unittest.skipIf(sys.version_info < (3, 7), "requires Python 3.7")
+class ServerTest(unittest.TestCase):
+    """Test ArcpServer"""
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        cls.zipname = os.path.join(cls.dir, "test.zip")
+        with zipfile.ZipFile(cls.zipname, "w") as zf:
+            zf.writestr("index.html", b"<html></html>")
+            zf.writestr("big.bin", DATA)
+            zf.writestr(zipfile.ZipInfo("deflated.bin"), DATA, compress_type=zipfile.ZIP_DEFLATED)
+            zf.writestr("a b/c.txt", b"Spaces")
+            zf.writestr('q"uote.txt', b"Quote")
+        cls.tarname = os.path.join(cls.dir, "test.tar.gz")
+        with tarfile.open(cls.tarname, "w:gz") as tar:
+            info = tarfile.TarInfo("big.bin")
+            info.size = len(DATA)
+            tar.addfile(info, io.BytesIO(DATA))
+        cls.registry = archive.ArcpArchiveRegistry()
+        (zip_ni, tar_ni) = server.register_hashed(cls.registry, [cls.zipname, cls.tarname])
+        cls.zip_path = server.WELL_KNOWN_NI + zip_ni[len("ni,"):].replace(";", "/")
+        cls.tar_path = server.WELL_KNOWN_NI + tar_ni[len("ni,"):].replace(";", "/")
+        cls.loop = asyncio.new_event_loop()
+        cls.server = server.ArcpServer(cls.registry, chunk_size=4096)
+        listening = cls.loop.run_until_complete(cls.server.start("127.0.0.1", 0))
+        cls.port = listening.sockets[0].getsockname()[1]
+        # daemon, so a failing test can't hang the interpreter on exit
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        async def shutdown():
+            cls.server.close()
+            await cls.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(shutdown(), cls.loop).result(10)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.loop.close()
+        cls.registry.close()
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.conn = HTTPConnection("127.0.0.1", self.port, timeout=10)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def get(self, path, method="GET", **headers):
+        self.conn.request(method, path, headers=headers)
+        response = self.conn.getresponse()
+        return (response, response.read())
+
+    def testWellKnown(self):
+        u = parse.parse_arcp("arcp://ni,%s/" % self.zip_path[len(server.WELL_KNOWN_NI):].replace("/", ";"))
+        self.assertEqual(self.zip_path, u.ni_well_known())
+
+    def testMember(self):
+        (r, body) = self.get(self.zip_path + "/index.html")
+        self.assertEqual(200, r.status)
+        self.assertEqual(b"<html></html>", body)
+        self.assertEqual("text/html", r.getheader("Content-Type"))
+        self.assertEqual("13", r.getheader("Content-Length"))
+        self.assertEqual("bytes", r.getheader("Accept-Ranges"))
+        self.assertTrue("immutable" in r.getheader("Cache-Control"))
+        self.assertEqual('"%s/index.html"' % self.zip_path[len(server.WELL_KNOWN_NI):].replace("/", ";", 1),
+                         r.getheader("ETag"))
+
+    def testETagNormalized(self):
+        etag = self.get(self.zip_path + "/a%20b/c.txt")[0].getheader("ETag")
+        self.assertTrue(etag.endswith('/a%20b/c.txt"'), etag)
+        for path in ["/a%20b/./c.txt", "/a%20b/%63.txt", "/x/../a%20b/c.txt"]:
+            (r, body) = self.get(self.zip_path + path)
+            self.assertEqual(b"Spaces", body, path)
+            self.assertEqual(etag, r.getheader("ETag"), path)
+        etag = self.get(self.zip_path + "/q%22uote.txt")[0].getheader("ETag")
+        self.assertTrue(etag.endswith('/q%22uote.txt"'), etag)
+
+    def testETagRawTarget(self):
+        with socket.create_connection(("127.0.0.1", self.port), timeout=10) as s:
+            s.sendall(("GET %s/index.\nhtml HTTP/1.1\r\nConnection: close\r\n\r\n" %
+                       self.zip_path).encode("ascii"))
+            response = b""
+            while True:
+                data = s.recv(65536)
+                if not data:
+                    break
+                response += data
+        (head, body) = response.split(b"\r\n\r\n", 1)
+        self.assertTrue(head.startswith(b"HTTP/1.1 200 "), head)
+        self.assertFalse(b"\n" in head.replace(b"\r\n", b""), head)
+        self.assertEqual(b"<html></html>", body)
+
+    def testKeepAlive(self):
+        for path in ["/big.bin", "/deflated.bin", "/a%20b/c.txt", "/big.bin"]:
+            (r, body) = self.get(self.zip_path + path)
+            self.assertEqual(200, r.status)
+        self.assertEqual(b"Spaces", self.get(self.zip_path + "/a%20b/c.txt")[1])
+        (r, body) = self.get(self.tar_path + "/big.bin")
+        self.assertEqual(DATA, body)
+
+    def testArchive(self):
+        (r, body) = self.get(self.zip_path)
+        self.assertEqual(200, r.status)
+        with open(self.zipname, "rb") as f:
+            self.assertEqual(f.read(), body)
+        self.assertEqual("application/zip", r.getheader("Content-Type"))
+        (r, body) = self.get(self.zip_path, Range="bytes=-10")
+        self.assertEqual(206, r.status)
+        with open(self.zipname, "rb") as f:
+            self.assertEqual(f.read()[-10:], body)
+
+    def testHead(self):
+        (r, body) = self.get(self.zip_path + "/big.bin", method="HEAD")
+        self.assertEqual(200, r.status)
+        self.assertEqual(str(len(DATA)), r.getheader("Content-Length"))
+        self.assertEqual(b"", body)
+
+    def testRange(self):
+        for path in ["/big.bin", "/deflated.bin"]:
+            (r, body) = self.get(self.zip_path + path, Range="bytes=1000-1999")
+            self.assertEqual(206, r.status)
+            self.assertEqual(DATA[1000:2000], body)
+            self.assertEqual("bytes 1000-1999/%s" % len(DATA), r.getheader("Content-Range"))
+        (r, body) = self.get(self.tar_path + "/big.bin", Range="bytes=200000-")
+        self.assertEqual(DATA[200000:], body)
+        (r, body) = self.get(self.zip_path + "/big.bin", Range="bytes=-5")
+        self.assertEqual(DATA[-5:], body)
+        (r, body) = self.get(self.zip_path + "/big.bin", Range="bytes=0-0,5-6")
+        self.assertEqual(200, r.status)
+        self.assertEqual(DATA, body)
+
+    def testRangeUnsatisfiable(self):
+        (r, body) = self.get(self.zip_path + "/index.html", Range="bytes=13-")
+        self.assertEqual(416, r.status)
+        self.assertEqual("bytes */13", r.getheader("Content-Range"))
+
+    def testConditional(self):
+        (r, body) = self.get(self.zip_path + "/index.html")
+        etag = r.getheader("ETag")
+        (r, body) = self.get(self.zip_path + "/index.html", **{"If-None-Match": etag})
+        self.assertEqual(304, r.status)
+        self.assertEqual(b"", body)
+        (r, body) = self.get(self.zip_path + "/index.html", **{"If-None-Match": '"other", W/' + etag})
+        self.assertEqual(304, r.status)
+        (r, body) = self.get(self.zip_path + "/index.html", **{"If-Match": '"other"'})
+        self.assertEqual(412, r.status)
+        (r, body) = self.get(self.zip_path + "/index.html", **{"If-Match": etag})
+        self.assertEqual(200, r.status)
+        (r, body) = self.get(self.zip_path + "/big.bin", Range="bytes=0-9", **{"If-Range": '"old"'})
+        self.assertEqual(200, r.status)
+        self.assertEqual(DATA, body)
+
+    def testNotFound(self):
+        for path in ["/", "/.well-known/ni/", "/.well-known/ni/sha-256/missing/index.html",
+                     self.zip_path + "/missing.html", self.zip_path + "/a%20b/"]:
+            (r, body) = self.get(path)
+            self.assertEqual(404, r.status, path)
+        (r, body) = self.get(self.zip_path + "/../../index.html")
+        self.assertEqual(400, r.status)
+
+    def testBrokenArchive(self):
+        broken = os.path.join(self.dir, "broken.zip")
+        with open(broken, "wb") as f:
+            f.write(b"Not a ZIP file")
+        self.registry.register("ni,sha-256;broken", broken)
+        self.registry.register("ni,sha-256;deleted", os.path.join(self.dir, "deleted.zip"))
+        try:
+            (r, body) = self.get(server.WELL_KNOWN_NI + "sha-256/broken/index.html")
+            self.assertEqual(500, r.status)
+            (r, body) = self.get(server.WELL_KNOWN_NI + "sha-256/deleted/index.html")
+            self.assertEqual(404, r.status)
+            (r, body) = self.get(server.WELL_KNOWN_NI + "sha-256/deleted")
+            self.assertEqual(404, r.status)
+            # connection kept alive
+            self.assertEqual(b"Spaces", self.get(self.zip_path + "/a%20b/c.txt")[1])
+        finally:
+            self.registry.unregister("ni,sha-256;broken")
+            self.registry.unregister("ni,sha-256;deleted")
+
+    def testCorruptMember(self):
+        corrupt = os.path.join(self.dir, "corrupt.zip")
+        with zipfile.ZipFile(corrupt, "w") as zf:
+            zf.writestr(zipfile.ZipInfo("deflated.bin"), os.urandom(100000),
+                        compress_type=zipfile.ZIP_DEFLATED)
+            info = zf.getinfo("deflated.bin")
+        with open(corrupt, "r+b") as f:
+            # overwrite compressed data after the first chunks are sent
+            f.seek(info.header_offset + 30 + len(info.filename) + 50000)
+            f.write(b"\0" * 1000)
+        self.registry.register("ni,sha-256;corrupt", corrupt)
+        try:
+            self.conn.request("GET", server.WELL_KNOWN_NI + "sha-256/corrupt/deflated.bin")
+            r = self.conn.getresponse()
+            self.assertEqual(200, r.status)
+            with self.assertRaises(IncompleteRead):
+                r.read()
+            # server is still serving
+            self.conn.close()
+            self.assertEqual(b"Spaces", self.get(self.zip_path + "/a%20b/c.txt")[1])
+        finally:
+            self.registry.unregister("ni,sha-256;corrupt")
+
+    def testCloseIdle(self):
+        app = server.ArcpServer(self.registry)
+        async def start():
+            return await app.start("127.0.0.1", 0)
+        listening = asyncio.run_coroutine_threadsafe(start(), self.loop).result(10)
+        conn = HTTPConnection("127.0.0.1", listening.sockets[0].getsockname()[1], timeout=10)
+        try:
+            conn.request("GET", self.zip_path + "/index.html")
+            self.assertEqual(b"<html></html>", conn.getresponse().read())
+            async def shutdown():
+                app.close()
+                await app.wait_closed()
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(10)
+            self.assertEqual(b"", conn.sock.recv(1))
+        finally:
+            conn.close()
+
+    def testMethodNotAllowed(self):
+        (r, body) = self.get(self.zip_path + "/index.html", method="DELETE")
+        self.assertEqual(405, r.status)
+        self.assertEqual("GET, HEAD", r.getheader("Allow"))
+        self.assertEqual("close", r.getheader("Connection"))
+
+class RangeTest(unittest.TestCase):
+    """Test _parse_range()"""
+    def testParse(self):
+        self.assertEqual((0, 9), server._parse_range("bytes=0-9", 100))
+        self.assertEqual((90, 99), server._parse_range("bytes=90-", 100))
+        self.assertEqual((90, 99), server._parse_range("bytes=90-200", 100))
+        self.assertEqual((90, 99), server._parse_range("bytes=-10", 100))
+        self.assertEqual((0, 99), server._parse_range("bytes=-200", 100))
+        self.assertIs(server._UNSATISFIABLE, server._parse_range("bytes=100-", 100))
+        self.assertIs(server._UNSATISFIABLE, server._parse_range("bytes=-0", 100))
+        self.assertIs(None, server._parse_range("bytes=5-1", 100))
+        self.assertIs(None, server._parse_range("bytes=a-b", 100))
+        self.assertIs(None, server._parse_range("items=0-1", 100))
+        self.assertIs(None, server._parse_range("bytes=0-1,3-4", 100))